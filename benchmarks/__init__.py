@@ -0,0 +1,14 @@
+"""
+Benchmark Package
+
+Tools for measuring the performance of the timetable generator. The generator
+module creates seeded synthetic instances of any size, and the run module times the
+main stages (conflict graph, solving, database and PDF export), records peak memory
+and compares results against a stored baseline. The startup module times how long
+the application takes to import and open its window.
+
+Usage:
+    python -m benchmarks.run --scale realistic --output results.json
+    python -m benchmarks.run --scale realistic --baseline baseline.json
+    python -m benchmarks.startup --output startup.json
+"""
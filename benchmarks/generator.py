@@ -0,0 +1,72 @@
+"""
+Synthetic Instance Generator
+
+Creates rooms, exams and students for benchmarking. Instances are fully determined
+by their parameters and seed, so the same instance can be rebuilt on any machine.
+Students are split into cohorts which mostly choose exams from their own cohort's
+pool, which produces the clustered conflict graphs seen in real schools.
+"""
+
+import random
+from models import Exam, Room
+
+SUBJECTS = ["Maths", "English", "Physics", "Chemistry", "Biology", "History",
+            "Geography", "French", "Spanish", "Art", "Music", "Computing",
+            "Economics", "Psychology", "Drama", "Religious Studies"]
+
+# Named sizes used by the benchmark runner: (rooms, exams, students, exams per student)
+SCALES = {
+    "small": (5, 20, 200, 4),
+    "realistic": (15, 80, 1200, 8),
+    "large": (30, 250, 5000, 9),
+    "extreme": (60, 800, 20000, 10),
+}
+
+def generate_instance(num_rooms, num_exams, num_students, exams_per_student,
+                      clustering=1.0, num_cohorts=None, seed=0):
+    """
+    Generates a seeded instance and returns (rooms, exams, student_names).
+    `exams_per_student` sets the enrolment density and `clustering` is the chance
+    (0 to 1) that each of a student's exams is taken from their cohort's pool
+    rather than from every exam.
+    """
+    rng = random.Random(seed)
+    # By default each cohort's pool has a couple more exams than a student sits
+    num_cohorts = num_cohorts or max(1, num_exams // (exams_per_student + 2))
+
+    student_names = {f"S{i:06d}": f"Student {i}" for i in range(num_students)}
+    exam_ids = [f"E{i:05d}" for i in range(num_exams)]
+
+    # Split the exams into one separate pool per cohort
+    shuffled = list(exam_ids)
+    rng.shuffle(shuffled)
+    cohort_pools = [shuffled[c::num_cohorts] for c in range(num_cohorts)]
+
+    enrolments = {exam_id: [] for exam_id in exam_ids}
+    for i, sid in enumerate(student_names):
+        pool = cohort_pools[i % num_cohorts]
+        chosen = set()
+        wanted = min(exams_per_student, len(pool) if clustering >= 1 else num_exams)
+        while len(chosen) < wanted:
+            source = pool if rng.random() < clustering else exam_ids
+            chosen.add(rng.choice(source))
+        for exam_id in chosen:
+            enrolments[exam_id].append(sid)
+
+    exams = [
+        Exam(exam_id, rng.choice(SUBJECTS), rng.choice([60, 90, 120]), enrolments[exam_id])
+        for exam_id in exam_ids
+        if enrolments[exam_id]
+    ]
+
+    # Make sure the largest exam fits in at least one room
+    largest = max(len(e.student_ids) for e in exams)
+    rooms = [Room(f"R{i:03d}", rng.choice([30, 60, 120, 200])) for i in range(num_rooms)]
+    rooms[0] = Room(rooms[0].room_id, max(rooms[0].capacity, largest))
+    return rooms, exams, student_names
+
+def generate_scale(scale, clustering=1.0, seed=0):
+    """Generates an instance of one of the named sizes in SCALES"""
+    num_rooms, num_exams, num_students, exams_per_student = SCALES[scale]
+    return generate_instance(num_rooms, num_exams, num_students, exams_per_student,
+                             clustering=clustering, seed=seed)
@@ -0,0 +1,194 @@
+"""
+Benchmark Runner
+
+Times each stage of the timetable generator on a synthetic instance and records the
+peak memory allocated by Python during it. Results are written as JSON so runs can
+be compared over time, and can be checked against a stored baseline to flag
+regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from benchmarks.generator import SCALES, generate_scale
+from database import TimetableDatabase
+from engine import TimetableEngine
+from enrolment_store import EnrolmentStore
+
+START_DATE = date(2025, 5, 5)
+
+def make_engine(rooms, exams, student_names, **settings):
+    """Creates an engine with an exam period long enough for the instance"""
+    max_exams_day = settings.pop("max_exams_day", 3)
+    days = max(28, 2 * len(exams) // max_exams_day)
+    return TimetableEngine(rooms, exams, student_names,
+                           start_date=START_DATE,
+                           end_date=START_DATE + timedelta(days=days),
+                           max_exams_day=max_exams_day,
+                           **settings)
+
+def bench_build_graph(instance, workdir):
+    rooms, exams, student_names = instance
+    make_engine(rooms, exams, student_names)._build_exam_graph()
+
+def bench_enrolment_store_graph(instance, workdir):
+    rooms, exams, student_names = instance
+    path = os.path.join(workdir, "bench.csr")
+    with EnrolmentStore.write(path, exams, student_names) as store:
+        make_engine(rooms, store, store.student_names).conflict_graph
+    return {"store_bytes": os.path.getsize(path)}
+
+def bench_generate_backtrack(instance, workdir):
+    rooms, exams, student_names = instance
+    engine = make_engine(rooms, exams, student_names)
+    return {"success": engine.generate(), "iterations": engine.backtrack_iterations}
+
+def bench_generate_greedy(instance, workdir):
+    rooms, exams, student_names = instance
+    # With no backtracking allowed the engine goes straight to its greedy fallback
+    engine = make_engine(rooms, exams, student_names, max_backtrack_iterations=0)
+    return {"success": engine.generate()}
+
+def _solved_placements(instance):
+    """Generates a timetable to use as input for the storage and export benchmarks"""
+    rooms, exams, student_names = instance
+    engine = make_engine(rooms, exams, student_names, max_backtrack_iterations=0)
+    engine.generate()
+    return engine.placements
+
+def bench_save_load(instance, workdir, placements):
+    db = TimetableDatabase(os.path.join(workdir, "bench.db"))
+    try:
+        timetable_id = db.save_timetable("bench", "", placements, "", "")
+        loaded = db.load_timetable(timetable_id)
+    finally:
+        db.close()
+    return {"placements": len(loaded)}
+
+def bench_export_pdf(instance, workdir, placements):
+    try:
+        from pdf_export import export_to_pdf
+    except ImportError:
+        return {"skipped": "reportlab is not installed"}
+    export_to_pdf(placements, os.path.join(workdir, "bench.pdf"), instance[2])
+
+# Benchmarks in the order they are run. Those taking placements are given a
+# timetable solved once beforehand, which is not included in their timings.
+BENCHMARKS = {
+    "build_exam_graph": (bench_build_graph, False),
+    "enrolment_store_graph": (bench_enrolment_store_graph, False),
+    "generate_backtrack": (bench_generate_backtrack, False),
+    "generate_greedy": (bench_generate_greedy, False),
+    "save_load_timetable": (bench_save_load, True),
+    "export_to_pdf": (bench_export_pdf, True),
+}
+
+def measure(function, *args, repeat=1):
+    """
+    Runs a function `repeat` times and returns the fastest time in seconds, the
+    largest traced memory peak in bytes and the result of the last run.
+    """
+    best = None
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak, result
+
+def run_benchmarks(scale, seed=0, clustering=1.0, repeat=1, only=None):
+    """Runs the selected benchmarks on one instance and returns the results as a dict"""
+    instance = generate_scale(scale, clustering=clustering, seed=seed)
+    rooms, exams, student_names = instance
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "seed": seed,
+        "clustering": clustering,
+        "instance": {"rooms": len(rooms), "exams": len(exams), "students": len(student_names),
+                     "enrolments": sum(len(e.student_ids) for e in exams)},
+        "results": {},
+    }
+
+    placements = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (function, needs_placements) in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            args = [instance, workdir]
+            if needs_placements:
+                if placements is None:
+                    placements = _solved_placements(instance)
+                args.append(placements)
+            seconds, peak, result = measure(function, *args, repeat=repeat)
+            entry = {"seconds": round(seconds, 6), "peak_bytes": peak}
+            if isinstance(result, dict):
+                entry.update(result)
+            report["results"][name] = entry
+            print(f"{name:24} {seconds:10.4f}s {peak / 1e6:10.2f} MB", file=sys.stderr)
+    return report
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Returns a description of each benchmark that is slower or uses more memory than
+    the baseline by more than `tolerance` (a fraction, e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            old, new = previous.get(metric), current.get(metric)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the exam timetable generator")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="realistic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clustering", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per benchmark; the fastest is kept")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a regression is flagged (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.scale, seed=args.seed, clustering=args.clustering,
+                            repeat=args.repeat, only=args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != report["scale"] or baseline.get("seed") != report["seed"]:
+            print("Warning: the baseline was recorded on a different instance", file=sys.stderr)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
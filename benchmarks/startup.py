@@ -0,0 +1,131 @@
+"""
+Startup Benchmark
+
+Measures how long the application takes to start, each time in a fresh
+interpreter so nothing is already imported. It times importing each main module
+and, when a display is available, creating the main window. It also records
+which heavy optional dependencies were loaded, since ReportLab, tkcalendar and
+the engine should only be imported once an export, the date dialog or a solve
+is used.
+
+Usage:
+    python -m benchmarks.startup --repeat 5 --output startup.json
+    python -m benchmarks.startup --baseline startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks.run import compare_to_baseline
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose import is timed, in the order the application loads them
+MODULES = ["engine", "database", "pdf_export", "gui"]
+
+# Dependencies that should not be loaded just by starting the application. The
+# engine and the modules it pulls in are only needed once a timetable is generated.
+HEAVY_MODULES = ["reportlab", "tkcalendar", "sqlite3", "asyncio", "engine", "solver_trace",
+                 "preprocessing", "enrolment_store", "engine_stats", "pickle", "tracemalloc", "mmap"]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+try:
+    import {module}
+    error = None
+except ImportError as e:
+    error = str(e)
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "error": error,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_WINDOW_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import tkinter as tk
+from gui import TimetableApp
+root = tk.Tk()
+root.withdraw()
+TimetableApp(root)
+root.update_idletasks()
+elapsed = time.perf_counter() - started
+root.destroy()
+print(json.dumps({{"seconds": elapsed, "error": None,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def _run_child(script):
+    """Runs a script in a new interpreter and returns the JSON it prints"""
+    completed = subprocess.run([sys.executable, "-c", script], cwd=PACKAGE_DIR,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"seconds": None, "error": completed.stderr.strip().splitlines()[-1], "loaded": []}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def _best_of(script, repeat):
+    """Runs a child script `repeat` times, keeping the fastest successful run"""
+    best = None
+    for _ in range(repeat):
+        result = _run_child(script)
+        if result["error"]:
+            return {"skipped": result["error"]}
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return {"seconds": round(best["seconds"], 6), "heavy_modules_loaded": best["loaded"]}
+
+def run_startup_benchmarks(repeat=5, window=True):
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    for module in MODULES:
+        script = _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+        report["results"][f"import_{module}"] = _best_of(script, repeat)
+    if window:
+        report["results"]["open_main_window"] = _best_of(_WINDOW_SCRIPT.format(heavy=HEAVY_MODULES), repeat)
+
+    for name, entry in report["results"].items():
+        if "skipped" in entry:
+            print(f"{name:24} skipped: {entry['skipped']}", file=sys.stderr)
+        else:
+            loaded = ", ".join(entry["heavy_modules_loaded"]) or "none"
+            print(f"{name:24} {entry['seconds']:10.4f}s   heavy modules: {loaded}", file=sys.stderr)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the application's startup time")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the fastest is kept")
+    parser.add_argument("--no-window", action="store_true", help="skip opening the main window")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a regression is flagged (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    report = run_startup_benchmarks(args.repeat, window=not args.no_window)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
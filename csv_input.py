@@ -0,0 +1,38 @@
+"""
+CSV Input Module
+
+This module reads the rooms, exams and students CSV files used as input to the
+timetable generator. Each function takes an open file or any iterable of lines,
+so the same parsing is used for files chosen in the GUI and for CSV text sent
+to the solve service.
+"""
+
+import csv
+import io
+from models import Exam, Room
+
+def read_rooms(lines):
+    """Reads rooms from CSV with room_id and capacity columns"""
+    return [Room(row["room_id"], int(row["capacity"])) for row in csv.DictReader(lines)]
+
+def read_students(lines):
+    """Reads a mapping of student ID to full name from CSV with student_id and full_name columns"""
+    return {row["student_id"]: row["full_name"] for row in csv.DictReader(lines)}
+
+def read_exams(lines):
+    """
+    Reads exams from CSV with exam_id, subject, duration_minutes and student_ids
+    columns, where student_ids is a semicolon separated list. A student listed
+    twice is kept once and the IDs are sorted, matching EnrolmentStore.from_csv.
+    """
+    return [
+        Exam(row["exam_id"], row["subject"], int(row["duration_minutes"]),
+             sorted(set(row["student_ids"].split(";"))))
+        for row in csv.DictReader(lines)
+    ]
+
+def read_instance(rooms_csv, exams_csv, students_csv):
+    """Parses the three CSV documents given as strings and returns (rooms, exams, student_names)"""
+    return (read_rooms(io.StringIO(rooms_csv)),
+            read_exams(io.StringIO(exams_csv)),
+            read_students(io.StringIO(students_csv)))
@@ -5,30 +5,142 @@ This module provides database functionality for storing and retrieving
 generated timetables. It uses SQLite to persist timetable
 metadata and individual exam placements, allowing users to save and
 load their scheduling results.
+
+Connections are handed out per thread by a ConnectionPool, and writes are
+serialised so that background solver threads and separate worker processes
+can save results at the same time.
+
+Summary tables of room use, student load and daily load are rebuilt with SQL
+aggregate queries whenever a timetable's placements are written, so reports can
+be read across many saved timetables without loading their placements.
 """
 
+import asyncio
 import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
 from models import Placement
+from timetable_diff import TimetableDiff, compare_placements, diff_placements
+
+class ConnectionPool:
+    """
+    Gives each thread its own SQLite connection to the same database file.
+    Connections wait up to `busy_timeout` seconds for locks held by other
+    processes, and use WAL journalling so readers are not blocked by a writer.
+    """
+    def __init__(self, db_file, busy_timeout=30.0):
+        self.db_file = db_file
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """Returns the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode so that transactions are only opened explicitly by writers.
+            # Each connection is only used by its own thread, but `close_all` may close it
+            # from another one, so the same-thread check is turned off
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_current(self):
+        """Closes the calling thread's connection, if it has one"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+
+    def close_all(self):
+        """Closes every connection opened by the pool"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
 
 class TimetableDatabase:
     """
     Handles all database operations.
     """
-    def __init__(self, db_file="timetables.db"):
+    # Attempts made when a write still finds the database locked after the busy timeout
+    WRITE_RETRIES = 5
+
+    def __init__(self, db_file="timetables.db", busy_timeout=30.0):
         self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file)
+        self.pool = ConnectionPool(db_file, busy_timeout)
+        # Only one thread of this process writes at a time; other processes are
+        # kept out by the IMMEDIATE transaction each write opens
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
         self.create_tables()
+
+    @property
+    def conn(self):
+        """The connection belonging to the calling thread"""
+        return self.pool.connection()
     
     def close(self):
-        """Close the database connection if it is open"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Close all pooled database connections"""
+        self.pool.close_all()
+
+    @contextmanager
+    def _write(self):
+        """
+        Runs a block of writes as one serialised transaction and yields a cursor.
+        The transaction is started with BEGIN IMMEDIATE so the write lock is taken up front,
+        and it is retried with a back-off if another process keeps the database locked.
+        Nested calls join the outer transaction.
+        """
+        with self._write_lock:
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield self.conn.cursor()
+                finally:
+                    self._write_depth -= 1
+                return
+
+            cursor = self.conn.cursor()
+            for attempt in range(self.WRITE_RETRIES):
+                try:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    break
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) or attempt == self.WRITE_RETRIES - 1:
+                        raise
+                    time.sleep(0.1 * 2 ** attempt)
+
+            self._write_depth = 1
+            try:
+                yield cursor
+                cursor.execute('COMMIT')
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            finally:
+                self._write_depth = 0
 
     def create_tables(self):
         """Creates the necessary database tables if they do not exist"""
-        cursor = self.conn.cursor()
+        with self._write() as cursor:
+            self._create_tables(cursor)
+
+    def _create_tables(self, cursor):
         
         # Create table for storing timetable metadata
         cursor.execute('''
@@ -57,25 +169,294 @@ class TimetableDatabase:
                 FOREIGN KEY (timetable_id) REFERENCES timetables (id)
             )
         ''')
-        
-        self.conn.commit()
 
-    def save_timetable(self, name, description, placements, start_date, end_date):
+        # Create a normalised enrolment table with one row per student per placement.
+        # The `student_ids` column above is kept so older databases still load, but
+        # per-student lookups go through this table and its index instead
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS placement_students (
+                placement_id INTEGER NOT NULL,
+                timetable_id INTEGER NOT NULL,
+                student_id TEXT NOT NULL,
+                FOREIGN KEY (placement_id) REFERENCES placements (id),
+                FOREIGN KEY (timetable_id) REFERENCES timetables (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_placement_students_student
+            ON placement_students (timetable_id, student_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_placements_timetable
+            ON placements (timetable_id)
+        ''')
+        # Lets two saved timetables be compared by joining their placements on exam_id
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_placements_exam
+            ON placements (timetable_id, exam_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_timetables_created
+            ON timetables (created_date, id)
+        ''')
+
+        # Revisions of a saved timetable are stored as deltas against the base
+        # snapshot in `placements`. `base_version` records which version that
+        # snapshot represents, so older deltas can be folded in by compaction
+        cursor.execute('PRAGMA table_info(timetables)')
+        if 'base_version' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE timetables ADD COLUMN base_version INTEGER NOT NULL DEFAULT 0')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS timetable_versions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timetable_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                created_date TEXT NOT NULL,
+                description TEXT,
+                UNIQUE (timetable_id, version),
+                FOREIGN KEY (timetable_id) REFERENCES timetables (id)
+            )
+        ''')
+
+        # Each row is one change in a version: 'add' stores the full placement,
+        # 'move' only the new room/date/times and 'remove' only the exam id.
+        # Student lists are zlib-compressed as they are by far the largest field
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS version_changes (
+                version_id INTEGER NOT NULL,
+                change TEXT NOT NULL,
+                exam_id TEXT NOT NULL,
+                subject TEXT,
+                room_id TEXT,
+                date TEXT,
+                start_time TEXT,
+                end_time TEXT,
+                student_ids BLOB,
+                FOREIGN KEY (version_id) REFERENCES timetable_versions (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_version_changes_version
+            ON version_changes (version_id)
+        ''')
+
+        # Analytics for the latest version of each timetable, rebuilt by `_refresh_analytics`.
+        # Room capacities are kept per timetable as rooms can change between runs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS room_capacities (
+                timetable_id INTEGER NOT NULL,
+                room_id TEXT NOT NULL,
+                capacity INTEGER NOT NULL,
+                PRIMARY KEY (timetable_id, room_id),
+                FOREIGN KEY (timetable_id) REFERENCES timetables (id)
+            )
+        ''')
+        # One row per room per day: exams held, minutes in use, students seated in
+        # total and in the fullest exam, and the room's capacity if it is known
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS room_day_usage (
+                timetable_id INTEGER NOT NULL,
+                room_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                exams INTEGER NOT NULL,
+                minutes INTEGER NOT NULL,
+                students INTEGER NOT NULL,
+                peak_students INTEGER NOT NULL,
+                capacity INTEGER,
+                PRIMARY KEY (timetable_id, room_id, date),
+                FOREIGN KEY (timetable_id) REFERENCES timetables (id)
+            )
+        ''')
+        # One row per student per day they sit at least one exam
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS student_day_load (
+                timetable_id INTEGER NOT NULL,
+                student_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                exams INTEGER NOT NULL,
+                minutes INTEGER NOT NULL,
+                PRIMARY KEY (timetable_id, student_id, date),
+                FOREIGN KEY (timetable_id) REFERENCES timetables (id)
+            )
+        ''')
+        # Answers "how many students sit N exams in a day" from the index alone
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_student_day_load_exams
+            ON student_day_load (timetable_id, exams, student_id)
+        ''')
+        # One row per exam day
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS day_load (
+                timetable_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                exams INTEGER NOT NULL,
+                sittings INTEGER NOT NULL,
+                students INTEGER NOT NULL,
+                rooms INTEGER NOT NULL,
+                max_student_exams INTEGER NOT NULL,
+                PRIMARY KEY (timetable_id, date),
+                FOREIGN KEY (timetable_id) REFERENCES timetables (id)
+            )
+        ''')
+
+        # PRAGMA user_version counts the one-off data migrations already applied,
+        # so each runs once instead of being checked every time the database opens
+        cursor.execute('PRAGMA user_version')
+        migrations = cursor.fetchone()[0]
+        if migrations < 1:
+            self._backfill_placement_students(cursor)
+            cursor.execute('PRAGMA user_version = 1')
+        if migrations < 2:
+            self._backfill_analytics(cursor)
+            cursor.execute('PRAGMA user_version = 2')
+
+    def _backfill_placement_students(self, cursor):
+        """
+        Fills the enrolment table for placements saved before it existed.
+        Only placements without any enrolment rows are split and inserted.
+        Run once per database, as later saves always write the enrolment rows.
+        """
+        cursor.execute('''
+            SELECT id, timetable_id, student_ids FROM placements
+            WHERE id NOT IN (SELECT DISTINCT placement_id FROM placement_students)
+        ''')
+        for placement_id, timetable_id, student_ids in cursor.fetchall():
+            cursor.executemany(
+                'INSERT INTO placement_students (placement_id, timetable_id, student_id) VALUES (?, ?, ?)',
+                [(placement_id, timetable_id, sid) for sid in student_ids.split(';') if sid]
+            )
+
+    def _backfill_analytics(self, cursor):
+        """
+        Builds the summary tables for timetables saved before they existed.
+        Run once per database, as later saves always refresh the summaries.
+        """
+        cursor.execute('''
+            SELECT id FROM timetables
+            WHERE id NOT IN (SELECT DISTINCT timetable_id FROM day_load)
+            AND id IN (SELECT DISTINCT timetable_id FROM placements)
+        ''')
+        for (timetable_id,) in cursor.fetchall():
+            self._refresh_analytics(cursor, timetable_id, self._versioned_placements(timetable_id))
+
+    def _versioned_placements(self, timetable_id):
+        """The placements of the latest version, or None if it is the base snapshot"""
+        if self.get_latest_version(timetable_id) == self.get_base_version(timetable_id):
+            return None
+        return self.load_version(timetable_id)
+
+    def _refresh_analytics(self, cursor, timetable_id, placements=None):
+        """
+        Rebuilds the summary tables of a timetable from its base snapshot, or from
+        `placements` when a later version is current. Each table is filled by one
+        aggregate query over the placement and enrolment rows.
+        """
+        for table in ("room_day_usage", "student_day_load", "day_load"):
+            cursor.execute(f'DELETE FROM {table} WHERE timetable_id = ?', (timetable_id,))
+
+        placement_table, enrolment_table = "placements", "placement_students"
+        if placements is not None:
+            # Later versions are stored as deltas, so their placements are copied into
+            # temporary tables shaped like the snapshot tables and aggregated from there
+            placement_table, enrolment_table = "temp.analytics_placements", "temp.analytics_students"
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS analytics_placements (
+                    id INTEGER PRIMARY KEY,
+                    timetable_id INTEGER NOT NULL,
+                    room_id TEXT,
+                    date TEXT,
+                    start_time TEXT,
+                    end_time TEXT
+                )
+            ''')
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS analytics_students (
+                    placement_id INTEGER NOT NULL,
+                    timetable_id INTEGER NOT NULL,
+                    student_id TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('DELETE FROM temp.analytics_placements')
+            cursor.execute('DELETE FROM temp.analytics_students')
+            cursor.executemany(
+                'INSERT INTO temp.analytics_placements VALUES (?, ?, ?, ?, ?, ?)',
+                [(i, timetable_id, p.room_id, p.date, p.start, p.end) for i, p in enumerate(placements)]
+            )
+            cursor.executemany(
+                'INSERT INTO temp.analytics_students VALUES (?, ?, ?)',
+                [(i, timetable_id, sid) for i, p in enumerate(placements) for sid in p.student_ids]
+            )
+
+        # Placements with their length in minutes and number of students
+        sized_placements = f'''
+            SELECT p.id, p.room_id, p.date,
+                   (strftime('%s', '2000-01-01 ' || p.end_time)
+                    - strftime('%s', '2000-01-01 ' || p.start_time)) / 60 AS minutes,
+                   COALESCE(s.students, 0) AS students
+            FROM {placement_table} p
+            LEFT JOIN (
+                SELECT placement_id, COUNT(*) AS students FROM {enrolment_table}
+                WHERE timetable_id = :id GROUP BY placement_id
+            ) s ON s.placement_id = p.id
+            WHERE p.timetable_id = :id
+        '''
+        cursor.execute(f'''
+            INSERT INTO room_day_usage (timetable_id, room_id, date, exams, minutes,
+                                        students, peak_students, capacity)
+            SELECT :id, sp.room_id, sp.date, COUNT(*), SUM(sp.minutes),
+                   SUM(sp.students), MAX(sp.students), rc.capacity
+            FROM ({sized_placements}) sp
+            LEFT JOIN room_capacities rc ON rc.timetable_id = :id AND rc.room_id = sp.room_id
+            GROUP BY sp.room_id, sp.date
+        ''', {"id": timetable_id})
+        cursor.execute(f'''
+            INSERT INTO student_day_load (timetable_id, student_id, date, exams, minutes)
+            SELECT :id, ps.student_id, sp.date, COUNT(*), SUM(sp.minutes)
+            FROM {enrolment_table} ps
+            JOIN ({sized_placements}) sp ON sp.id = ps.placement_id
+            WHERE ps.timetable_id = :id
+            GROUP BY ps.student_id, sp.date
+        ''', {"id": timetable_id})
+        cursor.execute(f'''
+            INSERT INTO day_load (timetable_id, date, exams, sittings, students, rooms, max_student_exams)
+            SELECT :id, sp.date, COUNT(*), SUM(sp.students), COALESCE(l.students, 0),
+                   COUNT(DISTINCT sp.room_id), COALESCE(l.max_exams, 0)
+            FROM ({sized_placements}) sp
+            LEFT JOIN (
+                SELECT date, COUNT(*) AS students, MAX(exams) AS max_exams
+                FROM student_day_load WHERE timetable_id = :id GROUP BY date
+            ) l ON l.date = sp.date
+            GROUP BY sp.date
+        ''', {"id": timetable_id})
+
+    def save_timetable(self, name, description, placements, start_date, end_date, room_capacities=None):
         """
         Saves a complete timetable to the database which includes metadata and all placements.
         Creates a new timetable entry and associates all exam placements with it.
+        `room_capacities` optionally maps room IDs to capacities for the room usage summary.
         """
-        cursor = self.conn.cursor()
-        
-        # Insert timetable metadata into the main table
-        cursor.execute('''
-            INSERT INTO timetables (name, created_date, start_date, end_date, description)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-             start_date, end_date, description))
-        
-        timetable_id = cursor.lastrowid
-        
+        with self._write() as cursor:
+            # Insert timetable metadata into the main table
+            cursor.execute('''
+                INSERT INTO timetables (name, created_date, start_date, end_date, description)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                 start_date, end_date, description))
+
+            timetable_id = cursor.lastrowid
+            if room_capacities:
+                cursor.executemany(
+                    'INSERT INTO room_capacities (timetable_id, room_id, capacity) VALUES (?, ?, ?)',
+                    [(timetable_id, room_id, capacity) for room_id, capacity in room_capacities.items()]
+                )
+            self._insert_placements(cursor, timetable_id, placements)
+            self._refresh_analytics(cursor, timetable_id)
+
+        return timetable_id
+
+    def _insert_placements(self, cursor, timetable_id, placements):
+        """Inserts placement rows and their enrolment rows for a timetable"""
         # Insert each placement record linked to the timetable
         for p in placements:
             cursor.execute('''
@@ -85,8 +466,13 @@ class TimetableDatabase:
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (timetable_id, p.exam_id, p.subject, p.room_id,
                   p.date, p.start, p.end, ";".join(p.student_ids)))
-        
-        self.conn.commit()
+
+            # Record one enrolment row per student so per-student queries can use the index
+            placement_id = cursor.lastrowid
+            cursor.executemany(
+                'INSERT INTO placement_students (placement_id, timetable_id, student_id) VALUES (?, ?, ?)',
+                [(placement_id, timetable_id, sid) for sid in p.student_ids]
+            )
 
     def get_saved_timetables(self):
         """
@@ -97,20 +483,91 @@ class TimetableDatabase:
         cursor.execute('SELECT id, name, created_date, description FROM timetables ORDER BY created_date DESC')
         return cursor.fetchall()
 
+    def get_timetables_page(self, limit=50, after=None):
+        """
+        Gets one page of saved timetables, newest first, using keyset pagination.
+        `after` is the (created_date, id) of the last row of the previous page, so
+        each page is an indexed range scan rather than an OFFSET over the whole history.
+        """
+        cursor = self.conn.cursor()
+        if after is None:
+            cursor.execute('''
+                SELECT id, name, created_date, description FROM timetables
+                ORDER BY created_date DESC, id DESC LIMIT ?
+            ''', (limit,))
+        else:
+            created_date, last_id = after
+            cursor.execute('''
+                SELECT id, name, created_date, description FROM timetables
+                WHERE created_date < ? OR (created_date = ? AND id < ?)
+                ORDER BY created_date DESC, id DESC LIMIT ?
+            ''', (created_date, created_date, last_id, limit))
+        return cursor.fetchall()
+
+    def count_timetables(self):
+        """Returns the number of saved timetables"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM timetables')
+        return cursor.fetchone()[0]
+
+    def iter_placements(self, timetable_id, batch_size=500):
+        """
+        Streams the placements of a timetable as Placement objects.
+        Rows are fetched in batches with `fetchmany` so only one batch is held in memory.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT exam_id, subject, room_id, date, start_time, end_time, student_ids
+            FROM placements WHERE timetable_id = ? ORDER BY id
+        ''', (timetable_id,))
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            # Reconstruct Placement objects from database records
+            for exam_id, subject, room_id, date, start_time, end_time, student_ids in rows:
+                yield Placement(
+                    exam_id=exam_id,
+                    subject=subject,
+                    room_id=room_id,
+                    date=date,
+                    start=start_time,
+                    end=end_time,
+                    student_ids=student_ids.split(';')
+                )
+
     def load_timetable(self, timetable_id):
         """
         Loads all placements for a specific timetable from the database.
         Reconstructs Placement objects from the stored data.
         """
+        return list(self.iter_placements(timetable_id))
+
+    def get_student_timetable(self, timetable_id, student_id, version=None):
+        """
+        Loads only the placements that a single student sits in a version of a saved
+        timetable, the latest by default. The base snapshot is looked up through the
+        indexed enrolment table so every placement is not scanned; the enrolment table
+        does not cover later versions, so those are rebuilt and filtered instead.
+        """
+        if version is None:
+            version = self.get_latest_version(timetable_id)
+        if version != self.get_base_version(timetable_id):
+            return sorted((p for p in self.load_version(timetable_id, version) if student_id in p.student_ids),
+                          key=lambda p: (p.date, p.start))
+
         cursor = self.conn.cursor()
-        cursor.execute('SELECT exam_id, subject, room_id, date, start_time, end_time, student_ids FROM placements WHERE timetable_id = ?', (timetable_id,))
-        rows = cursor.fetchall()
-        
-        # Reconstruct Placement objects from database records
-        placements = []
-        for row in rows:
-            exam_id, subject, room_id, date, start_time, end_time, student_ids = row
-            placement = Placement(
+        cursor.execute('''
+            SELECT p.exam_id, p.subject, p.room_id, p.date, p.start_time, p.end_time, p.student_ids
+            FROM placement_students ps
+            JOIN placements p ON p.id = ps.placement_id
+            WHERE ps.timetable_id = ? AND ps.student_id = ?
+            ORDER BY p.date, p.start_time
+        ''', (timetable_id, student_id))
+
+        return [
+            Placement(
                 exam_id=exam_id,
                 subject=subject,
                 room_id=room_id,
@@ -119,5 +576,343 @@ class TimetableDatabase:
                 end=end_time,
                 student_ids=student_ids.split(';')
             )
-            placements.append(placement)
-        return placements
\ No newline at end of file
+            for exam_id, subject, room_id, date, start_time, end_time, student_ids in cursor.fetchall()
+        ]
+
+    def get_latest_version(self, timetable_id):
+        """
+        Returns the newest version number of a saved timetable.
+        Version 0 is the timetable as first saved.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT MAX(v.version), t.base_version FROM timetables t
+            LEFT JOIN timetable_versions v ON v.timetable_id = t.id
+            WHERE t.id = ?
+        ''', (timetable_id,))
+        latest, base_version = cursor.fetchone()
+        return latest if latest is not None else (base_version or 0)
+
+    def get_base_version(self, timetable_id):
+        """Returns the version number held in the base snapshot of a timetable"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT base_version FROM timetables WHERE id = ?', (timetable_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError(f"Timetable {timetable_id} does not exist")
+        return row[0]
+
+    def get_versions(self, timetable_id):
+        """
+        Gets the stored versions of a timetable which can still be rebuilt.
+        Returns tuples of (version, created_date, description, number_of_changes).
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT v.version, v.created_date, v.description, COUNT(c.version_id)
+            FROM timetable_versions v
+            LEFT JOIN version_changes c ON c.version_id = v.id
+            WHERE v.timetable_id = ?
+            GROUP BY v.id ORDER BY v.version
+        ''', (timetable_id,))
+        return cursor.fetchall()
+
+    def save_version(self, timetable_id, placements, description=None):
+        """
+        Saves a new revision of an existing timetable as a delta against the latest version.
+        Only exams that were added, moved or removed are written, so a revision costs
+        O(changes) rows. Returns the new version number, or the latest one if nothing changed.
+        """
+        # The whole read-compare-write runs under the write lock so two writers
+        # cannot both create the same version number
+        with self._write() as cursor:
+            latest = self.get_latest_version(timetable_id)
+            previous = {p.exam_id: p for p in self.load_version(timetable_id, latest)}
+
+            # Work out what changed between the latest version and the new placements
+            changes = []
+            current_ids = set()
+            for p in placements:
+                current_ids.add(p.exam_id)
+                old = previous.get(p.exam_id)
+                if old is None or old.subject != p.subject or old.student_ids != p.student_ids:
+                    changes.append(('add', p.exam_id, p.subject, p.room_id, p.date, p.start, p.end,
+                                    zlib.compress(";".join(p.student_ids).encode())))
+                elif (old.room_id, old.date, old.start, old.end) != (p.room_id, p.date, p.start, p.end):
+                    changes.append(('move', p.exam_id, None, p.room_id, p.date, p.start, p.end, None))
+            for exam_id in previous:
+                if exam_id not in current_ids:
+                    changes.append(('remove', exam_id, None, None, None, None, None, None))
+
+            if not changes:
+                return latest
+
+            cursor.execute('''
+                INSERT INTO timetable_versions (timetable_id, version, created_date, description)
+                VALUES (?, ?, ?, ?)
+            ''', (timetable_id, latest + 1, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), description))
+            version_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO version_changes (
+                    version_id, change, exam_id, subject, room_id,
+                    date, start_time, end_time, student_ids
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(version_id,) + change for change in changes])
+            # The new version is the latest, so the summaries follow it
+            self._refresh_analytics(cursor, timetable_id, placements)
+
+            return latest + 1
+
+    def load_version(self, timetable_id, version=None):
+        """
+        Rebuilds the placements of a timetable at a given version (the latest by default).
+        Starts from the base snapshot and replays each delta up to that version in order.
+        """
+        base_version = self.get_base_version(timetable_id)
+        if version is None:
+            version = self.get_latest_version(timetable_id)
+        if version < base_version:
+            raise ValueError(f"Version {version} has been compacted into version {base_version}")
+
+        placements = {p.exam_id: p for p in self.iter_placements(timetable_id)}
+
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT c.change, c.exam_id, c.subject, c.room_id, c.date, c.start_time, c.end_time, c.student_ids
+            FROM timetable_versions v
+            JOIN version_changes c ON c.version_id = v.id
+            WHERE v.timetable_id = ? AND v.version > ? AND v.version <= ?
+            ORDER BY v.version
+        ''', (timetable_id, base_version, version))
+
+        # Apply each change on top of the snapshot
+        for change, exam_id, subject, room_id, date, start_time, end_time, student_ids in cursor.fetchall():
+            if change == 'remove':
+                placements.pop(exam_id, None)
+            elif change == 'move':
+                old = placements[exam_id]
+                placements[exam_id] = Placement(exam_id, old.subject, room_id, date,
+                                                start_time, end_time, old.student_ids)
+            else:
+                placements[exam_id] = Placement(exam_id, subject, room_id, date, start_time, end_time,
+                                                zlib.decompress(student_ids).decode().split(';'))
+
+        # Sort the placements by date and start time like the engine does
+        return sorted(placements.values(), key=lambda p: (p.date, p.start))
+
+    def diff_timetables(self, old_id, new_id, old_version=None, new_version=None):
+        """
+        Compares two saved timetables (their latest versions by default) and returns
+        a TimetableDiff. When both versions are base snapshots the placements are
+        joined on exam_id inside the database, so only the exams that changed are
+        read; otherwise the versions are rebuilt and compared in memory.
+        """
+        if old_version is None:
+            old_version = self.get_latest_version(old_id)
+        if new_version is None:
+            new_version = self.get_latest_version(new_id)
+        if (old_version != self.get_base_version(old_id)
+                or new_version != self.get_base_version(new_id)):
+            return diff_placements(self.load_version(old_id, old_version),
+                                   self.load_version(new_id, new_version))
+
+        cursor = self.conn.cursor()
+        columns = "{0}.exam_id, {0}.subject, {0}.room_id, {0}.date, {0}.start_time, {0}.end_time, {0}.student_ids"
+        # Exams that were removed or differ in any way, looked up through idx_placements_exam
+        cursor.execute(f'''
+            SELECT {columns.format("o")}, n.id, {columns.format("n")}
+            FROM placements o
+            LEFT JOIN placements n ON n.timetable_id = ? AND n.exam_id = o.exam_id
+            WHERE o.timetable_id = ? AND (
+                n.id IS NULL OR o.room_id IS NOT n.room_id OR o.date IS NOT n.date
+                OR o.start_time IS NOT n.start_time OR o.end_time IS NOT n.end_time
+                OR o.student_ids IS NOT n.student_ids
+            )
+        ''', (new_id, old_id))
+        changes = []
+        for row in cursor.fetchall():
+            old = _placement_from_row(row[:7])
+            new = _placement_from_row(row[8:]) if row[7] is not None else None
+            change = compare_placements(old.exam_id, old, new)
+            if change is not None:
+                changes.append(change)
+
+        # Exams only in the new timetable
+        cursor.execute(f'''
+            SELECT {columns.format("n")} FROM placements n
+            WHERE n.timetable_id = ? AND NOT EXISTS (
+                SELECT 1 FROM placements o WHERE o.timetable_id = ? AND o.exam_id = n.exam_id
+            )
+        ''', (new_id, old_id))
+        for row in cursor.fetchall():
+            new = _placement_from_row(row)
+            changes.append(compare_placements(new.exam_id, None, new))
+        return TimetableDiff(changes)
+
+    def get_room_usage(self, timetable_id):
+        """
+        Returns (room_id, date, exams, minutes, students, peak_students, capacity,
+        peak_use) for each room and day, where peak_use is the fraction of the
+        capacity taken by its fullest exam, or None if the capacity is not known.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT room_id, date, exams, minutes, students, peak_students, capacity,
+                   CAST(peak_students AS REAL) / NULLIF(capacity, 0)
+            FROM room_day_usage WHERE timetable_id = ?
+            ORDER BY date, room_id
+        ''', (timetable_id,))
+        return cursor.fetchall()
+
+    def get_day_load(self, timetable_id):
+        """Returns (date, exams, sittings, students, rooms, max_student_exams) for each exam day"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT date, exams, sittings, students, rooms, max_student_exams
+            FROM day_load WHERE timetable_id = ? ORDER BY date
+        ''', (timetable_id,))
+        return cursor.fetchall()
+
+    def get_student_load_distribution(self, timetable_id):
+        """
+        Returns (exams_in_a_day, students) pairs: how many students have at least
+        one day with exactly that many exams, counted at their busiest day.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT busiest, COUNT(*) FROM (
+                SELECT MAX(exams) AS busiest FROM student_day_load
+                WHERE timetable_id = ? GROUP BY student_id
+            ) GROUP BY busiest ORDER BY busiest
+        ''', (timetable_id,))
+        return cursor.fetchall()
+
+    def count_students_with_daily_load(self, timetable_id, min_exams=3):
+        """Returns how many students sit at least `min_exams` exams on some day"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(DISTINCT student_id) FROM student_day_load
+            WHERE timetable_id = ? AND exams >= ?
+        ''', (timetable_id, min_exams))
+        return cursor.fetchone()[0]
+
+    def get_analytics_overview(self, min_exams=3):
+        """
+        Summarises every saved timetable from the summary tables alone. Returns
+        (id, name, created_date, exam_days, exams, sittings, busiest_day_students,
+        students_with_min_exams_in_a_day, average_peak_room_use), newest first.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT t.id, t.name, t.created_date,
+                   COALESCE(d.days, 0), COALESCE(d.exams, 0), COALESCE(d.sittings, 0),
+                   COALESCE(d.busiest, 0), COALESCE(s.loaded, 0), r.peak_use
+            FROM timetables t
+            LEFT JOIN (
+                SELECT timetable_id, COUNT(*) AS days, SUM(exams) AS exams,
+                       SUM(sittings) AS sittings, MAX(students) AS busiest
+                FROM day_load GROUP BY timetable_id
+            ) d ON d.timetable_id = t.id
+            LEFT JOIN (
+                SELECT timetable_id, COUNT(DISTINCT student_id) AS loaded
+                FROM student_day_load WHERE exams >= ? GROUP BY timetable_id
+            ) s ON s.timetable_id = t.id
+            LEFT JOIN (
+                SELECT timetable_id, AVG(CAST(peak_students AS REAL) / NULLIF(capacity, 0)) AS peak_use
+                FROM room_day_usage GROUP BY timetable_id
+            ) r ON r.timetable_id = t.id
+            ORDER BY t.created_date DESC, t.id DESC
+        ''', (min_exams,))
+        return cursor.fetchall()
+
+    def compact_versions(self, timetable_id, upto_version=None):
+        """
+        Folds the deltas up to a version (the latest by default) into the base snapshot.
+        Rebuilding later versions becomes quicker, but versions before it can no longer be loaded.
+        """
+        with self._write() as cursor:
+            if upto_version is None:
+                upto_version = self.get_latest_version(timetable_id)
+            placements = self.load_version(timetable_id, upto_version)
+
+            # Replace the base snapshot with the rebuilt version
+            cursor.execute('DELETE FROM placement_students WHERE timetable_id = ?', (timetable_id,))
+            cursor.execute('DELETE FROM placements WHERE timetable_id = ?', (timetable_id,))
+            self._insert_placements(cursor, timetable_id, placements)
+
+            # Remove the deltas that are now part of the snapshot
+            cursor.execute('''
+                DELETE FROM version_changes WHERE version_id IN (
+                    SELECT id FROM timetable_versions WHERE timetable_id = ? AND version <= ?
+                )
+            ''', (timetable_id, upto_version))
+            cursor.execute('DELETE FROM timetable_versions WHERE timetable_id = ? AND version <= ?',
+                           (timetable_id, upto_version))
+            cursor.execute('UPDATE timetables SET base_version = ? WHERE id = ?', (upto_version, timetable_id))
+            # Later versions may remain, so the summaries are rebuilt from the latest one
+            self._refresh_analytics(cursor, timetable_id, self._versioned_placements(timetable_id))
+
+
+class AsyncTimetableDatabase:
+    """
+    asyncio-friendly wrapper around TimetableDatabase.
+    Every method of the wrapped database is exposed as a coroutine which runs the
+    query on a worker thread, each of which gets its own pooled connection.
+    """
+    def __init__(self, db_file="timetables.db", max_workers=4, busy_timeout=30.0):
+        self.db = TimetableDatabase(db_file, busy_timeout)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="timetable-db")
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def run_in_executor(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(method, *args, **kwargs))
+        return run_in_executor
+
+    async def iter_placements(self, timetable_id, batch_size=500):
+        """
+        Streams placements as an async generator. The underlying cursor belongs to one
+        connection, so every batch is fetched on the same dedicated worker thread, whose
+        connection is closed when the stream ends.
+        """
+        loop = asyncio.get_running_loop()
+        stream = self.db.iter_placements(timetable_id, batch_size)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="timetable-db-stream") as reader:
+            try:
+                while True:
+                    batch = await loop.run_in_executor(reader, _next_batch, stream, batch_size)
+                    if not batch:
+                        break
+                    for placement in batch:
+                        yield placement
+            finally:
+                await loop.run_in_executor(reader, _close_stream, stream, self.db.pool)
+
+    async def close(self):
+        """Waits for running queries, then closes the executor and every connection"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.executor.shutdown)
+        self.db.close()
+
+def _placement_from_row(row):
+    """Builds a Placement from the stored columns of a placements row"""
+    exam_id, subject, room_id, date, start_time, end_time, student_ids = row
+    return Placement(exam_id, subject, room_id, date, start_time, end_time, student_ids.split(';'))
+
+def _close_stream(stream, pool):
+    """Closes a placement stream and the connection of the thread it was read on"""
+    stream.close()
+    pool.close_current()
+
+def _next_batch(stream, batch_size):
+    """Reads up to `batch_size` items from a generator"""
+    batch = []
+    for placement in stream:
+        batch.append(placement)
+        if len(batch) == batch_size:
+            break
+    return batch
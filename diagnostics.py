@@ -0,0 +1,233 @@
+"""
+Diagnostics Module
+
+This module holds the clash log as structured records instead of pre-formatted
+text. Each Diagnostic has a code, a severity, the exams, students and rooms it
+concerns and the numbers behind it. Text is only produced when the log is read,
+for example by the clash log window or when it is exported, and expensive
+analysis can be added as a deferred producer that only runs if anyone looks.
+
+ClashLog still behaves like the old list of strings: indexing, slicing and
+iterating give formatted text, so code such as `"Successfully" in log[-1]` keeps
+working, while `records` and `filter` give the structured entries.
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+INFO = "info"
+WARNING = "warning"
+ERROR = "error"
+
+SEVERITIES = (ERROR, WARNING, INFO)
+
+# Suggestions shown after a failure, referred to by key in SUGGESTIONS records
+SUGGESTION_TEXT = {
+    "extend_period": "Extend the exam period (increase end date)",
+    "more_per_day": "Increase max exams per day",
+    "remove_exclusions": "Remove excluded dates",
+    "enable_weekends": "Enable weekends if possible (uncheck 'Exclude Weekends')",
+    "reduce_gap": "Reduce minimum gap between related exams",
+}
+
+@dataclass
+class Diagnostic:
+    code: str
+    severity: str = INFO
+    exams: tuple = ()
+    students: tuple = ()
+    rooms: tuple = ()
+    context: dict = field(default_factory=dict)
+
+    def format(self):
+        """Returns the entry as text, which may span several lines"""
+        return _FORMATTERS.get(self.code, _format_note)(self)
+
+    def __str__(self):
+        return self.format()
+
+    def as_dict(self):
+        """Returns the entry as plain data, e.g. for JSON export"""
+        return {
+            "code": self.code,
+            "severity": self.severity,
+            "exams": list(self.exams),
+            "students": list(self.students),
+            "rooms": list(self.rooms),
+            "context": dict(self.context),
+            "message": self.format(),
+        }
+
+def _first_few(ids, values, describe, limit=3):
+    """Formats up to `limit` (id, value) pairs as bullet lines with a count of the rest"""
+    lines = [f"    * {describe(i, v)}" for i, v in list(zip(ids, values))[:limit]]
+    if len(ids) > limit:
+        lines.append(f"    * ... and {len(ids) - limit} more exams")
+    return lines
+
+def _names(ids, limit=5):
+    """Lists the first few IDs, with a count of the rest"""
+    shown = ", ".join(ids[:limit])
+    return shown + (f" and {len(ids) - limit} more" if len(ids) > limit else "")
+
+def _format_note(d):
+    return d.context.get("text", d.code)
+
+def _format_not_enough_slots(d):
+    c = d.context
+    return "\n".join([
+        "IMPOSSIBLE: Not enough time slots",
+        f"  - Total exams to schedule: {c['exam_count']}",
+        f"  - Available time slots: {c['slots']}",
+        f"  - Shortfall: {c['exam_count'] - c['slots']} slots",
+        "\nReasons for insufficient slots:",
+        f"  - Calendar period: {c['period_days']} days",
+        f"  - Available days (after weekends/exclusions): {c['available_days']} days",
+        f"  - Max exams per day: {c['max_exams_day']}",
+        f"  - Calculation: {c['available_days']} days x {c['max_exams_day']} exams/day = {c['slots']} slots",
+    ])
+
+def _format_suggestions(d):
+    lines = [f"\n{d.context.get('title', 'To resolve, try:')}"]
+    numbered = d.context.get("numbered", False)
+    for n, key in enumerate(d.context["items"], 1):
+        bullet = f"{n}." if numbered else "-"
+        lines.append(f"  {bullet} {SUGGESTION_TEXT.get(key, key)}")
+    return "\n".join(lines)
+
+def _format_room_capacity(d):
+    c = d.context
+    lines = [f"  - Room capacity violations: {len(d.exams)} exam(s) exceed max capacity"]
+    lines += _first_few(d.exams, c["sizes"],
+                        lambda e, n: f"Exam {e}: {n} students (max room: {c['max_capacity']})")
+    return "\n".join(lines)
+
+def _format_over_constrained(d):
+    c = d.context
+    lines = [f"  - Exam conflict violations: {len(d.exams)} exam(s) over-constrained"]
+    lines += _first_few(d.exams, c["conflicts"],
+                        lambda e, n: f"Exam {e}: {n} conflicts, but only {c['max_exams_day']} slots/day allowed")
+    return "\n".join(lines)
+
+def _format_min_gap(d):
+    c = d.context
+    lines = [f"  - Minimum gap constraint: {c['min_days']} days between related exams"]
+    if d.exams:
+        lines.append(f"    * Exam {d.exams[0]} ({c['related']} related exams): needs {c['needed_days']} days "
+                     f"but only {c['available_days']} days available")
+    return "\n".join(lines)
+
+def _format_slot_summary(d):
+    c = d.context
+    lines = [
+        f"  - Time slots (initial calc): {c['initial_slots']}",
+        f"  - Time slots (recalculated with current settings): {c['slots']}",
+        f"  - Exams to schedule: {c['exam_count']}",
+    ]
+    if c["slots"] < c["exam_count"]:
+        lines.append(f"  - TIME CONSTRAINT VIOLATION: Need {c['exam_count']} slots but only have {c['slots']}")
+    return "\n".join(lines)
+
+def _format_optimality(d):
+    c = d.context
+    name = {"span": "Exam days used", "back_to_back": "Back-to-back student exams"}.get(c["objective"], c["objective"])
+    status = "proven optimal" if c["proven"] else "best found within the time budget"
+    return f"{name}: {c['value']} (lower bound {c['bound']}, gap {c['gap']:.1%}, {status})"
+
+_FORMATTERS = {
+    "NOTE": _format_note,
+    "NOT_ENOUGH_SLOTS": _format_not_enough_slots,
+    "SUGGESTIONS": _format_suggestions,
+    "MAX_PER_DAY_ADJUSTED": lambda d: f"Adjusted max exams per day to {d.context['max_exams_day']} to handle conflicts",
+    "SEARCH_TIMEOUT": lambda d: "Scheduling timed out - trying greedy approach instead",
+    "UNPLACEABLE_EXAM": lambda d: f"Could not schedule exam {d.exams[0]}",
+    "SUCCESS": lambda d: "Successfully scheduled all exams",
+    "NO_SOLUTION": lambda d: ("IMPOSSIBLE: No valid schedule exists after exhausting all constraint combinations"
+                              "\n\nDiagnostic Analysis:"),
+    "NO_ROOMS": lambda d: "  - CRITICAL: No rooms available for scheduling",
+    "ROOM_SUMMARY": lambda d: (f"  - Rooms available: {d.context['num_rooms']} "
+                               f"(max capacity: {d.context['max_capacity']} students)"),
+    "ROOM_CAPACITY": _format_room_capacity,
+    "SLOT_SUMMARY": _format_slot_summary,
+    "OVER_CONSTRAINED": _format_over_constrained,
+    "MIN_GAP": _format_min_gap,
+    "STUDENT_CLASH": lambda d: (f"Student clash: exams {d.exams[0]} and {d.exams[1]} are both at "
+                                f"{d.context['when']} ({len(d.students)} students: {_names(d.students)})"),
+    "GAP_VIOLATION": lambda d: (f"Gap too short: exams {d.exams[0]} and {d.exams[1]} are {d.context['days']} "
+                                f"day(s) apart, minimum {d.context['min_days']} "
+                                f"({len(d.students)} students: {_names(d.students)})"),
+    "BEST_EFFORT": lambda d: (f"Best timetable found schedules {d.context['scheduled']} exams with "
+                              f"{d.context['affected']} affected students and {d.context['unplaced']} "
+                              f"exams left unscheduled"),
+    "OPTIMALITY": _format_optimality,
+    "BB_TIMEOUT": lambda d: (f"No timetable found within the {d.context['time_budget']:g}s time budget. "
+                             f"The search did not finish, so a valid timetable may still exist - "
+                             f"try a longer time budget or another solver"),
+    "LOAD_ERROR": lambda d: f"ERROR: No {d.context['what']} loaded from {d.context['file']}",
+}
+
+class ClashLog(Sequence):
+    """
+    Ordered collection of Diagnostic records which reads like a list of strings.
+    Deferred producers added with `defer` are run the first time the log is read.
+    """
+    def __init__(self, records=None):
+        self._records = list(records or [])
+        self._pending = []
+
+    def add(self, code, severity=INFO, exams=(), students=(), rooms=(), **context):
+        """Records a diagnostic and returns it"""
+        record = Diagnostic(code, severity, tuple(exams), tuple(students), tuple(rooms), context)
+        self._records.append(record)
+        return record
+
+    def append(self, entry):
+        """Adds a Diagnostic, or a plain line of text as a NOTE"""
+        if not isinstance(entry, Diagnostic):
+            entry = Diagnostic("NOTE", context={"text": str(entry)})
+        self._records.append(entry)
+
+    def defer(self, producer):
+        """
+        Adds a callable returning an iterable of Diagnostics. It is only called when
+        the log is first read, so analysis that nobody looks at is never done.
+        """
+        self._pending.append(producer)
+
+    @property
+    def records(self):
+        """The structured entries, running any deferred producers first"""
+        while self._pending:
+            producer = self._pending.pop(0)
+            self._records.extend(producer())
+        return self._records
+
+    @property
+    def materialised(self):
+        """The entries recorded so far, without running deferred producers"""
+        return list(self._records)
+
+    @property
+    def has_pending(self):
+        """Whether deferred producers are still waiting for the log to be read"""
+        return bool(self._pending)
+
+    def filter(self, severity=None, code=None, exam_id=None):
+        """Returns the records matching every given criterion"""
+        return [
+            r for r in self.records
+            if (severity is None or r.severity == severity)
+            and (code is None or r.code == code)
+            and (exam_id is None or exam_id in r.exams)
+        ]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [r.format() for r in self.records[index]]
+        return self.records[index].format()
+
+    def __repr__(self):
+        return f"ClashLog({self.records!r})"
@@ -1,13 +1,32 @@
 from collections import defaultdict
 from datetime import datetime, timedelta, date, time
 from models import Exam, Room, Placement
+from engine_stats import EngineStats
+from diagnostics import ClashLog, Diagnostic, INFO, WARNING, ERROR
+from preprocessing import InstanceSnapshot
+from enrolment_store import EnrolmentStore
 import random
+import time as clock
+import solver_trace
+
+# Search strategies accepted by the `solver` parameter
+SOLVERS = ("backtrack", "min_conflicts", "branch_and_bound")
+
+# What the branch-and-bound solver minimises: the number of exam days up to the
+# last exam, or students sitting related exams only the minimum gap apart
+OBJECTIVES = ("span", "back_to_back")
+
+# Penalty per shared student in the min-conflicts solver. A student sitting two exams
+# at once is far worse than two exams closer together than min_days_between_exams.
+STUDENT_CLASH_WEIGHT = 100
+GAP_VIOLATION_WEIGHT = 1
 
 class TimetableEngine:
     """
     The TimetableEngine class is responsible for generating examination timetables.
     It uses backtracking algorithms combined with a conflict graph to schedule
     exams while following many constraints.
+    `exams` is a list of Exam objects or an EnrolmentStore for very large cohorts.
     """
     def __init__(self, rooms, exams, student_names,
                  start_date=date.today(),
@@ -20,7 +39,19 @@ class TimetableEngine:
                  custom_time_slots=None,
                  excluded_dates=None,
                  min_days_between_exams=1,
-                 spread_evenly=True):
+                 spread_evenly=True,
+                 cache=None,
+                 max_backtrack_iterations=10000,
+                 profile=False,
+                 profile_memory=False,
+                 snapshot=None,
+                 solver="backtrack",
+                 time_budget=10.0,
+                 seed=0,
+                 objective="span",
+                 progress=None,
+                 trace=None,
+                 max_search_steps=None):
         # Perform basic validation to ensure all data that is needed is provided
         if not rooms:
             raise ValueError("No rooms provided")
@@ -28,6 +59,12 @@ class TimetableEngine:
             raise ValueError("No exams provided")
         if not student_names:
             raise ValueError("No student names provided")
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver '{solver}', expected one of {', '.join(SOLVERS)}")
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {', '.join(OBJECTIVES)}")
+        if snapshot is not None and not snapshot.matches(exams):
+            raise ValueError("Preprocessing snapshot does not match the exams provided")
 
         # Store the input data and configuration parameters
         self.rooms = rooms
@@ -45,12 +82,89 @@ class TimetableEngine:
 
         self.min_days_between_exams = min_days_between_exams
         self.spread_evenly = spread_evenly
+        # Search steps allowed before backtracking gives up and falls back to greedy scheduling
+        self.max_backtrack_iterations = max_backtrack_iterations
+        # Optional SolveCache used to return stored results for identical inputs
+        self.cache = cache
+        # Optional InstanceSnapshot supplying the conflict graph and exam ordering
+        self.snapshot = snapshot
+        # 'backtrack' only accepts timetables meeting every constraint, while
+        # 'min_conflicts' returns the timetable with the fewest violations it finds
+        # within `time_budget` seconds, using `seed` for its random choices
+        self.solver = solver
+        self.time_budget = time_budget
+        self.seed = seed
+        # Objective for 'branch_and_bound', and an optional callable that receives a
+        # dict with the objective, lower bound and optimality gap as they improve
+        self.objective = objective
+        self.progress = progress
+        # Phase timers and search counters, only recorded when profiling is enabled
+        self.profile = profile
+        self.stats = EngineStats(enabled=profile, trace_memory=profile_memory)
+        # Optional path a SolverTrace of the search decisions is written to. While a
+        # run is traced `self.trace` is the open trace, otherwise it is None.
+        self.trace_path = trace
+        self.trace = None
+        # Steps (exams placed plus iterations, or nodes) after which min-conflicts and
+        # branch and bound stop as if out of time, so a replayed trace ends where the
+        # recorded run did
+        self.max_search_steps = max_search_steps
 
         # Initialise internal state variables
-        self.clash_log = []
-        self.conflict_graph = self._build_exam_graph()
+        self.clash_log = ClashLog()
+        # Inputs of the deferred impossibility analysis, kept for the solve cache
+        self._explanation = None
+        self.placements = []
+        self._conflict_graph = None  # Built on first use, or restored from the cache
         self._slot_cache = {}  # Cache for _get_time_slot results
+        self._sizes = None  # Students per exam, built on first use by _exam_sizes
         self.backtrack_iterations = 0
+        self.available_days = None  # Set by _calculate_total_slots
+        # Students with a clash or too short a gap in a best-effort timetable
+        self.affected_students = []
+        # Results of the branch-and-bound solver
+        self.objective_value = None
+        self.lower_bound = None
+        self.optimality_gap = None
+        self.proven_optimal = False
+
+    @property
+    def conflict_graph(self):
+        """The exam conflict graph, built the first time it is needed"""
+        if self._conflict_graph is None:
+            if self.snapshot is not None:
+                self._conflict_graph = self.snapshot.conflict_graph()
+            elif isinstance(self.exams, EnrolmentStore):
+                # Derived from the sparse enrolment matrix instead of comparing exam pairs
+                self._conflict_graph = self.exams.conflict_graph()
+            else:
+                self._conflict_graph = self._build_exam_graph()
+        return self._conflict_graph
+
+    def cache_settings(self):
+        """
+        Returns every parameter that can change the generated timetable.
+        These are hashed together with the input data to form the solve cache key.
+        """
+        return {
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "start_time": self.start_time.strftime("%H:%M"),
+            "end_time": self.end_time.strftime("%H:%M"),
+            "max_exams_day": self.max_exams_day,
+            "min_gap": self.min_gap,
+            "exclude_weekends": self.exclude_weekends,
+            "custom_time_slots": {d: dict(t) for d, t in sorted(self.custom_time_slots.items())},
+            "excluded_dates": sorted(self.excluded_dates),
+            "min_days_between_exams": self.min_days_between_exams,
+            "spread_evenly": self.spread_evenly,
+            "max_backtrack_iterations": self.max_backtrack_iterations,
+            "solver": self.solver,
+            "time_budget": self.time_budget,
+            "seed": self.seed,
+            "objective": self.objective,
+            "max_search_steps": self.max_search_steps,
+        }
 
     def _build_exam_graph(self):
         """
@@ -93,6 +207,8 @@ class TimetableEngine:
             if self._is_valid_date(current_date):
                 available_days += 1
             current_date += timedelta(days=1)
+        # Kept so diagnostics can report it without walking the calendar again
+        self.available_days = available_days
         return available_days * self.max_exams_day
 
     def _get_time_slot(self, slot_number):
@@ -144,6 +260,8 @@ class TimetableEngine:
         Identifies an available room for a specific exam in a given time slot,
         making sure the room has enough capacity and is not already being used for an exam.
         """
+        if self.profile:
+            self.stats.counters["find_room_calls"] += 1
         # Collect rooms that are already assigned to other exams in this slot
         used_rooms = {
             solution[e][1] for e in solution 
@@ -152,7 +270,7 @@ class TimetableEngine:
         
         # Search for a suitable room that meets capacity requirements and is free
         for room in self.rooms:
-            if (room.capacity >= len(exam.student_ids) and 
+            if (room.capacity >= self._exam_sizes()[exam.exam_id] and 
                 room.room_id not in used_rooms):
                 return room.room_id
         return None
@@ -162,67 +280,157 @@ class TimetableEngine:
         Generates the exam timetable by attempting to schedule all exams
         while respecting various constraints. Uses backtracking with fallback to greedy
         scheduling if needed and provides detailed logging of any issues encountered.
+        When a solve cache is attached, identical inputs return the stored result
+        if it could not be improved by solving again.
+        If profiling is enabled, timings and counters are left in `self.stats`.
+        """
+        if self.trace_path is not None:
+            # A trace needs the search to run, so the solve cache is not consulted
+            self.trace = solver_trace.SolverTrace.for_engine(self.trace_path, self)
+            try:
+                with self.stats.run():
+                    return self._generate()
+            finally:
+                self.trace.close()
+                self.trace = None
+
+        with self.stats.run():
+            if self.cache is None:
+                return self._generate()
+
+            # The key is taken before solving because generation can adjust max_exams_day
+            with self.stats.phase("cache_lookup"):
+                key = self.cache.make_key(self.rooms, self.exams, self.student_names, self.cache_settings())
+                cached = self.cache.get(key)
+            if cached is not None:
+                if self.profile:
+                    self.stats.counters["cache_hits"] += 1
+                self._restore_cached_result(cached)
+                return cached["success"]
+
+            success = self._generate()
+            if self._cacheable(success):
+                self.cache.put(key, self._cached_result(success))
+            return success
+
+    def _cacheable(self, success):
         """
+        Whether a result may be reused for the same inputs. Backtracking is
+        deterministic, but the time-budgeted solvers can do better on another run
+        unless they found a clash-free timetable or proved their result optimal.
+        """
+        if self.solver == "backtrack":
+            return True
+        if self.solver == "branch_and_bound":
+            return success and self.proven_optimal
+        return success
+
+    def _cached_result(self, success):
+        """Collects the solution and derived artefacts that are stored in the solve cache"""
+        return {
+            "success": success,
+            "placements": [
+                (p.exam_id, p.subject, p.room_id, p.date, p.start, p.end, list(p.student_ids))
+                for p in self.placements
+            ],
+            # Reading the whole log would run the deferred explanation, so only what is
+            # recorded is stored, with what is needed to defer the explanation again
+            "clash_log": self.clash_log.materialised,
+            "explanation": self._explanation if self.clash_log.has_pending else None,
+            "conflict_graph": {exam_id: sorted(n) for exam_id, n in self.conflict_graph.items()},
+            "slot_calendar": dict(self._slot_cache),
+            "max_exams_day": self.max_exams_day,
+            "backtrack_iterations": self.backtrack_iterations,
+            "affected_students": list(self.affected_students),
+            "optimality": (self.objective_value, self.lower_bound, self.optimality_gap, self.proven_optimal),
+        }
+
+    def _restore_cached_result(self, cached):
+        """Restores the engine state from a solve cache entry"""
+        self.placements = [Placement(*row) for row in cached["placements"]]
+        self.clash_log = ClashLog(cached["clash_log"])
+        self._conflict_graph = defaultdict(set, {e: set(n) for e, n in cached["conflict_graph"].items()})
+        self._slot_cache = dict(cached["slot_calendar"])
+        self.max_exams_day = cached["max_exams_day"]
+        self.backtrack_iterations = cached["backtrack_iterations"]
+        self.affected_students = list(cached.get("affected_students", []))
+        (self.objective_value, self.lower_bound,
+         self.optimality_gap, self.proven_optimal) = cached.get("optimality", (None, None, None, False))
+        if cached.get("explanation"):
+            exam_order, total_slots = cached["explanation"]
+            self._calculate_total_slots()  # The analysis reads available_days
+            exams_by_id = {e.exam_id: e for e in self.exams}
+            self._defer_explanation([exams_by_id[exam_id] for exam_id in exam_order],
+                                    self._conflict_graph, total_slots)
+
+    def _generate(self):
+        """Runs the scheduling process without consulting the solve cache"""
         # Initialise the placements list and clash log
         self.placements = []
-        self.clash_log = []
+        self.clash_log = ClashLog()
+        self._explanation = None
+        self.affected_students = []
         
-        # Construct the conflict graph to identify exam conflicts
-        exam_graph = self._build_exam_graph()
-        total_slots = self._calculate_total_slots()
+        # Use the conflict graph to identify exam conflicts
+        with self.stats.phase("graph"):
+            exam_graph = self.conflict_graph
+        with self.stats.phase("slot_calendar"):
+            total_slots = self._calculate_total_slots()
         
-        # Check if there are sufficient time slots for all exams
-        if total_slots < len(self.exams):
-            self.clash_log.append(f"IMPOSSIBLE: Not enough time slots")
-            self.clash_log.append(f"  - Total exams to schedule: {len(self.exams)}")
-            self.clash_log.append(f"  - Available time slots: {total_slots}")
-            self.clash_log.append(f"  - Shortfall: {len(self.exams) - total_slots} slots")
-            self.clash_log.append("\nReasons for insufficient slots:")
-            
-            # Provides a detailed breakdown of available days and slots
-            available_days = 0
-            current_date = self.start_date
-            while current_date <= self.end_date:
-                if self._is_valid_date(current_date):
-                    available_days += 1
-                current_date += timedelta(days=1)
-            
-            self.clash_log.append(f"  - Calendar period: {(self.end_date - self.start_date).days + 1} days")
-            self.clash_log.append(f"  - Available days (after weekends/exclusions): {available_days} days")
-            self.clash_log.append(f"  - Max exams per day: {self.max_exams_day}")
-            self.clash_log.append(f"  - Calculation: {available_days} days x {self.max_exams_day} exams/day = {total_slots} slots")
-            self.clash_log.append("\nSuggestions to fix:")
-            self.clash_log.append("  1. Increase the exam period (extend end date)")
-            self.clash_log.append("  2. Increase max exams per day")
-            self.clash_log.append("  3. Remove excluded dates")
-            self.clash_log.append("  4. Enable weekends if possible (uncheck 'Exclude Weekends')")
+        # Check if there are sufficient time slots for all exams. Best-effort solving
+        # only needs some slots, since it may share slots between exams.
+        if total_slots == 0 or (total_slots < len(self.exams) and self.solver == "backtrack"):
+            self.clash_log.add(
+                "NOT_ENOUGH_SLOTS", ERROR,
+                exam_count=len(self.exams),
+                slots=total_slots,
+                period_days=(self.end_date - self.start_date).days + 1,
+                available_days=self.available_days,
+                max_exams_day=self.max_exams_day,
+            )
+            self.clash_log.add(
+                "SUGGESTIONS", INFO, title="Suggestions to fix:", numbered=True,
+                items=("extend_period", "more_per_day", "remove_exclusions", "enable_weekends"),
+            )
             return False
         
         # Sort examinations by their constraint complexity to prioritise the difficult ones
-        sorted_exams = sorted(
-            self.exams,
-            key=lambda e: (len(exam_graph[e.exam_id]), len(e.student_ids)),
-            reverse=True
-        )
+        if self.snapshot is not None:
+            exams_by_id = {e.exam_id: e for e in self.exams}
+            sorted_exams = [exams_by_id[exam_id] for exam_id in self.snapshot.ordering()]
+        else:
+            sizes = self._exam_sizes()
+            sorted_exams = sorted(
+                self.exams,
+                key=lambda e: (len(exam_graph[e.exam_id]), sizes[e.exam_id]),
+                reverse=True
+            )
         
+        if self.solver == "min_conflicts":
+            return self._generate_min_conflicts(sorted_exams, total_slots)
+        if self.solver == "branch_and_bound":
+            return self._generate_branch_and_bound(sorted_exams, exam_graph, total_slots)
+
         # Adjust the maximum exams per day if necessary to accommodate conflicts
         max_conflicts = max(len(exam_graph[e.exam_id]) for e in self.exams)
         if max_conflicts >= self.max_exams_day:
             self.max_exams_day = max_conflicts + 1
-            self.clash_log.append(f"Adjusted max exams per day to {self.max_exams_day} to handle conflicts")
+            self.clash_log.add("MAX_PER_DAY_ADJUSTED", WARNING, max_exams_day=self.max_exams_day,
+                               max_conflicts=max_conflicts)
         
         # Attempt to schedule using the backtracking algorithm
-        solution = self._backtrack_schedule(sorted_exams, exam_graph, total_slots)
+        with self.stats.phase("search"):
+            solution = self._backtrack_schedule(sorted_exams, exam_graph, total_slots)
         
         if solution:
             # Convert the solution into placement objects
-            self._convert_solution_to_placements(solution)
-            self.clash_log.append("Successfully scheduled all exams")
+            with self.stats.phase("conversion"):
+                self._convert_solution_to_placements(solution)
+            self.clash_log.add("SUCCESS", INFO, scheduled=len(self.placements))
             return True
         else:
-            self.clash_log.append("IMPOSSIBLE: No valid schedule exists after exhausting all constraint combinations")
-            # Provides detailed explanation of why scheduling failed
-            self._explain_impossibility(sorted_exams, exam_graph, total_slots)
+            self.clash_log.add("NO_SOLUTION", ERROR, exam_count=len(self.exams))
+            self._defer_explanation(sorted_exams, exam_graph, total_slots)
             return False
 
     def _backtrack_schedule(self, exams, graph, total_slots, partial_solution=None, depth=0):
@@ -235,10 +443,16 @@ class TimetableEngine:
             self.backtrack_iterations = 0
         
         self.backtrack_iterations += 1
+        if self.profile:
+            self.stats.counters["nodes"] += 1
         
         # Implement a timeout to avoid infinite loops in complex cases
-        if self.backtrack_iterations > 10000:
-            self.clash_log.append("Scheduling timed out - trying greedy approach instead")
+        if self.backtrack_iterations > self.max_backtrack_iterations:
+            self.clash_log.add("SEARCH_TIMEOUT", WARNING, iterations=self.backtrack_iterations, depth=depth)
+            if self.profile:
+                self.stats.counters["greedy_fallbacks"] += 1
+            if self.trace is not None:
+                self.trace.record(solver_trace.FALLBACK, depth=depth, aux=self.backtrack_iterations)
             return self._greedy_schedule(exams, graph, total_slots)
         
         # Base case: if all exams have been scheduled, return the solution
@@ -259,6 +473,9 @@ class TimetableEngine:
             room_id = self._find_room(current_exam, slot, partial_solution)
             if room_id:
                 partial_solution[current_exam.exam_id] = (slot, room_id)
+                if self.trace is not None:
+                    self.trace.record(solver_trace.ASSIGN, current_exam.exam_id, slot, depth,
+                                      self.trace.room(room_id))
                 
                 # Recursively attempt to schedule the remaining exams
                 result = self._backtrack_schedule(exams, graph, total_slots, partial_solution, depth + 1)
@@ -267,6 +484,8 @@ class TimetableEngine:
                 
                 # If scheduling failed remove this assignment and try the next slot
                 del partial_solution[current_exam.exam_id]
+                if self.trace is not None:
+                    self.trace.record(solver_trace.BACKTRACK, current_exam.exam_id, slot, depth)
         
         return None
     
@@ -287,23 +506,513 @@ class TimetableEngine:
                     room_id = self._find_room(exam, slot, solution)
                     if room_id:
                         solution[exam.exam_id] = (slot, room_id)
+                        if self.trace is not None:
+                            self.trace.record(solver_trace.ASSIGN, exam.exam_id, slot, len(solution) - 1,
+                                              self.trace.room(room_id))
                         scheduled = True
                         break
             
             # If no slot could be found the greedy approach has failed
             if not scheduled:
-                self.clash_log.append(f"Could not schedule exam {exam.exam_id}")
+                self.clash_log.add("UNPLACEABLE_EXAM", ERROR, exams=(exam.exam_id,),
+                                   students=exam.student_ids, slots_tried=total_slots)
                 return None
         
         return solution
 
+    def _conflict_weights(self):
+        """Returns exam_id -> {conflicting exam_id: number of shared students}"""
+        if self.snapshot is None and isinstance(self.exams, EnrolmentStore):
+            return self.exams.conflict_weights()
+        snapshot = self.snapshot or InstanceSnapshot.build(self.exams)
+        return snapshot.adjacency
+
+    def _generate_min_conflicts(self, sorted_exams, total_slots):
+        """
+        Produces the timetable with the fewest weighted violations found within the
+        time budget, recording every clash and gap violation in the clash log.
+        Returns True only if the timetable has no violations at all.
+        """
+        weights = self._conflict_weights()
+        with self.stats.phase("search"):
+            solution, unplaced = self._min_conflicts_schedule(sorted_exams, weights, total_slots)
+
+        with self.stats.phase("conversion"):
+            self._convert_solution_to_placements(solution)
+        for exam in unplaced:
+            self.clash_log.add("UNPLACEABLE_EXAM", ERROR, exams=(exam.exam_id,),
+                               students=exam.student_ids, slots_tried=total_slots)
+
+        # Report the exact students affected by each remaining violation
+        exams_by_id = {e.exam_id: e for e in self.exams}
+        affected = set()
+        for exam_id, (slot, _) in solution.items():
+            for other, weight in weights.get(exam_id, {}).items():
+                if other not in solution or other < exam_id:
+                    continue
+                other_slot = solution[other][0]
+                gap = abs(self._slot_day(slot) - self._slot_day(other_slot))
+                if slot != other_slot and gap >= self.min_days_between_exams:
+                    continue
+                students = sorted(set(exams_by_id[exam_id].student_ids) & set(exams_by_id[other].student_ids))
+                affected.update(students)
+                when = self._get_time_slot(slot).strftime("%Y-%m-%d %H:%M")
+                if slot == other_slot:
+                    self.clash_log.add("STUDENT_CLASH", ERROR, exams=(exam_id, other),
+                                       students=students, when=when)
+                else:
+                    self.clash_log.add("GAP_VIOLATION", WARNING, exams=(exam_id, other),
+                                       students=students, days=gap, min_days=self.min_days_between_exams)
+        self.affected_students = sorted(affected)
+
+        if affected or unplaced:
+            self.clash_log.add("BEST_EFFORT", WARNING, scheduled=len(solution),
+                               unplaced=len(unplaced), affected=len(affected))
+            return False
+        self.clash_log.add("SUCCESS", INFO, scheduled=len(self.placements))
+        return True
+
+    def _slot_day(self, slot):
+        """Calendar day number of a slot, used to measure gaps between exams"""
+        return self._get_time_slot(slot).toordinal()
+
+    def _slot_days(self, total_slots):
+        """
+        _slot_day for every slot, walking the calendar once rather than from the
+        start date for each slot
+        """
+        days = []
+        current_date = self.start_date
+        while len(days) * self.max_exams_day < total_slots and current_date <= self.end_date:
+            if self._is_valid_date(current_date):
+                days.append(current_date.toordinal())
+            current_date += timedelta(days=1)
+        return [days[slot // self.max_exams_day] if slot // self.max_exams_day < len(days)
+                else self._slot_day(slot) for slot in range(total_slots)]
+
+    def _min_conflicts_schedule(self, exams, weights, total_slots):
+        """
+        Min-conflicts local search over slot assignments. Rooms are a hard constraint;
+        student clashes and gaps shorter than min_days_between_exams are penalised by
+        the number of students involved. Returns (best solution, exams with no room).
+        """
+        rng = random.Random(self.seed)
+        deadline = clock.perf_counter() + self.time_budget
+        day_of = self._slot_days(total_slots)
+        min_days = self.min_days_between_exams
+
+        def penalty(slot_a, slot_b):
+            if slot_a == slot_b:
+                return STUDENT_CLASH_WEIGHT
+            if abs(day_of[slot_a] - day_of[slot_b]) < min_days:
+                return GAP_VIOLATION_WEIGHT
+            return 0
+
+        solution = {}
+        by_id = {e.exam_id: e for e in exams}
+        # Rooms in use in each slot, and the rooms big enough for each exam in the
+        # order _find_room tries them, so a free room is found without scanning the solution
+        used_rooms = defaultdict(set)
+        sizes = self._exam_sizes()
+        fitting = {e.exam_id: [r.room_id for r in self.rooms if r.capacity >= sizes[e.exam_id]]
+                   for e in exams}
+        # Slots that an exam in each slot can clash with or be too close to
+        slots_by_day = defaultdict(list)
+        for slot in range(total_slots):
+            slots_by_day[day_of[slot]].append(slot)
+        near = [[other for day in range(day_of[slot] - min_days + 1, day_of[slot] + min_days)
+                 for other in slots_by_day.get(day, ()) if other != slot] + [slot]
+                for slot in range(total_slots)]
+
+        def cost_at(exam_id, slot):
+            """Penalty an exam would have in a slot against the exams already placed"""
+            total = 0
+            for other, weight in weights.get(exam_id, {}).items():
+                placed = solution.get(other)
+                if placed is not None:
+                    total += weight * penalty(slot, placed[0])
+            return total
+
+        def slot_costs(exam_id):
+            """cost_at for every slot at once, only visiting the slots near each neighbour"""
+            costs = [0] * total_slots
+            for other, weight in weights.get(exam_id, {}).items():
+                placed = solution.get(other)
+                if placed is not None and other != exam_id:
+                    for slot in near[placed[0]]:
+                        costs[slot] += weight * penalty(slot, placed[0])
+            return costs
+
+        def free_room(exam, slot):
+            used = used_rooms[slot]
+            return next((r for r in fitting[exam.exam_id] if r not in used), None)
+
+        def place(exam_id, slot, room_id):
+            solution[exam_id] = (slot, room_id)
+            used_rooms[slot].add(room_id)
+
+        # Exams placed while building the first timetable and local search
+        # iterations both count as steps, which replays stop after
+        steps = 0
+        stopped = False
+
+        def out_of_time():
+            nonlocal stopped
+            if not stopped and (clock.perf_counter() >= deadline or steps == self.max_search_steps):
+                stopped = True
+                if self.trace is not None:
+                    self.trace.record(solver_trace.STOP, aux=steps)
+            return stopped
+
+        # Start from a greedy assignment, placing each exam where it costs least.
+        # If the time budget runs out first, the remaining exams take the first
+        # slot with a free room so a timetable is still returned.
+        unplaced = []
+        for exam in exams:
+            best, best_cost = [], None
+            if out_of_time():
+                room_id = None
+                for slot in range(total_slots):
+                    room_id = free_room(exam, slot)
+                    if room_id is not None:
+                        best = [(slot, room_id)]
+                        break
+            else:
+                steps += 1
+                costs = slot_costs(exam.exam_id)
+                for slot in range(total_slots):
+                    room_id = free_room(exam, slot)
+                    if room_id is None:
+                        continue
+                    cost = costs[slot]
+                    if best_cost is None or cost < best_cost:
+                        best, best_cost = [(slot, room_id)], cost
+                    elif cost == best_cost:
+                        best.append((slot, room_id))
+            if best:
+                slot, room_id = rng.choice(best)
+                place(exam.exam_id, slot, room_id)
+                if self.trace is not None:
+                    self.trace.record(solver_trace.ASSIGN, exam.exam_id, slot, len(solution) - 1,
+                                      self.trace.room(room_id))
+            else:
+                unplaced.append(exam)
+
+        costs = {exam_id: cost_at(exam_id, placed[0]) for exam_id, placed in solution.items()}
+        # Each violation is counted from both ends, so halve the sum
+        current = sum(costs.values()) // 2
+        best_solution, best_total = dict(solution), current
+        tabu = {}
+        iteration = 0
+
+        while current > 0:
+            if out_of_time():
+                break
+            iteration += 1
+            steps += 1
+            if self.profile:
+                self.stats.counters["min_conflicts_iterations"] += 1
+            conflicted = [exam_id for exam_id, cost in costs.items() if cost > 0]
+            exam_id = rng.choice(conflicted)
+            exam = by_id[exam_id]
+            old_slot, old_room = solution[exam_id]
+
+            # Pick the least penalised slot, occasionally a random one to escape plateaus
+            candidates = [slot for slot in range(total_slots)
+                          if slot != old_slot and tabu.get((exam_id, slot), 0) < iteration]
+            if not candidates:
+                continue
+            if rng.random() < 0.05:
+                rng.shuffle(candidates)
+                choices = candidates[:1]
+            else:
+                slot_cost = slot_costs(exam_id)
+                choices, choice_cost = [], None
+                for slot in candidates:
+                    cost = slot_cost[slot]
+                    if choice_cost is None or cost < choice_cost:
+                        choices, choice_cost = [slot], cost
+                    elif cost == choice_cost:
+                        choices.append(slot)
+            rng.shuffle(choices)
+            new_slot = room_id = None
+            for slot in choices:
+                room_id = free_room(exam, slot)
+                if room_id:
+                    new_slot = slot
+                    break
+            if new_slot is None:
+                continue
+
+            # Apply the move and update the penalties of the exam and its neighbours
+            for other, weight in weights.get(exam_id, {}).items():
+                if other in solution:
+                    other_slot = solution[other][0]
+                    change = weight * (penalty(new_slot, other_slot) - penalty(old_slot, other_slot))
+                    costs[other] += change
+                    current += change
+            used_rooms[old_slot].discard(old_room)
+            place(exam_id, new_slot, room_id)
+            costs[exam_id] = cost_at(exam_id, new_slot)
+            # Stop the exam moving straight back for a few iterations
+            tabu[(exam_id, old_slot)] = iteration + 10
+            if self.profile:
+                self.stats.counters["min_conflicts_moves"] += 1
+            if self.trace is not None:
+                self.trace.record(solver_trace.MOVE, exam_id, new_slot, 0, old_slot)
+
+            if current < best_total:
+                best_solution, best_total = dict(solution), current
+                if self.trace is not None:
+                    self.trace.record(solver_trace.SOLUTION, aux=best_total)
+
+        return best_solution, unplaced
+
+    def _generate_branch_and_bound(self, sorted_exams, graph, total_slots):
+        """
+        Finds the timetable minimising `self.objective` with branch and bound,
+        recording the objective, lower bound and optimality gap. If the time budget
+        runs out the best timetable found so far is used.
+        """
+        # The budget covers building the weights and bounds as well as the search
+        deadline = clock.perf_counter() + self.time_budget
+        weights = self._conflict_weights() if self.objective == "back_to_back" else None
+        with self.stats.phase("search"):
+            solution, proven = self._branch_and_bound_schedule(sorted_exams, graph, weights, total_slots,
+                                                               deadline)
+
+        if solution is None:
+            self.proven_optimal = proven
+            if not proven:
+                # Running out of time proves nothing, so there is no impossibility to explain
+                self.clash_log.add("BB_TIMEOUT", ERROR, time_budget=self.time_budget)
+                return False
+            self.clash_log.add("NO_SOLUTION", ERROR, exam_count=len(self.exams), proven=proven)
+            self._defer_explanation(sorted_exams, graph, total_slots)
+            return False
+
+        with self.stats.phase("conversion"):
+            self._convert_solution_to_placements(solution)
+        self.clash_log.add("OPTIMALITY", INFO, objective=self.objective, value=self.objective_value,
+                           bound=self.lower_bound, gap=self.optimality_gap, proven=self.proven_optimal)
+        self.clash_log.add("SUCCESS", INFO, scheduled=len(self.placements))
+        return True
+
+    def _clique_lower_bound(self, graph, day_of_index):
+        """
+        Days needed by the largest clique of mutually conflicting exams found greedily,
+        since every exam in it must be at least min_days_between_exams apart.
+        """
+        largest = []
+        # Greedy cliques grown from the most connected exams
+        for start in sorted(graph, key=lambda e: len(graph[e]), reverse=True)[:50]:
+            clique = [start]
+            # Ties are broken by exam ID so the bound does not depend on set order
+            for candidate in sorted(graph[start], key=lambda e: (len(graph[e]), e), reverse=True):
+                if all(candidate in graph[member] for member in clique):
+                    clique.append(candidate)
+            if len(clique) > len(largest):
+                largest = clique
+        # Place the clique on the earliest days allowed by the gap rule
+        placed, last_day = 0, None
+        for index, day in enumerate(day_of_index):
+            if last_day is None or day - last_day >= self.min_days_between_exams:
+                placed, last_day = placed + 1, day
+                if placed >= len(largest):
+                    return index + 1
+        # The clique cannot fit at all, so no timetable exists
+        return len(day_of_index) + 1
+
+    def _exam_sizes(self):
+        """
+        Maps each exam ID to its number of distinct students. For an EnrolmentStore
+        the sizes come from the row offsets rather than the exams' student ID views;
+        a list may repeat a student, so its IDs are counted as a set like the store's.
+        """
+        if self._sizes is None:
+            if isinstance(self.exams, EnrolmentStore):
+                self._sizes = {e.exam_id: self.exams.size(i) for i, e in enumerate(self.exams)}
+            else:
+                self._sizes = {e.exam_id: len(set(e.student_ids)) for e in self.exams}
+        return self._sizes
+
+    def _capacity_lower_bound(self):
+        """
+        Days needed so that every exam gets a big enough room, given one exam per
+        room per slot: exams too big for rooms under each capacity share the rest.
+        """
+        bound = 1
+        sizes = list(self._exam_sizes().values())
+        for cap in {0} | {r.capacity for r in self.rooms}:
+            exams_over = sum(1 for size in sizes if size > cap)
+            rooms_over = sum(1 for r in self.rooms if r.capacity > cap)
+            if exams_over and rooms_over:
+                per_day = rooms_over * self.max_exams_day
+                bound = max(bound, -(-exams_over // per_day))
+        return bound
+
+    def _report_bound(self, best, bound, nodes):
+        """Updates the optimality gap and passes it to the progress callback"""
+        self.objective_value = best
+        self.lower_bound = bound
+        self.optimality_gap = (best - bound) / best if best else 0.0
+        if self.progress is not None:
+            self.progress({"objective": best, "bound": bound, "gap": self.optimality_gap, "nodes": nodes})
+
+    def _branch_and_bound_schedule(self, exams, graph, weights, total_slots, deadline):
+        """
+        Depth-first branch and bound over slot assignments using an explicit stack,
+        so large instances do not hit the recursion limit. Returns the best solution
+        found (or None) and whether the search finished before `deadline`, proving
+        it optimal.
+        """
+        per_day = self.max_exams_day
+        day_of = self._slot_days(total_slots)
+        day_index = [slot // per_day for slot in range(total_slots)]
+        day_of_index = [day_of[d * per_day] for d in range(-(-total_slots // per_day))]
+        min_days = self.min_days_between_exams
+        # Rooms big enough for each exam, in the order _find_room would try them
+        sizes = self._exam_sizes()
+        fitting = {e.exam_id: [r.room_id for r in self.rooms if r.capacity >= sizes[e.exam_id]] for e in exams}
+
+        if self.objective == "span":
+            root_bound = max(self._clique_lower_bound(graph, day_of_index), self._capacity_lower_bound())
+        else:
+            root_bound = 0
+
+        solution = {}
+        used_rooms = defaultdict(set)
+        # Count of exams on each day index, so the span of a partial timetable is known
+        exams_on_day = defaultdict(int)
+        partial_cost = 0
+
+        def pair_cost(slot_a, slot_b):
+            # Related exams exactly at the minimum allowed gap count as back to back
+            return 1 if abs(day_of[slot_a] - day_of[slot_b]) <= max(1, min_days) else 0
+
+        def candidates(exam):
+            """Valid (slot, room, added cost) choices for an exam, most promising first"""
+            neighbours = [(solution[n][0], n) for n in graph[exam.exam_id] if n in solution]
+            choices = []
+            for slot in range(total_slots):
+                if any(abs(day_of[slot] - day_of[other]) < min_days or slot == other
+                       for other, _ in neighbours):
+                    continue
+                room_id = next((r for r in fitting[exam.exam_id] if r not in used_rooms[slot]), None)
+                if room_id is None:
+                    continue
+                if weights is None:
+                    added = 0
+                else:
+                    added = sum(weights[exam.exam_id].get(n, 0) * pair_cost(slot, other)
+                                for other, n in neighbours)
+                choices.append((slot, room_id, added))
+            if weights is not None:
+                choices.sort(key=lambda c: (c[2], c[0]))
+            return choices
+
+        def objective():
+            if weights is None:
+                return max(d for d, count in exams_on_day.items() if count) + 1
+            return partial_cost
+
+        best_value, best_solution = None, None
+        nodes = 0
+        finished = True
+        stack = [iter(candidates(exams[0]))]
+        assigned = []
+
+        def undo():
+            nonlocal partial_cost
+            exam_id, slot, room_id, added = assigned.pop()
+            del solution[exam_id]
+            used_rooms[slot].discard(room_id)
+            exams_on_day[day_index[slot]] -= 1
+            partial_cost -= added
+            if self.trace is not None:
+                self.trace.record(solver_trace.BACKTRACK, exam_id, slot, len(assigned))
+
+        while stack:
+            nodes += 1
+            # Each node can scan every slot, so the clock is checked at every one
+            if clock.perf_counter() > deadline or nodes == self.max_search_steps:
+                finished = False
+                if self.trace is not None:
+                    self.trace.record(solver_trace.STOP, aux=nodes)
+                break
+            choice = next(stack[-1], None)
+            if choice is None:
+                stack.pop()
+                if assigned:
+                    undo()
+                continue
+            if len(assigned) == len(stack):
+                # Replace the previous choice at this depth
+                undo()
+
+            exam = exams[len(stack) - 1]
+            slot, room_id, added = choice
+            solution[exam.exam_id] = (slot, room_id)
+            used_rooms[slot].add(room_id)
+            exams_on_day[day_index[slot]] += 1
+            partial_cost += added
+            assigned.append((exam.exam_id, slot, room_id, added))
+            if self.trace is not None:
+                self.trace.record(solver_trace.ASSIGN, exam.exam_id, slot, len(assigned) - 1,
+                                  self.trace.room(room_id))
+            value = objective()
+
+            if len(assigned) == len(exams):
+                if best_value is None or value < best_value:
+                    best_value, best_solution = value, dict(solution)
+                    self._report_bound(best_value, root_bound, nodes)
+                    if self.trace is not None:
+                        self.trace.record(solver_trace.SOLUTION, depth=len(assigned), aux=best_value)
+                    if best_value <= root_bound:
+                        # Matches the lower bound, so nothing better exists
+                        break
+                continue
+
+            # Bound: the partial objective plus what the next exam must add at least
+            next_choices = candidates(exams[len(stack)])
+            if not next_choices:
+                if self.profile:
+                    self.stats.counters["bb_dead_ends"] += 1
+                continue
+            if weights is None:
+                bound = max(value, root_bound, day_index[next_choices[0][0]] + 1)
+            else:
+                bound = value + next_choices[0][2]
+            if best_value is not None and bound >= best_value:
+                if self.profile:
+                    self.stats.counters["bb_pruned"] += 1
+                if self.trace is not None:
+                    self.trace.record(solver_trace.REJECT, exam.exam_id, slot, len(assigned) - 1,
+                                      solver_trace.BOUND)
+                continue
+            stack.append(iter(next_choices))
+
+        if self.profile:
+            self.stats.counters["bb_nodes"] += nodes
+        if best_solution is not None:
+            # A completed search proves the incumbent optimal
+            self._report_bound(best_value, best_value if finished else root_bound, nodes)
+        self.proven_optimal = finished
+        return best_solution, finished
+
     def _is_valid_slot(self, slot, exam, neighbors, solution):
         """
         Verifies if a specific time slot is suitable for an examination, this considers
         considering room availability and constraints related to conflicting exams.
         """
+        if self.profile:
+            self.stats.counters["slot_checks"] += 1
         # First perform a quick check for room availability as it's the fastest validation
         if not self._find_room(exam, slot, solution):
+            if self.profile:
+                self.stats.counters["rejected_no_room"] += 1
+            if self.trace is not None:
+                self.trace.record(solver_trace.REJECT, exam.exam_id, slot, len(solution), solver_trace.NO_ROOM)
             return False
         
         # Ensure no conflicting exams are scheduled too close together
@@ -316,6 +1025,11 @@ class TimetableEngine:
                 # Enforce the minimum gap between related examinations
                 days_gap = abs((slot_date - neighbor_date).days)
                 if days_gap < self.min_days_between_exams:
+                    if self.profile:
+                        self.stats.counters["rejected_min_gap"] += 1
+                    if self.trace is not None:
+                        self.trace.record(solver_trace.REJECT, exam.exam_id, slot, len(solution),
+                                          solver_trace.MIN_GAP)
                     return False
         
         return True
@@ -325,8 +1039,9 @@ class TimetableEngine:
         Transforms the internal solution dictionary into a list of Placement objects,
         calculating the exact start and end times for each examination.
         """
+        exams_by_id = {e.exam_id: e for e in self.exams}
         for exam_id, (slot, room_id) in solution.items():
-            exam = next(e for e in self.exams if e.exam_id == exam_id)
+            exam = exams_by_id[exam_id]
             start_time = self._get_time_slot(slot)
             end_time = start_time + timedelta(minutes=exam.duration)
             
@@ -338,100 +1053,85 @@ class TimetableEngine:
                     start_time.strftime("%Y-%m-%d"), #'2023-12-01'
                     start_time.strftime("%H:%M"), #'09:00'
                     end_time.strftime("%H:%M"), #'11:00'
-                    exam.student_ids #['S1', 'S2', 'S3']
+                    list(exam.student_ids) #['S1', 'S2', 'S3'], copied out of an EnrolmentStore
                 )
             )
         # Sort the placements by date and start time for a logical order
         self.placements.sort(key=lambda p: (p.date, p.start))
 
+    def _defer_explanation(self, exams, graph, total_slots):
+        """
+        Adds the impossibility analysis to the clash log, to be worked out only if
+        the log is read. The exam order and slot count are kept for the solve cache.
+        """
+        self._explanation = ([e.exam_id for e in exams], total_slots)
+        self.clash_log.defer(lambda: self._explain_impossibility(exams, graph, total_slots))
+
     def _explain_impossibility(self, exams, graph, total_slots):
         """
         Provides an analysis or diagnostic of why scheduling failed,
         identifying constraint violations and offering suggestions for resolution.
+        Yields Diagnostic records, so it only runs when the clash log is read.
         """
-        self.clash_log.append("\nDiagnostic Analysis:")
-        
         # Verify that rooms are available for scheduling
         if not self.rooms:
-            self.clash_log.append("  - CRITICAL: No rooms available for scheduling")
+            yield Diagnostic("NO_ROOMS", ERROR)
             return
         
         # Analyse room capacity constraints
-        try:
-            max_capacity = max(r.capacity for r in self.rooms)
-            num_rooms = len(self.rooms)
-            self.clash_log.append(f"  - Rooms available: {num_rooms} (max capacity: {max_capacity} students)")
-            
-            oversized_exams = []
-            for exam in exams:
-                if len(exam.student_ids) > max_capacity:
-                    oversized_exams.append((exam.exam_id, len(exam.student_ids)))
-            
-            if oversized_exams:
-                self.clash_log.append(f"  - Room capacity violations: {len(oversized_exams)} exam(s) exceed max capacity")
-                for exam_id, num_students in oversized_exams[:3]:
-                    self.clash_log.append(f"    * Exam {exam_id}: {num_students} students (max room: {max_capacity})")
-                if len(oversized_exams) > 3:
-                    self.clash_log.append(f"    * ... and {len(oversized_exams) - 3} more exams")
-        except ValueError as e:
-            self.clash_log.append("  - ERROR: Problem calculating room capacities")
-            return
+        max_capacity = max(r.capacity for r in self.rooms)
+        yield Diagnostic("ROOM_SUMMARY", INFO, rooms=tuple(r.room_id for r in self.rooms),
+                         context={"num_rooms": len(self.rooms), "max_capacity": max_capacity})
         
-        # Reassess time slot availability with current configuration
-        available_days = 0
-        current_date = self.start_date
-        while current_date <= self.end_date:
-            if self._is_valid_date(current_date):
-                available_days += 1
-            current_date += timedelta(days=1)
-
-        recalculated_slots = available_days * self.max_exams_day
-        self.clash_log.append(f"  - Time slots (initial calc): {total_slots}")
-        self.clash_log.append(f"  - Time slots (recalculated with current settings): {recalculated_slots}")
-        self.clash_log.append(f"  - Exams to schedule: {len(exams)}")
-
-        if recalculated_slots < len(exams):
-            self.clash_log.append(
-                f"  - TIME CONSTRAINT VIOLATION: Need {len(exams)} slots but only have {recalculated_slots}"
-            )
+        sizes = self._exam_sizes()
+        if isinstance(self.exams, EnrolmentStore):
+            # The row offsets show whether any exam is too big without reading the exams
+            oversized = (set(self.exams.exams_over_capacity(max_capacity))
+                         if self.exams.largest_exam() > max_capacity else set())
+            oversized_exams = [e for e in exams if e.exam_id in oversized]
+        else:
+            oversized_exams = [e for e in exams if sizes[e.exam_id] > max_capacity]
+        if oversized_exams:
+            yield Diagnostic("ROOM_CAPACITY", ERROR,
+                             exams=tuple(e.exam_id for e in oversized_exams),
+                             context={"sizes": tuple(sizes[e.exam_id] for e in oversized_exams),
+                                      "max_capacity": max_capacity})
         
-        # Identify exams that are very constrained by conflicts
-        highly_constrained = []
-        for exam in exams:
-            conflicts = len(graph[exam.exam_id])
-            if conflicts >= self.max_exams_day:
-                highly_constrained.append((exam.exam_id, conflicts))
+        # Reassess time slot availability with the (possibly adjusted) exams per day
+        yield Diagnostic("SLOT_SUMMARY", ERROR if self.available_days * self.max_exams_day < len(exams) else INFO,
+                         context={"initial_slots": total_slots,
+                                  "slots": self.available_days * self.max_exams_day,
+                                  "exam_count": len(exams)})
         
+        # Identify exams that are very constrained by conflicts
+        highly_constrained = [e for e in exams if len(graph[e.exam_id]) >= self.max_exams_day]
         if highly_constrained:
-            self.clash_log.append(f"  - Exam conflict violations: {len(highly_constrained)} exam(s) over-constrained")
-            for exam_id, conflicts in highly_constrained[:3]:
-                self.clash_log.append(
-                    f"    * Exam {exam_id}: {conflicts} conflicts, but only {self.max_exams_day} slots/day allowed"
-                )
-            if len(highly_constrained) > 3:
-                self.clash_log.append(f"    * ... and {len(highly_constrained) - 3} more exams")
+            yield Diagnostic("OVER_CONSTRAINED", WARNING,
+                             exams=tuple(e.exam_id for e in highly_constrained),
+                             context={"conflicts": tuple(len(graph[e.exam_id]) for e in highly_constrained),
+                                      "max_exams_day": self.max_exams_day})
         
         # Evaluate minimum gap constraints between related exams
         if self.min_days_between_exams > 1:
-            self.clash_log.append(f"  - Minimum gap constraint: {self.min_days_between_exams} days between related exams")
-            
-            # Identify exams with numerous related exams within a short timeframe
+            context = {"min_days": self.min_days_between_exams}
+            culprit = None
+            # Identify the first exam with numerous related exams within a short timeframe
+            available_period = (self.end_date - self.start_date).days
             for exam in exams:
                 neighbors = graph[exam.exam_id]
                 if len(neighbors) > 2:
                     min_period_needed = self.min_days_between_exams * len(neighbors)
-                    available_period = (self.end_date - self.start_date).days
                     if min_period_needed > available_period:
-                        self.clash_log.append(
-                            f"    * Exam {exam.exam_id} ({len(neighbors)} related exams): needs {min_period_needed} days "
-                            f"but only {available_period} days available"
-                        )
+                        culprit = exam
+                        context.update(related=len(neighbors), needed_days=min_period_needed,
+                                       available_days=available_period)
                         break
+            if culprit:
+                yield Diagnostic("MIN_GAP", WARNING, exams=(culprit.exam_id,),
+                                 students=tuple(culprit.student_ids), context=context)
+            else:
+                yield Diagnostic("MIN_GAP", INFO, context=context)
         
         # Provide suggestions for resolving the scheduling issues
-        self.clash_log.append("\nTo resolve, try:")
-        self.clash_log.append("  - Extend the exam period (increase end date)")
-        self.clash_log.append("  - Increase max exams per day")
-        self.clash_log.append("  - Remove excluded dates")
-        self.clash_log.append("  - Enable weekends")
-        self.clash_log.append("  - Reduce minimum gap between related exams")    
\ No newline at end of file
+        yield Diagnostic("SUGGESTIONS", INFO, context={
+            "items": ("extend_period", "more_per_day", "remove_exclusions", "enable_weekends", "reduce_gap")})
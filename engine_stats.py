@@ -0,0 +1,120 @@
+"""
+Engine Statistics Module
+
+This module records where time and memory go during a timetable generation.
+The engine times each phase (conflict graph, slot calendar, search, conversion)
+and counts the work done inside the search, such as nodes visited, room lookups
+and the reasons slots were rejected. Recording is switched off by default, in
+which case the engine only checks a single flag in its inner loops.
+"""
+
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Order and labels used when phases and counters are shown to the user
+PHASE_LABELS = {
+    "cache_lookup": "Solve cache lookup",
+    "graph": "Conflict graph build",
+    "slot_calendar": "Slot calendar",
+    "search": "Search",
+    "conversion": "Conversion to placements",
+    "total": "Total",
+}
+
+COUNTER_LABELS = {
+    "nodes": "Search nodes visited",
+    "find_room_calls": "_find_room calls",
+    "slot_checks": "Slots checked",
+    "rejected_no_room": "Slots rejected: no free room",
+    "rejected_min_gap": "Slots rejected: too close to a related exam",
+    "greedy_fallbacks": "Greedy fallbacks",
+    "cache_hits": "Solve cache hits",
+}
+
+class EngineStats:
+    """
+    Phase timers, counters and optional peak memory for one engine run.
+    When `enabled` is False nothing is recorded and `phase` returns a shared no-op.
+    """
+    _NO_OP = nullcontext()
+
+    def __init__(self, enabled=False, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.timers = {}
+        self.counters = defaultdict(int)
+        self.peak_memory_bytes = None
+
+    def reset(self):
+        """Clears the results of a previous run"""
+        self.timers = {}
+        self.counters = defaultdict(int)
+        self.peak_memory_bytes = None
+
+    def phase(self, name):
+        """Context manager adding the time spent inside it to the named phase"""
+        if not self.enabled:
+            return self._NO_OP
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - started
+
+    @contextmanager
+    def run(self):
+        """
+        Wraps a whole generation, timing it as the 'total' phase and, when memory
+        tracing is on, recording the peak memory allocated by Python during it.
+        """
+        if not self.enabled:
+            yield
+            return
+        self.reset()
+        started_tracing = False
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+        try:
+            with self._timed("total"):
+                yield
+        finally:
+            if self.trace_memory:
+                self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def as_dict(self):
+        """Returns the statistics as plain data, e.g. for JSON output"""
+        return {
+            "timers": dict(self.timers),
+            "counters": dict(self.counters),
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+    def format_lines(self):
+        """Returns the statistics as lines of text for display"""
+        if not self.enabled:
+            return ["Statistics were not recorded for this run."]
+        lines = ["Phase timings:"]
+        for name in list(PHASE_LABELS) + sorted(set(self.timers) - set(PHASE_LABELS)):
+            if name in self.timers:
+                label = PHASE_LABELS.get(name, name)
+                lines.append(f"  - {label}: {self.timers[name] * 1000:.1f} ms")
+        lines.append("Counters:")
+        for name in list(COUNTER_LABELS) + sorted(set(self.counters) - set(COUNTER_LABELS)):
+            if name in self.counters:
+                label = COUNTER_LABELS.get(name, name)
+                lines.append(f"  - {label}: {self.counters[name]:,}")
+        if self.peak_memory_bytes is not None:
+            lines.append(f"Peak memory: {self.peak_memory_bytes / (1024 * 1024):.2f} MB")
+        return lines
@@ -0,0 +1,337 @@
+"""
+Enrolment Store Module
+
+This module stores which students sit which exams as a sparse matrix in
+compressed sparse row (CSR) form: one row per exam, one column per student.
+Student IDs are interned to integers in sorted order, so each enrolment costs a
+4 byte index instead of a Python string in a list. The store is written to a
+binary file and memory-mapped when opened, so district-scale cohorts do not
+have to fit in memory as Python objects.
+
+An EnrolmentStore behaves like a list of Exam objects whose `student_ids` are
+read from the file on demand, so it can be passed to TimetableEngine in place of
+a list of exams. Each exam's students are stored once each, in ID order, as
+csv_input.read_exams returns them. Exam sizes come straight from the row offsets,
+and the conflict graph is counted from the transposed matrix by grouping students
+who sit the same set of exams, in a plain Python loop over the students.
+"""
+
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from models import Exam
+
+MAGIC = b"TTCSR1"
+# Increase this when the layout of the file changes
+STORE_VERSION = 1
+# Magic, version, byte order (0 little, 1 big), exam count, student count, enrolment count
+_HEADER = struct.Struct("<6sBBIIQ")
+# (offset, length) of each section, in the order of SECTIONS
+SECTIONS = ("indptr", "indices", "id_offsets", "id_blob", "name_offsets", "name_blob", "exams")
+_SECTION_TABLE = struct.Struct("<" + "QQ" * len(SECTIONS))
+_ALIGNMENT = 8
+
+class StudentIdView(Sequence):
+    """Read-only list of the student IDs enrolled on one exam, decoded on access"""
+    def __init__(self, store, exam_index):
+        self.store = store
+        self.start = store.indptr[exam_index]
+        self.stop = store.indptr[exam_index + 1]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store.student_id(self.store.indices[self.start + i])
+                    for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("student index out of range")
+        return self.store.student_id(self.store.indices[self.start + index])
+
+    def __iter__(self):
+        student_id, indices = self.store.student_id, self.store.indices
+        for position in range(self.start, self.stop):
+            yield student_id(indices[position])
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"StudentIdView({len(self)} students)"
+
+class StudentNames(Mapping):
+    """Student ID to full name mapping read from the store, found by binary search"""
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, sid):
+        return self.store.student_name(self.store.student_index(sid))
+
+    def __len__(self):
+        return self.store.num_students
+
+    def __iter__(self):
+        for index in range(self.store.num_students):
+            yield self.store.student_id(index)
+
+class _IdList(Sequence):
+    """Sorted student IDs as a sequence, so bisect can search them without decoding all"""
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.num_students
+
+    def __getitem__(self, index):
+        return self.store.student_id(index)
+
+class EnrolmentStore(Sequence):
+    """
+    Memory-mapped CSR enrolment matrix with the exams' details.
+    Open an existing file with `open`, or create one with `write` or `from_csv`.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, byte_order, num_exams, num_students, nnz = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != STORE_VERSION:
+            view.release()
+            self.close()
+            raise ValueError("Not an enrolment store or an unsupported version")
+        if byte_order != (0 if sys.byteorder == "little" else 1):
+            view.release()
+            self.close()
+            raise ValueError("The enrolment store was written on a machine with a different byte order")
+        table = _SECTION_TABLE.unpack_from(view, _HEADER.size)
+        sections = {name: view[table[2 * i]:table[2 * i] + table[2 * i + 1]]
+                    for i, name in enumerate(SECTIONS)}
+
+        self.num_exams = num_exams
+        self.num_students = num_students
+        self.nnz = nnz
+        # The integer sections are used in place through typed views of the mapping
+        self.indptr = sections["indptr"].cast("Q")
+        self.indices = sections["indices"].cast("I")
+        self._id_offsets = sections["id_offsets"].cast("Q")
+        self._id_blob = sections["id_blob"]
+        self._name_offsets = sections["name_offsets"].cast("Q")
+        self._name_blob = sections["name_blob"]
+        details = json.loads(bytes(sections["exams"]).decode())
+
+        self._views = [self.indptr, self.indices, self._id_offsets, self._name_offsets,
+                       self._id_blob, self._name_blob] + list(sections.values()) + [view]
+        self.exams = [
+            Exam(exam_id, subject, duration, StudentIdView(self, i))
+            for i, (exam_id, subject, duration) in enumerate(details)
+        ]
+        self.student_names = StudentNames(self)
+        self._weights = None
+
+    @classmethod
+    def open(cls, path):
+        """Opens an existing store file"""
+        return cls(path)
+
+    def close(self):
+        """Releases the memory mapping. Exams and views read from it stop working."""
+        for view in getattr(self, "_views", []):
+            view.release()
+        self._views = []
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # The store reads as the list of its exams
+    def __len__(self):
+        return self.num_exams
+
+    def __getitem__(self, index):
+        return self.exams[index]
+
+    def __iter__(self):
+        return iter(self.exams)
+
+    def student_id(self, index):
+        return bytes(self._id_blob[self._id_offsets[index]:self._id_offsets[index + 1]]).decode()
+
+    def student_name(self, index):
+        return bytes(self._name_blob[self._name_offsets[index]:self._name_offsets[index + 1]]).decode()
+
+    def student_index(self, sid):
+        """Returns the interned index of a student ID, raising KeyError if it is unknown"""
+        ids = _IdList(self)
+        index = bisect_left(ids, sid)
+        if index == self.num_students or ids[index] != sid:
+            raise KeyError(sid)
+        return index
+
+    def size(self, exam_index):
+        """Number of students on an exam, read from the row offsets"""
+        return self.indptr[exam_index + 1] - self.indptr[exam_index]
+
+    def largest_exam(self):
+        """Size of the largest exam, the smallest room capacity that fits every exam"""
+        return max((self.size(i) for i in range(self.num_exams)), default=0)
+
+    def exams_over_capacity(self, capacity):
+        """IDs of exams with more students than `capacity`"""
+        return [e.exam_id for i, e in enumerate(self.exams) if self.size(i) > capacity]
+
+    def update_digest(self, digest):
+        """
+        Feeds the exams' details and the raw enrolment, student ID and name sections
+        into a hashlib object, so the store's content is hashed without decoding it
+        """
+        details = [(e.exam_id, e.subject, e.duration) for e in self.exams]
+        for section in (self.indptr, self.indices, self._id_offsets, self._id_blob,
+                        self._name_offsets, self._name_blob, json.dumps(details).encode()):
+            digest.update(struct.pack("<Q", memoryview(section).nbytes))
+            digest.update(section)
+
+    def conflict_weights(self):
+        """
+        Returns exam_id -> {conflicting exam_id: number of shared students}.
+        The matrix is transposed to list each student's exams, then students with
+        the same set of exams are counted together, so a cohort costs one pass over
+        its exam pairs rather than one per student. This is a loop over students
+        in Python, not a vectorised matrix product.
+        """
+        if self._weights is not None:
+            return self._weights
+
+        # Transpose: which exams each student sits, in exam order
+        counts = array("I", bytes(4 * (self.num_students + 1)))
+        for student in self.indices:
+            counts[student + 1] += 1
+        for i in range(self.num_students):
+            counts[i + 1] += counts[i]
+        student_ptr = array("Q", counts)
+        fill = array("Q", counts)
+        student_exams = array("I", bytes(4 * self.nnz))
+        for exam in range(self.num_exams):
+            for position in range(self.indptr[exam], self.indptr[exam + 1]):
+                student = self.indices[position]
+                student_exams[fill[student]] = exam
+                fill[student] += 1
+
+        combinations = defaultdict(int)
+        for student in range(self.num_students):
+            start, stop = student_ptr[student], student_ptr[student + 1]
+            if stop - start > 1:
+                combinations[tuple(student_exams[start:stop])] += 1
+
+        weights = defaultdict(dict)
+        exam_ids = [e.exam_id for e in self.exams]
+        for exams, count in combinations.items():
+            for i, a in enumerate(exams):
+                row = weights[exam_ids[a]]
+                for b in exams[i + 1:]:
+                    other = exam_ids[b]
+                    row[other] = row.get(other, 0) + count
+                    weights[other][exam_ids[a]] = row[other]
+        self._weights = weights
+        return weights
+
+    def conflict_graph(self):
+        """Returns the unweighted conflict graph in the form the engine uses"""
+        return defaultdict(set, {e: set(n) for e, n in self.conflict_weights().items() if n})
+
+    @classmethod
+    def write(cls, path, exams, student_names):
+        """
+        Writes a store from a list of Exam objects and a student ID -> name mapping.
+        A student repeated on an exam is stored once.
+        """
+        students = sorted(set(student_names) | {sid for e in exams for sid in e.student_ids})
+        index = {sid: i for i, sid in enumerate(students)}
+        indptr = array("Q", [0])
+        indices = array("I")
+        for exam in exams:
+            indices.extend(sorted({index[sid] for sid in exam.student_ids}))
+            indptr.append(len(indices))
+        details = [(e.exam_id, e.subject, e.duration) for e in exams]
+        _write_file(path, indptr, indices, students, [student_names.get(s, "") for s in students], details)
+        return cls(path)
+
+    @classmethod
+    def from_csv(cls, path, exams_file, students_file):
+        """
+        Builds a store from the exams and students CSV files used by the GUI,
+        reading the exams file twice rather than keeping its rows in memory.
+        """
+        names = {}
+        with open(students_file, newline="") as f:
+            for row in csv.DictReader(f):
+                names[row["student_id"]] = row["full_name"]
+        ids = set(names)
+        with open(exams_file, newline="") as f:
+            for row in csv.DictReader(f):
+                ids.update(row["student_ids"].split(";"))
+
+        students = sorted(ids)
+        index = {sid: i for i, sid in enumerate(students)}
+        indptr = array("Q", [0])
+        indices = array("I")
+        details = []
+        with open(exams_file, newline="") as f:
+            for row in csv.DictReader(f):
+                indices.extend(sorted({index[sid] for sid in row["student_ids"].split(";")}))
+                indptr.append(len(indices))
+                details.append((row["exam_id"], row["subject"], int(row["duration_minutes"])))
+        _write_file(path, indptr, indices, students, [names.get(s, "") for s in students], details)
+        return cls(path)
+
+def _string_section(strings):
+    """Encodes strings as an offsets array and one UTF-8 blob"""
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode()
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+def _write_file(path, indptr, indices, students, names, details):
+    """Writes the header, section table and 8-byte aligned sections through a temp file"""
+    id_offsets, id_blob = _string_section(students)
+    name_offsets, name_blob = _string_section(names)
+    sections = [indptr.tobytes(), indices.tobytes(), id_offsets.tobytes(), id_blob,
+                name_offsets.tobytes(), name_blob, json.dumps(details).encode()]
+
+    position = _HEADER.size + _SECTION_TABLE.size
+    table = []
+    for data in sections:
+        position += -position % _ALIGNMENT
+        table += [position, len(data)]
+        position += len(data)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, STORE_VERSION, 0 if sys.byteorder == "little" else 1,
+                             len(details), len(students), len(indices)))
+        f.write(_SECTION_TABLE.pack(*table))
+        for offset, data in zip(table[::2], sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(data)
+    os.replace(temp_path, path)
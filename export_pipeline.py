@@ -0,0 +1,139 @@
+"""
+Export Pipeline Module
+
+This module runs exports on a background thread so the window stays responsive
+while large numbers of files are written. The export task reports each file it
+finishes to a queue which the Tk thread drains with `root.after`, so widgets are
+only ever touched from the Tk thread. A running export can be cancelled, and
+files are written through a temporary file and renamed into place, so an export
+that fails or is cancelled never leaves a half written file behind.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+# How often the Tk thread collects progress from a running export, in milliseconds
+POLL_INTERVAL_MS = 100
+
+class ExportCancelled(Exception):
+    """Raised inside an export task to stop it once the user has cancelled it"""
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yields a temporary path beside `path` to write to. The temporary file replaces
+    `path` when the block finishes, and is removed instead if the block raises.
+    """
+    temp_path = path + ".tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class ExportJob:
+    """
+    An export task running on a worker thread. `task(job)` does the export and
+    calls `report` as each file is finished; its return value becomes `result`.
+    On the Tk thread, `on_progress(job)` is called whenever new files have been
+    reported and `on_finish(job)` once the task has returned, failed or been cancelled.
+    """
+    def __init__(self, root, task, on_progress=None, on_finish=None):
+        self.root = root
+        self.task = task
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+
+        # Progress as seen by the Tk thread, updated from the queue
+        self.total = None
+        self.completed = 0
+        self.failures = {}
+        self.current = None
+        self.result = None
+        self.error = None
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._events = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Starts the task on its thread and begins polling for progress"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+        return self
+
+    # Called from the worker thread
+
+    def set_total(self, total):
+        """Sets how many files the export will write"""
+        self._events.put(("total", total))
+
+    def report(self, name, error=None):
+        """Records that a file was written, or failed with the message `error`"""
+        self._events.put(("file", name, error))
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Raises ExportCancelled if the user has cancelled the export"""
+        if self._cancel.is_set():
+            raise ExportCancelled()
+
+    def _run(self):
+        try:
+            result = self.task(self)
+            self._events.put(("done", result, None))
+        except ExportCancelled:
+            self._events.put(("done", None, None))
+        except Exception as e:
+            self._events.put(("done", None, e))
+
+    # Called from the Tk thread
+
+    def cancel(self):
+        """Asks the task to stop; it finishes the file in progress first"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _poll(self):
+        changed = False
+        done = None
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if event[0] == "total":
+                self.total = event[1]
+            elif event[0] == "file":
+                _, name, error = event
+                self.current = name
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failures[name] = error
+            else:
+                done = event
+
+        if changed and self.on_progress:
+            self.on_progress(self)
+        if done is None:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+            return
+        _, self.result, self.error = done
+        self.finished = True
+        if self.on_finish:
+            self.on_finish(self)
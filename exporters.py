@@ -0,0 +1,213 @@
+"""
+Lightweight Export Module
+
+This module exports examination timetables as CSV, JSON and iCalendar (.ics) files.
+Each format is produced by a generator that yields the output a piece at a time, so
+large timetables can be written straight to a file or into a zip archive without
+building the whole document in memory. Unlike PDF export, no ReportLab rendering is
+involved, which makes publishing every student's calendar cheap enough to repeat on
+every change. Files are written through a temporary file and renamed into place.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import zipfile
+from collections import defaultdict
+from datetime import datetime, timezone
+from export_pipeline import atomic_path
+
+FIELDS = ["exam_id", "subject", "room_id", "date", "start", "end", "student_ids"]
+
+def index_by_student(placements):
+    """Maps each student ID to the placements they sit, in a single pass"""
+    index = defaultdict(list)
+    for p in placements:
+        for sid in p.student_ids:
+            index[sid].append(p)
+    return index
+
+def index_by_room(placements):
+    """Maps each room ID to the placements held in it"""
+    index = defaultdict(list)
+    for p in placements:
+        index[p.room_id].append(p)
+    return index
+
+def iter_rows_csv(header, rows):
+    """Yields CSV text one line at a time for a header and an iterable of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(header)
+    for values in rows:
+        yield line(values)
+
+def iter_csv(placements, include_students=True):
+    """
+    Yields a CSV timetable one line at a time, starting with the header.
+    Student IDs are written `;`-joined, matching the exams CSV input format.
+    """
+    fields = FIELDS if include_students else FIELDS[:-1]
+
+    def rows():
+        for p in placements:
+            values = [p.exam_id, p.subject, p.room_id, p.date, p.start, p.end]
+            if include_students:
+                values.append(";".join(p.student_ids))
+            yield values
+    return iter_rows_csv(fields, rows())
+
+def iter_json(placements):
+    """Yields a JSON array of placements one object at a time"""
+    yield "["
+    for i, p in enumerate(placements):
+        record = {
+            "exam_id": p.exam_id,
+            "subject": p.subject,
+            "room_id": p.room_id,
+            "date": p.date,
+            "start": p.start,
+            "end": p.end,
+            "student_ids": list(p.student_ids),
+        }
+        yield ("," if i else "") + "\n  " + json.dumps(record)
+    yield "\n]\n"
+
+def _ics_escape(text):
+    """Escapes text values as required by RFC 5545"""
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+def _ics_line(line):
+    """Folds a content line to 75 octets and terminates it with CRLF"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    # Continuation lines start with a space, so they carry one octet less
+    while len(encoded) > (75 if not parts else 74):
+        # Avoid splitting inside a multi-byte character
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+def _ics_datetime(date_str, time_str):
+    """Converts 'YYYY-MM-DD' and 'HH:MM' into a floating iCalendar date-time"""
+    return date_str.replace("-", "") + "T" + time_str.replace(":", "") + "00"
+
+def iter_ics(placements, calendar_name, uid_suffix):
+    """
+    Yields an iCalendar document with one event per placement.
+    Times are written as local (floating) times, as they are shown in the timetable.
+    `uid_suffix` makes event UIDs unique per calendar, e.g. the student ID.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield _ics_line("BEGIN:VCALENDAR")
+    yield _ics_line("VERSION:2.0")
+    yield _ics_line("PRODID:-//Exam Timetable Generator//EN")
+    yield _ics_line("CALSCALE:GREGORIAN")
+    yield _ics_line(f"X-WR-CALNAME:{_ics_escape(calendar_name)}")
+    for p in placements:
+        yield _ics_line("BEGIN:VEVENT")
+        yield _ics_line(f"UID:{_ics_escape(p.exam_id)}-{_ics_escape(uid_suffix)}@exam-timetable")
+        yield _ics_line(f"DTSTAMP:{stamp}")
+        yield _ics_line(f"DTSTART:{_ics_datetime(p.date, p.start)}")
+        yield _ics_line(f"DTEND:{_ics_datetime(p.date, p.end)}")
+        yield _ics_line(f"SUMMARY:{_ics_escape(p.subject)} exam ({_ics_escape(p.exam_id)})")
+        yield _ics_line(f"LOCATION:{_ics_escape(p.room_id)}")
+        yield _ics_line("END:VEVENT")
+    yield _ics_line("END:VCALENDAR")
+
+def iter_student_ics(placements, student_id, student_name=None):
+    """Yields the iCalendar document for one student's exams"""
+    name = student_name or student_id
+    return iter_ics(placements, f"Exam Timetable - {name}", student_id)
+
+def iter_room_csv(placements):
+    """Yields the schedule for a single room as CSV, in date and time order"""
+    ordered = sorted(placements, key=lambda p: (p.date, p.start))
+    return iter_csv(ordered, include_students=False)
+
+def write_stream(chunks, path):
+    """Writes generated text chunks to a file as they are produced"""
+    with atomic_path(path) as temp_path:
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+def _safe_name(text):
+    """Turns an ID into a string that is safe to use as a file name"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(text))
+
+def _unique_names(ids):
+    """
+    Maps each ID to a safe file name. IDs whose names would clash, such as S/1 and
+    S_1, or S1 and s1 on a case-insensitive file system, all get a short hash of the
+    raw ID appended, so no file overwrites another whatever order the IDs come in.
+    """
+    groups = defaultdict(list)
+    for item in ids:
+        groups[_safe_name(item).lower()].append(item)
+    names = {}
+    for group in groups.values():
+        for item in group:
+            names[item] = _safe_name(item)
+            if len(group) > 1:
+                names[item] += "-" + hashlib.sha1(str(item).encode("utf-8")).hexdigest()[:8]
+    return names
+
+def export_bundle(placements, student_names, target, progress=None):
+    """
+    Exports the full timetable as CSV and JSON, an .ics calendar per student and a
+    CSV schedule per room. `target` is either a folder or a path ending in .zip, in
+    which case every file is streamed into the archive as it is generated.
+    `progress(name, done, total)` is called after each file is written, and may
+    raise ExportCancelled to stop the export, which leaves a zip `target` untouched.
+    Returns the number of files written.
+    """
+    by_student = index_by_student(placements)
+    by_room = index_by_room(placements)
+
+    files = [("timetable.csv", lambda: iter_csv(placements)),
+             ("timetable.json", lambda: iter_json(placements))]
+    student_files = _unique_names(student_names)
+    for sid, name in student_names.items():
+        files.append((f"students/{student_files[sid]}.ics",
+                      lambda sid=sid, name=name: iter_student_ics(by_student.get(sid, []), sid, name)))
+    room_files = _unique_names(by_room)
+    for room_id in sorted(by_room):
+        files.append((f"rooms/{room_files[room_id]}.csv",
+                      lambda room_id=room_id: iter_room_csv(by_room[room_id])))
+
+    total = len(files)
+    if target.lower().endswith(".zip"):
+        with atomic_path(target) as temp_path:
+            with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for done, (name, make_chunks) in enumerate(files, 1):
+                    with archive.open(name, "w") as member:
+                        for chunk in make_chunks():
+                            member.write(chunk.encode("utf-8"))
+                    if progress:
+                        progress(name, done, total)
+    else:
+        os.makedirs(os.path.join(target, "students"), exist_ok=True)
+        os.makedirs(os.path.join(target, "rooms"), exist_ok=True)
+        for done, (name, make_chunks) in enumerate(files, 1):
+            write_stream(make_chunks(), os.path.join(target, *name.split("/")))
+            if progress:
+                progress(name, done, total)
+    return total
@@ -1,28 +1,37 @@
-import csv
+import json
 import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from datetime import datetime, timedelta, date
-from tkcalendar import Calendar
-from models import Room, Exam
-from engine import TimetableEngine
-from pdf_export import export_to_pdf
 import tkinter.simpledialog
-from database import TimetableDatabase
+from timetable_view import VirtualTimetableView
+from search_index import SearchIndex
+from diagnostics import ClashLog, SEVERITIES, ERROR
+from csv_input import read_rooms, read_students, read_exams
 from types import SimpleNamespace
 
-import csv
-import os
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from datetime import datetime, timedelta, date
-from tkcalendar import Calendar
-from models import Room, Exam
-from engine import TimetableEngine
-from pdf_export import export_to_pdf
-import tkinter.simpledialog
-from database import TimetableDatabase
-from types import SimpleNamespace
+# ReportLab (pdf_export), tkcalendar, the database, the solve cache and the engine
+# with its solvers are slow to load, so they are imported when first used rather
+# than when the window opens.
+# Exports run on a background thread through export_pipeline, reporting progress
+# back to the window with `root.after`.
+
+# Database file used for saved timetables; the solve cache and snapshots sit beside it
+DB_FILE = "timetables.db"
+
+# Number of rows read from the database at a time when a list is scrolled
+TREE_PAGE_SIZE = 200
+
+# Solver choices shown in the settings, mapped to the engine's `solver` and `objective`
+SOLVER_LABELS = {
+    "Backtracking (all constraints)": ("backtrack", "span"),
+    "Min-conflicts (best effort)": ("min_conflicts", "span"),
+    "Optimal: shortest exam period": ("branch_and_bound", "span"),
+    "Optimal: fewest back-to-back exams": ("branch_and_bound", "back_to_back"),
+}
+
+# Delay after the last keystroke before the filter box is applied, in milliseconds
+FILTER_DELAY_MS = 200
 
 class TimetableApp:
     def __init__(self, root):
@@ -95,6 +104,34 @@ class TimetableApp:
                                     variable=self.spread_evenly_var)
         spread_check.pack(anchor="w")
 
+        # Solver choice. Min-conflicts always produces a timetable, reporting the
+        # students affected by any clashes. Branch and bound searches for the best
+        # timetable. Both stop after the time budget
+        solver_frame = tk.Frame(advanced_frame)
+        solver_frame.pack(fill="x", pady=5)
+        tk.Label(solver_frame, text="Solver:").pack(side="left")
+        self.solver_var = tk.StringVar(value=next(iter(SOLVER_LABELS)))
+        ttk.Combobox(solver_frame, textvariable=self.solver_var, values=list(SOLVER_LABELS),
+                     state="readonly", width=30).pack(side="left", padx=5)
+        tk.Label(solver_frame, text="Time budget (s):").pack(side="left", padx=(10, 0))
+        self.time_budget_var = tk.IntVar(value=10)
+        tk.Spinbox(solver_frame, from_=1, to=600, textvariable=self.time_budget_var, width=5).pack(side="left", padx=5)
+
+        # Profiling options, shown with the View Stats button after a run
+        profile_frame = tk.Frame(advanced_frame)
+        profile_frame.pack(fill="x")
+        self.profile_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(profile_frame, text="Record solver statistics",
+                       variable=self.profile_var).pack(side="left")
+        self.profile_memory_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(profile_frame, text="Include peak memory (slower)",
+                       variable=self.profile_memory_var).pack(side="left", padx=5)
+        # Writes every search decision to a file in trace_folder, which can be
+        # replayed and summarised offline with `python -m solver_trace`
+        self.trace_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(profile_frame, text="Record solver trace",
+                       variable=self.trace_var).pack(side="left", padx=5)
+
         # Date exclusion and custom times buttons
         button_frame = tk.Frame(advanced_frame)
         button_frame.pack(fill="x", pady=5)
@@ -115,12 +152,27 @@ class TimetableApp:
         # times for specific dates when present.
         self.custom_time_slots = {}
 
+        # Filter box which narrows the results on each keystroke. Words can match the
+        # start of student names or IDs, subjects, rooms, exam IDs or dates
+        filter_frame = tk.Frame(root)
+        filter_frame.pack(fill="x", padx=10)
+        tk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(filter_frame, textvariable=self.filter_var, width=40)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind("<KeyRelease>", self.schedule_filter)
+        self.filter_status = tk.Label(filter_frame, text="")
+        self.filter_status.pack(side=tk.LEFT, padx=5)
+        self.filter_job = None
+        # Background search for the filter box, replaced by each newer query
+        self.filter_search = None
+        self.search_index = None
+
         # Treeview
-        self.tree = ttk.Treeview(root, columns=("Exam ID", "Subject", "Room", "Date", "Start", "End"), show="headings")
-        for col in self.tree["columns"]:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=120)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        # Only the visible rows are rendered; clicking a column heading sorts by it
+        self.results_view = VirtualTimetableView(root, page_size=TREE_PAGE_SIZE)
+        self.results_view.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.tree = self.results_view.tree
 
         # Buttons
         btn_frame = tk.Frame(root)
@@ -128,19 +180,62 @@ class TimetableApp:
         tk.Button(btn_frame, text="Generate Timetable", command=self.load_and_generate).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Export PDF", command=self.export_pdf).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Export Individual PDFs", command=self.export_individual_pdfs).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Export Combined PDF", command=self.export_combined_pdf).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Export Calendars", command=self.export_calendars).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Search Student", command=self.search_student).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="View Clash Log", command=self.view_clash_log).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="View Stats", command=self.view_stats).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Clear All", command=self.clear_all).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Saved Timetables", 
                  command=self.show_saved_timetables).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Analytics",
+                 command=self.show_analytics).pack(side=tk.LEFT, padx=5)
 
         self.placements = []
         self.student_names = {}
         self.engine = None
-        # Persistent database object used for saving/loading timetables.
-        # Exposed on the app instance so dialogs can call `get_saved_timetables`,
-        # `save_timetable` and `load_timetable` directly.
-        self.db = TimetableDatabase()
+        # Id of the saved timetable currently shown, or None for an unsaved result.
+        # When set, per-student lookups are answered by the database index.
+        self.timetable_id = None
+        # Version of the saved timetable being shown. The enrolment index only
+        # covers the base snapshot, so later versions are searched in memory.
+        self.timetable_version = None
+        self.timetable_indexed = False
+        # Generator of placements still to be read from the database for a loaded
+        # timetable. Rows are pulled into `self.placements` as they are needed.
+        self.placement_stream = None
+        # The database and solve cache are opened on first use by the `db` and
+        # `solve_cache` properties, so they do not slow down startup
+        self._db = None
+        self._solve_cache = None
+        # Export running on the background pipeline, if any
+        self.export_job = None
+        # Preprocessed conflict graphs for each exams CSV, updated with only the
+        # enrolments that changed since the last run
+        self.snapshot_folder = os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), "snapshots")
+        # Solver traces recorded when 'Record solver trace' is ticked
+        self.trace_folder = os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), "traces")
+
+    @property
+    def db(self):
+        """
+        Persistent database object used for saving/loading timetables.
+        Exposed on the app instance so dialogs can call `get_saved_timetables`,
+        `save_timetable` and `load_timetable` directly. Connections are pooled per
+        thread, so background workers can share this object safely.
+        """
+        if self._db is None:
+            from database import TimetableDatabase
+            self._db = TimetableDatabase(DB_FILE)
+        return self._db
+
+    @property
+    def solve_cache(self):
+        """Results of previous generations, so regenerating unchanged inputs is instant"""
+        if self._solve_cache is None:
+            from solve_cache import SolveCache
+            self._solve_cache = SolveCache.beside(DB_FILE)
+        return self._solve_cache
 
     def browse_file(self, var):
         """
@@ -168,45 +263,47 @@ class TimetableApp:
                 return
 
             # Load room data from CSV
-            rooms = []
             with open(rooms_file, newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    rooms.append(Room(row["room_id"], int(row["capacity"])))
+                rooms = read_rooms(f)
 
             # If no rooms were loaded, provide a useful clash_log entry
             if not rooms:
-                self.engine = SimpleNamespace(clash_log=[f"ERROR: No rooms loaded from {rooms_file}"])
+                self.engine = SimpleNamespace(clash_log=self.load_error_log("rooms", rooms_file))
                 messagebox.showerror("Error", f"No rooms found in {rooms_file}. Please check the CSV file.")
                 return
 
             # Load students
-            self.student_names = {}
             with open(students_file, newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    self.student_names[row["student_id"]] = row["full_name"]
+                self.student_names = read_students(f)
 
             # If no students were loaded, provide clash_log entry
             if not self.student_names:
-                self.engine = SimpleNamespace(clash_log=[f"ERROR: No students loaded from {students_file}"])
+                self.engine = SimpleNamespace(clash_log=self.load_error_log("students", students_file))
                 messagebox.showerror("Error", f"No students found in {students_file}. Please check the CSV file.")
                 return
 
             # Load exams
-            exams = []
             with open(exams_file, newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    students = row["student_ids"].split(";")
-                    exams.append(Exam(row["exam_id"], row["subject"], int(row["duration_minutes"]), students))
+                exams = read_exams(f)
 
             # If no exams were loaded, provide clash_log entry
             if not exams:
-                self.engine = SimpleNamespace(clash_log=[f"ERROR: No exams loaded from {exams_file}"])
+                self.engine = SimpleNamespace(clash_log=self.load_error_log("exams", exams_file))
                 messagebox.showerror("Error", f"No exams found in {exams_file}. Please check the CSV file.")
                 return
 
+            # Imported here rather than at startup; see the note at the top of the module
+            from engine import TimetableEngine
+            from preprocessing import InstanceSnapshot, snapshot_path
+
+            # Load the preprocessed instance, applying any enrolment changes to it
+            try:
+                os.makedirs(self.snapshot_folder, exist_ok=True)
+                snapshot = InstanceSnapshot.load_or_build(snapshot_path(self.snapshot_folder, exams_file), exams)
+            except OSError:
+                # The snapshot only saves time, so carry on without it if it cannot be written
+                snapshot = None
+
             # Settings
             start_date = datetime.strptime(self.start_date_var.get(), "%Y-%m-%d").date()
             end_date = datetime.strptime(self.end_date_var.get(), "%Y-%m-%d").date()
@@ -216,6 +313,11 @@ class TimetableApp:
             min_gap = self.min_gap_var.get()
             exclude_weekends = self.exclude_weekends_var.get()
 
+            trace = None
+            if self.trace_var.get():
+                os.makedirs(self.trace_folder, exist_ok=True)
+                trace = os.path.join(self.trace_folder, datetime.now().strftime("solve-%Y%m%d-%H%M%S.trace"))
+
             self.engine = TimetableEngine(
                 rooms, exams, self.student_names,
                 start_date=start_date, 
@@ -228,79 +330,207 @@ class TimetableApp:
                 min_days_between_exams=self.spreading_var.get(),  # New parameter
                 spread_evenly=self.spread_evenly_var.get(),      # New parameter
                 excluded_dates=self.excluded_dates,              # New parameter
-                custom_time_slots=self.custom_time_slots        # New parameter
+                custom_time_slots=self.custom_time_slots,       # New parameter
+                cache=self.solve_cache,
+                profile=self.profile_var.get(),
+                profile_memory=self.profile_memory_var.get(),
+                snapshot=snapshot,
+                solver=SOLVER_LABELS[self.solver_var.get()][0],
+                objective=SOLVER_LABELS[self.solver_var.get()][1],
+                time_budget=self.time_budget_var.get(),
+                progress=self.show_solver_progress,
+                trace=trace
             )
-            success = self.engine.generate()
+            try:
+                success = self.engine.generate()
+            finally:
+                self.root.title("Exam Timetable Generator")
             self.placements = self.engine.placements
+            self.timetable_id = None
+            self.timetable_version = None
+            self.timetable_indexed = False
+            self.placement_stream = None
             self.update_treeview(self.placements)
 
             # Check if scheduling was successful
-            if not success:
-                # Extract the main reason from clash log
-                error_details = "\n".join(self.engine.clash_log[:10])  # Show first 10 log entries
+            if not success and self.placements:
+                # A best-effort timetable was produced despite some violations
+                affected = self.engine.affected_students
+                messagebox.showwarning("Best Effort Timetable",
+                           f"Not every constraint could be met. The best timetable found "
+                           f"affects {len(affected)} students.\n\n"
+                           f"See the clash log for the exams and students involved.")
+            elif not success:
+                # Extract the main reasons from the errors in the clash log
+                errors = self.engine.clash_log.filter(severity=ERROR)
+                error_details = "\n".join(str(d) for d in errors[:3])
                 messagebox.showerror("Scheduling Failed", 
                            f"Cannot create valid timetable with current constraints.\n\n"
                            f"Reason:\n{error_details}")
             elif self.engine.clash_log and "Successfully" in self.engine.clash_log[-1]:
-                messagebox.showinfo("Success", "Timetable generated successfully!")
+                optimality = self.engine.clash_log.filter(code="OPTIMALITY")
+                detail = f"\n\n{optimality[0]}" if optimality else ""
+                messagebox.showinfo("Success", "Timetable generated successfully!" + detail)
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
-    def update_treeview(self, placements):
-        # Clear existing items
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-            
-        # Add new placements
-        for p in placements:
-            self.tree.insert("", tk.END, values=(
-                p.exam_id,
-                p.subject,
-                p.room_id,
-                p.date,
-                p.start,
-                p.end
-            ))
+    def show_solver_progress(self, update):
+        """Shows the branch-and-bound objective and optimality gap in the window title"""
+        self.root.title(f"Exam Timetable Generator - best {update['objective']}, "
+                        f"bound {update['bound']}, gap {update['gap']:.0%}")
+        self.root.update_idletasks()
+
+    def update_treeview(self, placements, stream=None):
+        # Showing a new set of placements clears any filter that was typed
+        self.filter_var.set("")
+        self.filter_status.config(text="")
+        self.cancel_filter_search()
+        # The view keeps `placements` as its model and only renders the visible rows.
+        # `stream` optionally supplies further placements which are appended to
+        # `placements` on demand (used when loading a saved timetable).
+        self.results_view.set_rows(placements, stream)
         # The Treeview lists current placements. Use this method to refresh
         # the display after generation, loading, or filtering.
 
+    def ensure_placements_loaded(self):
+        """
+        Reads any placements of a loaded timetable that have not been streamed yet.
+        Called before operations that need the whole timetable such as exports.
+        """
+        if self.placement_stream is not None:
+            self.placements.extend(self.placement_stream)
+            self.placement_stream = None
+            if self.results_view.rows is self.placements:
+                self.results_view.detach_stream()
+
+    def start_export(self, title, task, on_finish):
+        """
+        Runs `task(job)` on the export pipeline with a progress window showing the
+        files completed and failed so far, and a button to cancel. `on_finish(job)`
+        is called on the Tk thread once the export has stopped.
+        """
+        if self.export_job is not None and not self.export_job.finished:
+            messagebox.showwarning("Warning", "An export is already running")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("420x280")
+        status = tk.Label(window, text="Preparing...", anchor="w")
+        status.pack(fill="x", padx=10, pady=(10, 0))
+        bar = ttk.Progressbar(window, mode="indeterminate")
+        bar.pack(fill="x", padx=10, pady=5)
+        bar.start()
+        current = tk.Label(window, text="", anchor="w")
+        current.pack(fill="x", padx=10)
+        # Failures are listed as they happen rather than only in the final summary
+        tk.Label(window, text="Failed:", anchor="w").pack(fill="x", padx=10, pady=(5, 0))
+        failed_list = tk.Listbox(window, height=6)
+        failed_list.pack(fill=tk.BOTH, expand=True, padx=10)
+        cancel_button = tk.Button(window, text="Cancel")
+        cancel_button.pack(pady=5)
+
+        def show_progress(job):
+            if job.total is not None and str(bar["mode"]) != "determinate":
+                bar.stop()
+                bar.config(mode="determinate", maximum=max(job.total, 1))
+            done = job.completed + len(job.failures)
+            bar["value"] = done
+            total = f" of {job.total}" if job.total is not None else ""
+            status.config(text=f"Completed {job.completed}, failed {len(job.failures)}{total}")
+            current.config(text=job.current or "")
+            for name in list(job.failures)[failed_list.size():]:
+                failed_list.insert(tk.END, f"{name}: {job.failures[name]}")
+
+        def finish(job):
+            self.root.title("Exam Timetable Generator")
+            window.destroy()
+            if job.error is not None:
+                messagebox.showerror("Error", f"Export failed: {job.error}")
+            elif job.cancelled:
+                messagebox.showinfo("Export Cancelled",
+                                    f"Export cancelled after {job.completed} files "
+                                    f"({len(job.failures)} failed)")
+            else:
+                on_finish(job)
+
+        def cancel():
+            cancel_button.config(text="Cancelling...", state=tk.DISABLED)
+            job.cancel()
+
+        def report_title(job):
+            show_progress(job)
+            done = job.completed + len(job.failures)
+            self.root.title(f"Exam Timetable Generator - exporting {done}/{job.total or '?'}")
+
+        from export_pipeline import ExportJob
+        job = ExportJob(self.root, task, on_progress=report_title, on_finish=finish)
+        cancel_button.config(command=cancel)
+        window.protocol("WM_DELETE_WINDOW", cancel)
+        self.export_job = job.start()
+
     def export_pdf(self):
+        self.ensure_placements_loaded()
         if not self.placements:
             messagebox.showwarning("Warning", "No timetable generated yet")
             return
         file = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files","*.pdf")])
-        if file:
-            export_to_pdf(self.placements, file, self.student_names)
+        if not file:
+            return
+        # The export works on copies so generating or loading meanwhile does not affect it
+        placements, student_names = list(self.placements), dict(self.student_names)
+
+        def task(job):
+            from pdf_export import export_to_pdf
+            job.set_total(1)
+            export_to_pdf(placements, file, student_names)
+            job.report(os.path.basename(file))
+
+        self.start_export("Exporting PDF", task,
+                          lambda job: messagebox.showinfo("Success", f"Timetable saved to {file}"))
 
     def export_individual_pdfs(self):
+        self.ensure_placements_loaded()
         if not self.placements:
             messagebox.showwarning("Warning", "No timetable generated yet")
             return
+        if not self.student_names:
+            messagebox.showwarning("Warning", "No students loaded. Please load the students CSV file first.")
+            return
         folder = filedialog.askdirectory(title="Select folder to save student PDFs")
         if not folder:
             return
-        
-        try:
-            if not self.student_names:
-                messagebox.showwarning("Warning", "No students loaded. Please load the students CSV file first.")
-                return
-            
-            created_count = 0
-            failed_count = 0
-            errors = []
-            
-            for sid, name in self.student_names.items():
-                try:
-                    filename = os.path.join(folder, f"{sid}_{name.replace(' ', '_')}.pdf")
-                    export_to_pdf(self.placements, filename, self.student_names, filter_student=sid)
-                    created_count += 1
-                except Exception as e:
-                    failed_count += 1
-                    errors.append(f"  {sid}: {str(e)}")
-            
-            if created_count > 0:
+        placements, student_names = list(self.placements), dict(self.student_names)
+
+        def task(job):
+            # Only students whose timetable changed since the last export to this
+            # folder are re-rendered, spread across processes
+            from pdf_export import export_student_pdfs_incremental
+
+            def show_progress(sid, error, done, total):
+                if done == 1:
+                    job.set_total(total)
+                job.report(sid, error)
+
+            return export_student_pdfs_incremental(placements, folder, student_names,
+                                                   progress=show_progress, cancelled=job.is_cancelled)
+
+        def finish(job):
+            rewritten, unchanged_count, failures = job.result
+            created_count = len(rewritten)
+            failed_count = len(failures)
+            errors = [f"  {sid}: {error}" for sid, error in failures.items()]
+
+            if created_count == 0 and failed_count == 0:
+                messagebox.showinfo("Up to Date", f"All {unchanged_count} student PDFs in {folder} are already up to date")
+            elif created_count > 0:
                 msg = f"Successfully created {created_count} PDF files in {folder}"
+                if unchanged_count:
+                    msg += f" ({unchanged_count} unchanged files were skipped)"
+                msg += "\n\nRewritten:\n" + "\n".join(os.path.basename(f) for f in rewritten[:5])
+                if created_count > 5:
+                    msg += f"\n... and {created_count - 5} more"
                 if failed_count > 0:
                     msg += f"\n\n{failed_count} students failed:\n" + "\n".join(errors[:5])
                     if len(errors) > 5:
@@ -308,50 +538,285 @@ class TimetableApp:
                 messagebox.showinfo("Success", msg)
             else:
                 messagebox.showerror("Error", f"Failed to create any PDFs.\n\nErrors:\n" + "\n".join(errors))
-        except Exception as e:
-            messagebox.showerror("Error", f"Unexpected error during PDF export: {str(e)}")
+
+        self.start_export("Exporting Student PDFs", task, finish)
+
+    def export_combined_pdf(self):
+        """
+        Exports every student's timetable into a single PDF with one page per
+        student and a bookmark for each, which is easier to distribute than many files.
+        """
+        self.ensure_placements_loaded()
+        if not self.placements:
+            messagebox.showwarning("Warning", "No timetable generated yet")
+            return
+        if not self.student_names:
+            messagebox.showwarning("Warning", "No students loaded. Please load the students CSV file first.")
+            return
+        file = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files","*.pdf")])
+        if not file:
+            return
+        placements, student_names = list(self.placements), dict(self.student_names)
+
+        def task(job):
+            from pdf_export import export_combined_pdf
+            job.set_total(len(student_names))
+
+            def show_progress(sid, error, done, total):
+                job.report(sid, error)
+                job.check_cancelled()
+
+            export_combined_pdf(placements, file, student_names, progress=show_progress)
+
+        self.start_export("Exporting Combined PDF", task, lambda job: messagebox.showinfo(
+            "Success", f"Combined timetable for {len(student_names)} students saved to {file}"))
+
+    def export_calendars(self):
+        """
+        Exports the timetable as CSV and JSON, with an .ics calendar for every
+        student and a CSV schedule for every room, all inside a single zip file.
+        """
+        self.ensure_placements_loaded()
+        if not self.placements:
+            messagebox.showwarning("Warning", "No timetable generated yet")
+            return
+        file = filedialog.asksaveasfilename(defaultextension=".zip", filetypes=[("Zip Archives","*.zip")])
+        if not file:
+            return
+        placements, student_names = list(self.placements), dict(self.student_names)
+
+        def task(job):
+            from exporters import export_bundle
+
+            def show_progress(name, done, total):
+                if done == 1:
+                    job.set_total(total)
+                job.report(name)
+                job.check_cancelled()
+
+            return export_bundle(placements, student_names, file, progress=show_progress)
+
+        self.start_export("Exporting Calendars", task,
+                          lambda job: messagebox.showinfo("Success", f"Exported {job.result} files to {file}"))
+
+    def get_student_placements(self, sid):
+        """
+        Returns the placements a single student sits. Saved timetables are queried
+        through the indexed enrolment table, unsaved ones are filtered in memory.
+        """
+        if self.timetable_indexed:
+            return self.db.get_student_timetable(self.timetable_id, sid, self.timetable_version)
+        self.ensure_placements_loaded()
+        return [p for p in self.placements if sid in p.student_ids]
+
+    def get_search_index(self):
+        """
+        Returns the search index for the current placements, building it the first
+        time it is needed after the timetable changes.
+        """
+        self.ensure_placements_loaded()
+        if self.search_index is None or not self.search_index.is_current(self.placements):
+            self.search_index = SearchIndex(self.placements, self.student_names)
+        return self.search_index
+
+    def schedule_filter(self, event=None):
+        """Applies the filter once typing pauses, so keystrokes never wait on a search"""
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def cancel_filter_search(self):
+        """Abandons a filter search still running, so its results are never shown"""
+        if self.filter_search is not None:
+            self.filter_search.cancel()
+            self.filter_search = None
+
+    def apply_filter(self):
+        """
+        Narrows the results view to the placements matching the filter box.
+        Building the index and searching run on a background thread, since a short
+        prefix over a large timetable can match most of it; a newer query cancels
+        the older search and only the latest one updates the view.
+        """
+        self.filter_job = None
+        self.cancel_filter_search()
+        query = self.filter_var.get().strip()
+        if not self.placements and self.placement_stream is None:
+            return
+        if not query:
+            self.results_view.set_rows(self.placements, self.placement_stream)
+            self.filter_status.config(text="")
+            return
+        # Loading reads from the database, so it stays on this thread
+        self.ensure_placements_loaded()
+        placements, names, index = self.placements, self.student_names, self.search_index
+
+        def task(job):
+            nonlocal index
+            if index is None or not index.is_current(placements):
+                index = SearchIndex(placements, names)
+            job.check_cancelled()
+            return index, index.search(query, job.check_cancelled)
+
+        def finish(job):
+            # A newer query or a new timetable has replaced this search
+            if job is not self.filter_search:
+                return
+            self.filter_search = None
+            if job.error is not None:
+                self.filter_status.config(text=f"Search failed: {job.error}")
+                return
+            index, matches = job.result
+            if index.is_current(self.placements):
+                self.search_index = index
+            self.results_view.set_rows(matches)
+            self.filter_status.config(text=f"{len(matches)} of {len(self.placements)} exams")
+
+        from export_pipeline import ExportJob
+        self.filter_status.config(text="Searching...")
+        self.filter_search = ExportJob(self.root, task, on_finish=finish).start()
 
     def search_student(self):
         def show_student():
-            sid = student_entry.get().strip()
-            if not sid:
+            query = student_entry.get().strip()
+            if not query:
                 return
-            filtered = [p for p in self.placements if sid in p.student_ids]
+            if query in self.student_names or not self.student_names:
+                filtered = self.get_student_placements(query)
+            else:
+                # Not a known ID, so match every word against student names and IDs instead
+                index = self.get_search_index()
+                students = None
+                for word in query.split():
+                    found = index.matching_students(word)
+                    students = found if students is None else students & found
+                matches = set()
+                for sid in students:
+                    matches.update(index.by_student[sid])
+                filtered = [self.placements[i] for i in sorted(matches)]
             self.update_treeview(filtered)
             student_win.destroy()
 
         student_win = tk.Toplevel(self.root)
         student_win.title("Search Student")
-        tk.Label(student_win, text="Enter Student ID:").pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Label(student_win, text="Enter Student ID or Name:").pack(side=tk.LEFT, padx=5, pady=5)
         student_entry = tk.Entry(student_win)
         student_entry.pack(side=tk.LEFT, padx=5)
         tk.Button(student_win, text="Show Timetable", command=show_student).pack(side=tk.LEFT, padx=5)
 
+    @staticmethod
+    def load_error_log(what, file):
+        """Returns a clash log holding a single error for a CSV file with no rows"""
+        log = ClashLog()
+        log.add("LOAD_ERROR", ERROR, what=what, file=file)
+        return log
+
     def view_clash_log(self):
         if not self.engine or not self.engine.clash_log:
             messagebox.showinfo("Clash Log", "No clashes detected.")
             return
+        clash_log = self.engine.clash_log
 
         log_win = tk.Toplevel(self.root)
         log_win.title("Clash/Error Log")
-        text = tk.Text(log_win, width=100, height=30)
-        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar = tk.Scrollbar(log_win, command=text.yview)
+
+        # Severity filter; entries are formatted only as they are listed or selected
+        filter_frame = tk.Frame(log_win)
+        filter_frame.pack(fill="x", padx=5, pady=5)
+        tk.Label(filter_frame, text="Show:").pack(side=tk.LEFT)
+        severity_var = tk.StringVar(value="all")
+        severity_box = ttk.Combobox(filter_frame, textvariable=severity_var, state="readonly",
+                                    values=("all",) + SEVERITIES, width=10)
+        severity_box.pack(side=tk.LEFT, padx=5)
+        tk.Label(filter_frame, text="Double-click an entry to show its first exam").pack(side=tk.LEFT, padx=10)
+
+        list_frame = tk.Frame(log_win)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        entries = ttk.Treeview(list_frame, columns=("Severity", "Code", "Exams", "Message"),
+                               show="headings", height=12)
+        for col, width in (("Severity", 70), ("Code", 150), ("Exams", 150), ("Message", 450)):
+            entries.heading(col, text=col)
+            entries.column(col, width=width)
+        entries.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar = tk.Scrollbar(list_frame, command=entries.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        text.configure(yscrollcommand=scrollbar.set)
-        for entry in self.engine.clash_log:
-            text.insert(tk.END, entry + "\n")
-        text.config(state=tk.DISABLED)
+        entries.configure(yscrollcommand=scrollbar.set)
+
+        detail = tk.Text(log_win, width=100, height=10)
+        detail.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        detail.config(state=tk.DISABLED)
+
+        shown = {}
+
+        def refresh(event=None):
+            entries.delete(*entries.get_children())
+            shown.clear()
+            severity = severity_var.get()
+            records = clash_log.records if severity == "all" else clash_log.filter(severity=severity)
+            for record in records:
+                message = record.format().strip().split("\n")[0]
+                exams = ", ".join(record.exams[:3]) + (" ..." if len(record.exams) > 3 else "")
+                iid = entries.insert("", tk.END, values=(record.severity, record.code, exams, message))
+                shown[iid] = record
+
+        def on_select(event):
+            selection = entries.selection()
+            if not selection:
+                return
+            detail.config(state=tk.NORMAL)
+            detail.delete("1.0", tk.END)
+            detail.insert(tk.END, shown[selection[0]].format().strip())
+            detail.config(state=tk.DISABLED)
+
+        def jump_to_exam(event):
+            selection = entries.selection()
+            if not selection or not shown[selection[0]].exams:
+                return
+            exam_id = shown[selection[0]].exams[0]
+            if not self.results_view.show_exam(exam_id):
+                messagebox.showinfo("Clash Log", f"Exam {exam_id} is not in the current timetable.", parent=log_win)
+
+        severity_box.bind("<<ComboboxSelected>>", refresh)
+        entries.bind("<<TreeviewSelect>>", on_select)
+        entries.bind("<Double-1>", jump_to_exam)
+        refresh()
 
         def save_log():
-            file = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files","*.txt")])
+            file = filedialog.asksaveasfilename(defaultextension=".txt",
+                                                filetypes=[("Text Files", "*.txt"), ("JSON Files", "*.json")])
             if file:
                 with open(file, "w") as f:
-                    f.write("\n".join(self.engine.clash_log))
+                    if file.lower().endswith(".json"):
+                        json.dump([d.as_dict() for d in clash_log.records], f, indent=2)
+                    else:
+                        f.write("\n".join(clash_log))
                 messagebox.showinfo("Saved", f"Clash log saved to {file}")
 
         tk.Button(log_win, text="Export Log", command=save_log).pack(pady=5)
 
+    def view_stats(self):
+        stats = getattr(self.engine, "stats", None)
+        lines = stats.format_lines() if stats is not None and stats.enabled else []
+        # A summary of the solver trace, if one was recorded
+        trace_path = getattr(self.engine, "trace_path", None)
+        if trace_path and os.path.exists(trace_path):
+            from solver_trace import summarise, format_summary
+            if lines:
+                lines.append("")
+            lines += [f"Solver trace: {trace_path}", ""] + format_summary(summarise(trace_path))
+        if not lines:
+            messagebox.showinfo("Solver Statistics",
+                                "No statistics recorded. Tick 'Record solver statistics' or "
+                                "'Record solver trace' and generate again.")
+            return
+
+        stats_win = tk.Toplevel(self.root)
+        stats_win.title("Solver Statistics")
+        text = tk.Text(stats_win, width=80, height=min(30, len(lines) + 1))
+        text.pack(fill=tk.BOTH, expand=True)
+        text.insert(tk.END, "\n".join(lines))
+        text.config(state=tk.DISABLED)
+
     def clear_all(self):
         self.rooms_var.set("")
         self.exams_var.set("")
@@ -365,14 +830,42 @@ class TimetableApp:
         self.exclude_weekends_var.set(True)
         self.spreading_var.set(1)
         self.spread_evenly_var.set(True)
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        self.update_treeview([])
         self.placements = []
         self.student_names = {}
         self.engine = None
+        self.timetable_id = None
+        self.timetable_version = None
+        self.timetable_indexed = False
+        self.placement_stream = None
+
+    def show_timetable_version(self, timetable_id, version=None):
+        """
+        Shows a saved timetable in the main Treeview, defaulting to its latest version.
+        The base snapshot is streamed from the database; later versions are rebuilt
+        from their deltas.
+        """
+        if version is None:
+            version = self.db.get_latest_version(timetable_id)
+
+        if version == self.db.get_base_version(timetable_id):
+            # Stream the placements so only the visible pages are read straight away
+            self.placements = []
+            self.placement_stream = self.db.iter_placements(timetable_id)
+            self.timetable_indexed = True
+        else:
+            self.placements = self.db.load_version(timetable_id, version)
+            self.placement_stream = None
+            self.timetable_indexed = False
+        self.timetable_id = timetable_id
+        self.timetable_version = version
+
+        # Update the main treeview
+        self.update_treeview(self.placements, stream=self.placement_stream)
 
     def show_date_exclusion(self):
         """Show window for entering dates to exclude"""
+        from tkcalendar import Calendar
         ex_window = tk.Toplevel(self.root)
         ex_window.title("Exclude Dates")
         ex_window.grab_set()
@@ -529,7 +1022,9 @@ class TimetableApp:
         saved_window.geometry("600x400")
 
         # Treeview for saved timetables
-        tree = ttk.Treeview(saved_window, 
+        tree_frame = tk.Frame(saved_window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(tree_frame, 
                            columns=("ID", "Name", "Created", "Description"),
                            show="headings")
         
@@ -537,12 +1032,42 @@ class TimetableApp:
             tree.heading(col, text=col)
             tree.column(col, width=100)
         
-        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        scrollbar = tk.Scrollbar(tree_frame, command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Saved timetables are read one page at a time, newest first.
+        # `page_state` remembers the key of the last row shown for keyset paging.
+        page_state = {"after": None, "done": False}
+
+        def load_next_page():
+            if page_state["done"]:
+                return
+            page = self.db.get_timetables_page(TREE_PAGE_SIZE, page_state["after"])
+            for timetable in page:
+                tree.insert("", tk.END, values=timetable)
+            if len(page) < TREE_PAGE_SIZE:
+                page_state["done"] = True
+            if page:
+                last = page[-1]
+                page_state["after"] = (last[2], last[0])
+
+        def reload_pages():
+            tree.delete(*tree.get_children())
+            page_state["after"] = None
+            page_state["done"] = False
+            saved_window.title(f"Saved Timetables ({self.db.count_timetables()})")
+            load_next_page()
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.9:
+                load_next_page()
+
+        tree.configure(yscrollcommand=on_scroll)
 
         # Load saved timetables
-        saved = self.db.get_saved_timetables()
-        for timetable in saved:
-            tree.insert("", tk.END, values=timetable)
+        reload_pages()
 
         def load_selected():
             selected = tree.selection()
@@ -551,45 +1076,267 @@ class TimetableApp:
                 return
             
             timetable_id = tree.item(selected[0])['values'][0]
-            loaded_placements = self.db.load_timetable(timetable_id)
-            
-            # Store the loaded placements
-            self.placements = loaded_placements
-            
-            # Update the main treeview
-            self.update_treeview(self.placements)
+            self.show_timetable_version(timetable_id)
             
             # Show confirmation
             messagebox.showinfo("Success", "Timetable loaded successfully")
             saved_window.destroy()
 
         def save_current():
+            self.ensure_placements_loaded()
             if not self.placements:
                 messagebox.showwarning("Warning", "No timetable to save")
                 return
-                
+
+            # A loaded timetable can be saved as a new version, which only stores what changed
+            if self.timetable_id is not None:
+                as_version = messagebox.askyesnocancel(
+                    "Save Timetable",
+                    "Save as a new version of the loaded timetable?\n\n"
+                    "Choose No to save a separate copy instead.")
+                if as_version is None:
+                    return
+                if as_version:
+                    description = tk.simpledialog.askstring("Save Version",
+                                                          "Enter description (optional):")
+                    version = self.db.save_version(self.timetable_id, self.placements, description)
+                    if version != self.timetable_version:
+                        # The new version is only held as a delta so it is not indexed
+                        self.timetable_version = version
+                        self.timetable_indexed = False
+                    messagebox.showinfo("Saved", f"Saved as version {version}")
+                    return
+
             name = tk.simpledialog.askstring("Save Timetable", 
                                            "Enter name for this timetable:")
             if name:
                 description = tk.simpledialog.askstring("Save Timetable", 
                                                       "Enter description (optional):")
-                self.db.save_timetable(
+                # Room capacities are only known for a timetable generated in this session
+                rooms = getattr(self.engine, "rooms", None) or []
+                self.timetable_id = self.db.save_timetable(
                     name, description, self.placements,
                     self.start_date_var.get(),
-                    self.end_date_var.get()
+                    self.end_date_var.get(),
+                    room_capacities={r.room_id: r.capacity for r in rooms}
                 )
-                tree.delete(*tree.get_children())
-                for timetable in self.db.get_saved_timetables():
-                    tree.insert("", tk.END, values=timetable)
+                self.timetable_version = 0
+                self.timetable_indexed = True
+                reload_pages()
                 # After saving, refresh the saved list so the user sees the
                 # newly persisted timetable immediately.
 
+        def compare_selected():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", "Please select a timetable to compare with")
+                return
+            self.compare_with_saved(tree.item(selected[0])['values'][0])
+
+        def show_versions():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", "Please select a timetable")
+                return
+            self.show_versions(tree.item(selected[0])['values'][0], saved_window)
+
         # Buttons
         btn_frame = tk.Frame(saved_window)
         btn_frame.pack(fill=tk.X, padx=10, pady=5)
         tk.Button(btn_frame, text="Load Selected", 
                  command=load_selected).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Versions", 
+                 command=show_versions).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Compare With Current",
+                 command=compare_selected).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Save Current", 
                  command=save_current).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Close", 
-                 command=saved_window.destroy).pack(side=tk.RIGHT, padx=5)
\ No newline at end of file
+                 command=saved_window.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def compare_with_saved(self, timetable_id):
+        """
+        Shows what changed between a saved timetable and the one currently shown.
+        If the current timetable is saved too, the comparison runs in the database.
+        """
+        if self.timetable_id is None:
+            self.ensure_placements_loaded()
+            if not self.placements:
+                messagebox.showwarning("Warning", "No timetable generated yet")
+                return
+        from timetable_diff import diff_placements
+        try:
+            if self.timetable_id is not None:
+                diff = self.db.diff_timetables(timetable_id, self.timetable_id,
+                                               new_version=self.timetable_version)
+            else:
+                diff = diff_placements(self.db.load_version(timetable_id), self.placements)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.show_diff(diff, f"Changes Since Timetable {timetable_id}")
+
+    def show_diff(self, diff, title):
+        """Lists the exams that changed and the students affected, with export options"""
+        diff_window = tk.Toplevel(self.root)
+        diff_window.title(title)
+        diff_window.geometry("900x450")
+
+        tk.Label(diff_window, text=diff.summary() if diff else "The timetables are the same",
+                 anchor="w").pack(fill="x", padx=10, pady=5)
+
+        columns = ("Exam ID", "Subject", "Change", "Old Date", "Old Time", "Old Room",
+                   "New Date", "New Time", "New Room", "Students")
+        tree_frame = tk.Frame(diff_window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=85)
+        scrollbar = tk.Scrollbar(tree_frame, command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        for c in diff:
+            old = (c.old.date, f"{c.old.start}-{c.old.end}", c.old.room_id) if c.old else ("", "", "")
+            new = (c.new.date, f"{c.new.start}-{c.new.end}", c.new.room_id) if c.new else ("", "", "")
+            tree.insert("", tk.END, values=(c.exam_id, c.subject, c.describe(), *old, *new, len(c.students)))
+
+        def export(make_chunks, default_name):
+            file = filedialog.asksaveasfilename(defaultextension=".csv", initialfile=default_name,
+                                                filetypes=[("CSV Files", "*.csv")])
+            if not file:
+                return
+            from exporters import write_stream
+            try:
+                write_stream(make_chunks(), file)
+                messagebox.showinfo("Success", f"Saved to {file}", parent=diff_window)
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to save: {e}", parent=diff_window)
+
+        btn_frame = tk.Frame(diff_window)
+        btn_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Button(btn_frame, text="Export Changes",
+                  command=lambda: export(diff.iter_csv, "changes.csv")).pack(side=tk.LEFT, padx=5)
+        # Only the students listed here need to be sent an updated timetable
+        tk.Button(btn_frame, text="Export Affected Students",
+                  command=lambda: export(lambda: diff.iter_affected_csv(self.student_names),
+                                         "affected_students.csv")).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Close", command=diff_window.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def show_analytics(self):
+        """
+        Dashboard of the saved timetables, read from the database's summary tables.
+        Selecting a timetable shows its room use, daily load and student load.
+        """
+        window = tk.Toplevel(self.root)
+        window.title("Analytics")
+        window.geometry("900x600")
+
+        def make_tree(parent, columns, width=90):
+            frame = tk.Frame(parent)
+            tree = ttk.Treeview(frame, columns=columns, show="headings")
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, width=width)
+            scrollbar = tk.Scrollbar(frame, command=tree.yview)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            return frame, tree
+
+        def percent(value):
+            return "" if value is None else f"{value:.0%}"
+
+        # Every saved timetable, from the aggregated summary tables
+        tk.Label(window, text="Saved timetables", anchor="w").pack(fill="x", padx=10, pady=(10, 0))
+        overview_frame, overview = make_tree(window, ("ID", "Name", "Created", "Days", "Exams", "Sittings",
+                                                      "Busiest Day", "3+ Exams/Day", "Avg Peak Room Use"))
+        overview_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        for row in self.db.get_analytics_overview(min_exams=3):
+            overview.insert("", tk.END, values=row[:8] + (percent(row[8]),))
+
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        rooms_frame, rooms_tree = make_tree(notebook, ("Room", "Date", "Exams", "Minutes", "Students",
+                                                       "Peak Students", "Capacity", "Peak Use"))
+        days_frame, days_tree = make_tree(notebook, ("Date", "Exams", "Sittings", "Students", "Rooms",
+                                                     "Most Exams/Student"))
+        load_frame, load_tree = make_tree(notebook, ("Exams on Busiest Day", "Students"), width=160)
+        notebook.add(rooms_frame, text="Room Use")
+        notebook.add(days_frame, text="Daily Load")
+        notebook.add(load_frame, text="Student Load")
+
+        def show_selected(event=None):
+            selected = overview.selection()
+            if not selected:
+                return
+            timetable_id = overview.item(selected[0])['values'][0]
+            for tree in (rooms_tree, days_tree, load_tree):
+                tree.delete(*tree.get_children())
+            for row in self.db.get_room_usage(timetable_id):
+                rooms_tree.insert("", tk.END, values=tuple("" if v is None else v for v in row[:7])
+                                  + (percent(row[7]),))
+            for row in self.db.get_day_load(timetable_id):
+                days_tree.insert("", tk.END, values=row)
+            for row in self.db.get_student_load_distribution(timetable_id):
+                load_tree.insert("", tk.END, values=row)
+
+        overview.bind("<<TreeviewSelect>>", show_selected)
+        tk.Button(window, text="Close", command=window.destroy).pack(side=tk.RIGHT, padx=10, pady=5)
+
+    def show_versions(self, timetable_id, parent):
+        """
+        Lists the stored versions of a saved timetable. Any version can be loaded,
+        and older versions can be compacted into the base snapshot to save space.
+        """
+        versions_window = tk.Toplevel(parent)
+        versions_window.title(f"Versions of Timetable {timetable_id}")
+
+        tree = ttk.Treeview(versions_window,
+                           columns=("Version", "Created", "Description", "Changes"),
+                           show="headings")
+        for col in tree["columns"]:
+            tree.heading(col, text=col)
+            tree.column(col, width=100)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            tree.insert("", tk.END, values=(self.db.get_base_version(timetable_id), "", "Base snapshot", ""))
+            for version in self.db.get_versions(timetable_id):
+                tree.insert("", tk.END, values=version)
+
+        def load_version():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", "Please select a version to load")
+                return
+            version = int(tree.item(selected[0])['values'][0])
+            self.show_timetable_version(timetable_id, version)
+            messagebox.showinfo("Success", f"Version {version} loaded successfully")
+
+        def compact():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", "Please select the version to compact up to")
+                return
+            version = int(tree.item(selected[0])['values'][0])
+            if messagebox.askyesno("Compact Versions",
+                                   f"Versions before {version} will no longer be available. Continue?"):
+                if self.timetable_id == timetable_id:
+                    # The base snapshot is about to be rewritten, so finish reading it first
+                    self.ensure_placements_loaded()
+                self.db.compact_versions(timetable_id, version)
+                if self.timetable_id == timetable_id:
+                    self.timetable_indexed = self.timetable_version == version
+                refresh()
+
+        refresh()
+
+        btn_frame = tk.Frame(versions_window)
+        btn_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Button(btn_frame, text="Load Version", command=load_version).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Compact Up To Selected", command=compact).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Close", command=versions_window.destroy).pack(side=tk.RIGHT, padx=5)
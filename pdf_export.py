@@ -4,56 +4,331 @@ PDF Export Module
 This module provides functionality for exporting examination timetables to PDF format.
 It utilises the ReportLab library to generate professional-looking documents with tables
 and styling, supporting both full timetables and filtered views for individual students.
+Individual student timetables can also be exported in bulk across several processes,
+optionally re-rendering only the students whose rows changed since the last export,
+or combined into a single bookmarked document that is built one student at a time.
+Every document is written to a temporary file and renamed into place, so a failed
+or cancelled export never leaves a truncated PDF behind.
 """
 
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
+from export_pipeline import ExportCancelled, atomic_path
+
+HEADERS = ["Exam ID", "Subject", "Room", "Date", "Start", "End"]
+
+# File kept in an export folder recording a content hash of each student's document
+MANIFEST_NAME = ".timetable_manifest.json"
+# Part of every manifest hash. Increase it whenever the layout or styling of the
+# documents changes, so the next incremental export re-renders every student
+RENDER_VERSION = 1
 
 def export_to_pdf(placements, filename="timetable.pdf", student_names=None, filter_student=None):
     """
     Exports the given placements to a PDF file with a formatted table.
     Optionally filters the timetable to show only exams for a specific student.
     """
+    # Set the title, appending student name if filtering
+    title = "Exam Timetable"
+    if filter_student:
+        title += f" - {student_names.get(filter_student, filter_student)}"
+
+    # Prepare table rows, skipping placements not involving the filtered student
+    rows = [
+        [p.exam_id, p.subject, p.room_id, p.date, p.start, p.end]
+        for p in placements
+        if not filter_student or filter_student in p.student_ids
+    ]
+    _build_pdf(filename, title, rows)
+
+@lru_cache(maxsize=None)
+def _styles():
+    """The sample stylesheet, created once and shared by every document"""
+    return getSampleStyleSheet()
+
+@lru_cache(maxsize=None)
+def _table_style():
+    """The timetable TableStyle, created once and shared by every table"""
+    return TableStyle([
+        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#4F81BD")),
+        ("TEXTCOLOR", (0,0), (-1,0), colors.whitesmoke),
+        ("ALIGN", (0,0), (-1,-1), "CENTER"),
+        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+        ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
+        ("BACKGROUND", (0,1), (-1,-1), colors.whitesmoke),
+        ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey])
+    ])
+
+def _timetable_flowables(title, rows):
+    """Returns the title, spacing and table (or empty message) for one timetable"""
+    styles = _styles()
+    elements = [Paragraph(title, styles['Title']), Spacer(1, 12)]
+
+    # Generate table only if there is data beyond headers
+    if rows:
+        table = Table([HEADERS] + rows, repeatRows=1)
+        table.setStyle(_table_style())
+        elements.append(table)
+    else:
+        # Show message if no exams for this student
+        elements.append(Paragraph("No exams assigned to this student.", styles['Normal']))
+    return elements
+
+def _build_pdf(filename, title, rows):
+    """Writes a single timetable document with a title and a table of rows"""
     try:
         # Create a landscape A4 document
-        doc = SimpleDocTemplate(filename, pagesize=landscape(A4))
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Set the title, appending student name if filtering
-        title = "Exam Timetable"
-        if filter_student:
-            title += f" - {student_names.get(filter_student, filter_student)}"
-        elements.append(Paragraph(title, styles['Title']))
-        elements.append(Spacer(1, 12))
-
-        # Prepare table data with headers
-        data = [["Exam ID", "Subject", "Room", "Date", "Start", "End"]]
-        for p in placements:
-            # Skip placements not involving the filtered student
-            if filter_student and filter_student not in p.student_ids:
-                continue
-            data.append([p.exam_id, p.subject, p.room_id, p.date, p.start, p.end])
-
-        # Generate table only if there is data beyond headers
-        if len(data) > 1:
-            table = Table(data, repeatRows=1)
-            table.setStyle(TableStyle([
-                ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#4F81BD")),
-                ("TEXTCOLOR", (0,0), (-1,0), colors.whitesmoke),
-                ("ALIGN", (0,0), (-1,-1), "CENTER"),
-                ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-                ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
-                ("BACKGROUND", (0,1), (-1,-1), colors.whitesmoke),
-                ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey])
-            ]))
-            elements.append(table)
-        else:
-            # Show message if no exams for this student
-            elements.append(Paragraph("No exams assigned to this student.", styles['Normal']))
-        
-        doc.build(elements)
+        with atomic_path(filename) as temp_path:
+            doc = SimpleDocTemplate(temp_path, pagesize=landscape(A4))
+            doc.build(_timetable_flowables(title, rows))
     except Exception as e:
-        raise Exception(f"Failed to create PDF '{filename}': {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to create PDF '{filename}': {str(e)}")
+
+class _Bookmark(Flowable):
+    """Zero-size flowable that bookmarks the current page and adds it to the PDF outline"""
+    def __init__(self, key, title):
+        Flowable.__init__(self)
+        self.key = key
+        self.title = title
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.canv.bookmarkPage(self.key)
+        self.canv.addOutlineEntry(self.title, self.key, level=0)
+        # Ask PDF viewers to open with the outline panel showing
+        self.canv.showOutline()
+
+class _StreamingDocTemplate(SimpleDocTemplate):
+    """
+    Document template that pulls flowables from a generator while it is being built.
+    ReportLab calls its `filterFlowables` hook with the list passed to `build` before
+    handling each flowable, so the list is topped up there with the next group and
+    only a page or so of flowables is held at a time. `build` checks afterwards that
+    every group was used, so a ReportLab release that stops doing this fails loudly
+    rather than writing a document that silently stops after the first student.
+    """
+    def __init__(self, filename, groups, **kwargs):
+        SimpleDocTemplate.__init__(self, filename, **kwargs)
+        self._groups = iter(groups)
+
+    def _top_up(self, flowables):
+        # Keep at least one group queued behind the current flowable so the
+        # build loop never sees an empty list before the generator is finished
+        while len(flowables) < 2:
+            group = next(self._groups, None)
+            if group is None:
+                break
+            flowables.extend(group)
+
+    def filterFlowables(self, flowables):
+        # ReportLab also handles its own internal lists here, which are left alone
+        if flowables is self._flowables:
+            self._top_up(flowables)
+
+    def build(self, flowables=None, **kwargs):
+        self._flowables = list(flowables or [])
+        self._top_up(self._flowables)
+        SimpleDocTemplate.build(self, self._flowables, **kwargs)
+        if next(self._groups, None) is not None:
+            raise RuntimeError("ReportLab finished the document without asking for every page; "
+                               "streaming through filterFlowables is not supported by this version")
+
+def export_combined_pdf(placements, filename, student_names, progress=None):
+    """
+    Exports every student's timetable into one document with a page per student
+    and an outline entry for each, so the file can be navigated by bookmark.
+    Each student's flowables are only created when the document reaches them, so
+    the tables and paragraphs held at once stay bounded. ReportLab has no way to
+    write pages out before the end of the build, though, so the finished pages are
+    kept until the file is written and memory still grows with the number of
+    students, by roughly 10 KB each with page compression. `progress(sid, None,
+    done, total)` is called as each student's page is queued for rendering, and may
+    raise ExportCancelled to stop the export without replacing `filename`.
+    """
+    index = build_student_index(placements)
+    total = len(student_names)
+
+    def student_pages():
+        for done, (sid, name) in enumerate(student_names.items(), 1):
+            group = [] if done == 1 else [PageBreak()]
+            group.append(_Bookmark(f"student-{done}", f"{name} ({sid})"))
+            group.extend(_timetable_flowables(f"Exam Timetable - {name}", index.get(sid, [])))
+            yield group
+            if progress:
+                progress(sid, None, done, total)
+
+    try:
+        # Finished pages are kept by ReportLab until the file is written, so they are
+        # compressed to keep that part of the memory use small
+        with atomic_path(filename) as temp_path:
+            doc = _StreamingDocTemplate(temp_path, student_pages(), pagesize=landscape(A4),
+                                        title="Exam Timetables", pageCompression=1)
+            doc.build()
+    except ExportCancelled:
+        raise
+    except Exception as e:
+        raise Exception(f"Failed to create PDF '{filename}': {str(e)}")
+
+def build_student_index(placements):
+    """
+    Maps each student ID to the table rows of the exams they sit.
+    Built in a single pass so each student's rows are not found by rescanning every placement.
+    """
+    index = defaultdict(list)
+    for p in placements:
+        row = [p.exam_id, p.subject, p.room_id, p.date, p.start, p.end]
+        for sid in p.student_ids:
+            index[sid].append(row)
+    return index
+
+def student_pdf_filename(folder, sid, name):
+    """Returns the path used for a student's individual timetable"""
+    return os.path.join(folder, f"{sid}_{name.replace(' ', '_')}.pdf")
+
+def _render_student_batch(jobs):
+    """
+    Renders a batch of student documents inside a worker process.
+    Returns (sid, error) for each job so failures are reported per student.
+    """
+    results = []
+    for sid, filename, title, rows in jobs:
+        try:
+            _build_pdf(filename, title, rows)
+            results.append((sid, None))
+        except Exception as e:
+            results.append((sid, str(e)))
+    return results
+
+def export_student_pdfs(placements, folder, student_names, workers=None, progress=None, batch_size=20,
+                        cancelled=None):
+    """
+    Exports one PDF per student in `student_names` to a folder.
+    The student index is built once and documents are rendered across a pool of
+    `workers` processes (one per CPU by default, or in this process when 1), in
+    batches of `batch_size` students to keep inter-process overhead low.
+    `progress(sid, error, done, total)` is called as each student finishes, with
+    `error` set to the message if that student failed. Once `cancelled()` returns
+    True no further students are started.
+    Returns the number of files created and a dict of failed student IDs to errors.
+    """
+    jobs = _student_jobs(placements, folder, student_names)
+    created, failures = _run_student_jobs(jobs, workers, progress, batch_size, cancelled)
+    return len(created), failures
+
+def export_student_pdfs_incremental(placements, folder, student_names, workers=None, progress=None, batch_size=20,
+                                    cancelled=None):
+    """
+    Exports per-student PDFs like `export_student_pdfs`, but skips students whose
+    rows, title and file name hash the same as in the folder's manifest and whose
+    file still exists. `progress` is only called for students that are re-rendered.
+    If the export is cancelled, the manifest records only the students finished so far.
+    Returns the list of files rewritten, the number left unchanged and a dict of
+    failed student IDs to errors.
+    """
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    manifest = load_manifest(folder)
+
+    jobs = []
+    new_manifest = {}
+    unchanged = 0
+    for job in _student_jobs(placements, folder, student_names):
+        sid, filename, title, rows = job
+        digest = _content_hash(filename, title, rows)
+        new_manifest[sid] = digest
+        if manifest.get(sid) == digest and os.path.exists(filename):
+            unchanged += 1
+        else:
+            jobs.append(job)
+
+    created, failures = _run_student_jobs(jobs, workers, progress, batch_size, cancelled)
+    rewritten = [filename for sid, filename, _, _ in jobs if sid in created]
+
+    # Failed students and those not reached before a cancel keep no hash, so
+    # that they are retried next time
+    for sid, _, _, _ in jobs:
+        if sid not in created:
+            del new_manifest[sid]
+    _write_manifest(manifest_path, new_manifest)
+    return rewritten, unchanged, failures
+
+def load_manifest(folder):
+    """Reads the manifest of an export folder, returning an empty one if there is none"""
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(path, manifest):
+    """Writes the manifest through a temporary file so it is never left half written"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(temp_path, path)
+
+def _content_hash(filename, title, rows):
+    """Hashes everything that appears in or identifies a student's document, and how it is drawn"""
+    encoded = json.dumps([RENDER_VERSION, os.path.basename(filename), title, rows], separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def _student_jobs(placements, folder, student_names):
+    """Builds the (sid, filename, title, rows) render job for every student"""
+    index = build_student_index(placements)
+    return [
+        (sid, student_pdf_filename(folder, sid, name), f"Exam Timetable - {name}", index.get(sid, []))
+        for sid, name in student_names.items()
+    ]
+
+def _run_student_jobs(jobs, workers, progress, batch_size, cancelled=None):
+    """
+    Renders student jobs serially or across a process pool, reporting each result.
+    Returns the set of student IDs rendered and a dict of failed IDs to errors.
+    """
+    created = set()
+    failures = {}
+    total = len(jobs)
+
+    def record(sid, error):
+        if error is None:
+            created.add(sid)
+        else:
+            failures[sid] = error
+        if progress:
+            progress(sid, error, len(created) + len(failures), total)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or total <= batch_size:
+        for job in jobs:
+            if cancelled and cancelled():
+                break
+            for sid, error in _render_student_batch([job]):
+                record(sid, error)
+        return created, failures
+
+    batches = [jobs[i:i + batch_size] for i in range(0, total, batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_render_student_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            if cancelled and cancelled():
+                # Batches already rendering are left to finish, the rest never start
+                for pending in futures:
+                    pending.cancel()
+                break
+            try:
+                results = future.result()
+            except Exception as e:
+                # The worker itself failed, so every student in its batch failed
+                results = [(job[0], str(e)) for job in futures[future]]
+            for sid, error in results:
+                record(sid, error)
+    return created, failures
@@ -0,0 +1,250 @@
+"""
+Preprocessing Snapshot Module
+
+This module keeps the preprocessed form of an exam instance between runs: the
+index of which exams each student sits, the conflict graph weighted by the number
+of students two exams share, and the order the engine schedules exams in. The
+snapshot is saved as a compact binary file and brought up to date with the exams
+CSV by applying only the enrolments that changed, so a large cohort is loaded
+rather than having its conflict graph rebuilt on every run.
+"""
+
+import os
+import pickle
+import struct
+import zlib
+from array import array
+from collections import defaultdict
+
+MAGIC = b"TTSNAP"
+# Increase this when the layout of the saved data changes
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<6sH")
+
+class InstanceSnapshot:
+    """
+    Student to exam index and weighted conflict graph for a list of exams.
+    Enrolments can be added and removed one at a time, which only touches the
+    edges between the changed exam and the student's other exams.
+    """
+    def __init__(self):
+        self.exam_ids = []
+        # Number of distinct students on each exam, used for the ordering
+        self.exam_sizes = {}
+        self.student_exams = defaultdict(set)
+        # exam_id -> {neighbouring exam_id: number of shared students}
+        self.adjacency = defaultdict(dict)
+        self._ordering = None
+        # True when there are changes that have not been saved
+        self.dirty = False
+
+    @classmethod
+    def build(cls, exams):
+        """Builds a snapshot from scratch for a list of exams"""
+        snapshot = cls()
+        snapshot.sync(exams)
+        return snapshot
+
+    def add_exam(self, exam_id, size=0):
+        """Adds an exam with no students, at the end of the exam order"""
+        if exam_id not in self.exam_sizes:
+            self.exam_ids.append(exam_id)
+            self.exam_sizes[exam_id] = size
+            self._changed()
+
+    def remove_exam(self, exam_id):
+        """Removes an exam along with all of its enrolments"""
+        if exam_id not in self.exam_sizes:
+            return
+        for sid in [s for s, exams in self.student_exams.items() if exam_id in exams]:
+            self.unenrol(exam_id, sid)
+        self.exam_ids.remove(exam_id)
+        del self.exam_sizes[exam_id]
+        self.adjacency.pop(exam_id, None)
+        self._changed()
+
+    def enrol(self, exam_id, sid):
+        """Adds a student to an exam, strengthening its edges to the student's other exams"""
+        exams = self.student_exams[sid]
+        if exam_id in exams:
+            return
+        for other in exams:
+            self.adjacency[exam_id][other] = self.adjacency[exam_id].get(other, 0) + 1
+            self.adjacency[other][exam_id] = self.adjacency[other].get(exam_id, 0) + 1
+        exams.add(exam_id)
+        self._changed()
+
+    def unenrol(self, exam_id, sid):
+        """Removes a student from an exam, dropping edges that no longer share anyone"""
+        exams = self.student_exams.get(sid)
+        if not exams or exam_id not in exams:
+            return
+        exams.discard(exam_id)
+        for other in exams:
+            for a, b in ((exam_id, other), (other, exam_id)):
+                weight = self.adjacency[a][b] - 1
+                if weight:
+                    self.adjacency[a][b] = weight
+                else:
+                    del self.adjacency[a][b]
+        if not exams:
+            del self.student_exams[sid]
+        self._changed()
+
+    def rosters(self):
+        """Returns the set of students enrolled on each exam"""
+        rosters = {exam_id: set() for exam_id in self.exam_ids}
+        for sid, exams in self.student_exams.items():
+            for exam_id in exams:
+                rosters[exam_id].add(sid)
+        return rosters
+
+    def sync(self, exams):
+        """
+        Brings the snapshot in line with a list of exams by applying only the
+        enrolments that differ. Returns the number of enrolments added or removed.
+        """
+        current = {e.exam_id: e for e in exams}
+        for exam_id in [e for e in self.exam_ids if e not in current]:
+            self.remove_exam(exam_id)
+
+        rosters = self.rosters()
+        changes = 0
+        for exam in exams:
+            if exam.exam_id not in self.exam_sizes:
+                self.add_exam(exam.exam_id)
+            old = rosters.get(exam.exam_id, set())
+            new = set(exam.student_ids)
+            for sid in old - new:
+                self.unenrol(exam.exam_id, sid)
+            for sid in new - old:
+                self.enrol(exam.exam_id, sid)
+            changes += len(old ^ new)
+            if self.exam_sizes[exam.exam_id] != len(new):
+                self.exam_sizes[exam.exam_id] = len(new)
+                self._changed()
+
+        # Keep the exam order of the input, since it breaks ties in the ordering
+        order = [e.exam_id for e in exams]
+        if order != self.exam_ids:
+            self.exam_ids = order
+            self._changed()
+        return changes
+
+    def matches(self, exams):
+        """Cheaply checks that the snapshot was synced with this list of exams"""
+        return (len(exams) == len(self.exam_ids)
+                and all(e.exam_id == exam_id and len(set(e.student_ids)) == self.exam_sizes[exam_id]
+                        for e, exam_id in zip(exams, self.exam_ids)))
+
+    def conflict_graph(self):
+        """Returns the unweighted conflict graph in the form the engine uses"""
+        return defaultdict(set, {e: set(n) for e, n in self.adjacency.items() if n})
+
+    def ordering(self):
+        """
+        Exam IDs ordered hardest first: most conflicts, then most students,
+        with ties kept in input order, matching the engine's own sort.
+        """
+        if self._ordering is None:
+            self._ordering = sorted(
+                self.exam_ids,
+                key=lambda e: (len(self.adjacency.get(e, ())), self.exam_sizes[e]),
+                reverse=True,
+            )
+        return self._ordering
+
+    def _changed(self):
+        self._ordering = None
+        self.dirty = True
+
+    def save(self, path):
+        """
+        Writes the snapshot as compressed integer arrays, through a temporary
+        file so it is never left half written.
+        """
+        exam_index = {e: i for i, e in enumerate(self.exam_ids)}
+        students = list(self.student_exams)
+        # Student -> exam index stored as offsets into one flat array
+        offsets = array("I", [0])
+        enrolled = array("I")
+        for sid in students:
+            enrolled.extend(sorted(exam_index[e] for e in self.student_exams[sid]))
+            offsets.append(len(enrolled))
+        # Each edge once, as parallel arrays of endpoints and weights
+        edge_a, edge_b, weights = array("I"), array("I"), array("I")
+        for exam_id, neighbours in self.adjacency.items():
+            a = exam_index[exam_id]
+            for other, weight in neighbours.items():
+                b = exam_index[other]
+                if a < b:
+                    edge_a.append(a)
+                    edge_b.append(b)
+                    weights.append(weight)
+
+        data = {
+            "exam_ids": self.exam_ids,
+            "exam_sizes": array("I", [self.exam_sizes[e] for e in self.exam_ids]),
+            "students": students,
+            "offsets": offsets,
+            "enrolled": enrolled,
+            "edges": (edge_a, edge_b, weights),
+            "ordering": array("I", [exam_index[e] for e in self.ordering()]),
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, SNAPSHOT_VERSION))
+            f.write(zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)))
+        os.replace(temp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        """Reads a snapshot written by `save`, raising ValueError if it is not one"""
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ValueError("Not a timetable snapshot")
+            magic, version = _HEADER.unpack(header)
+            if magic != MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError("Not a timetable snapshot or an unsupported version")
+            try:
+                data = pickle.loads(zlib.decompress(f.read()))
+            except (zlib.error, pickle.UnpicklingError, EOFError) as e:
+                raise ValueError(f"Corrupt timetable snapshot: {e}")
+
+        snapshot = cls()
+        exam_ids = data["exam_ids"]
+        snapshot.exam_ids = list(exam_ids)
+        snapshot.exam_sizes = dict(zip(exam_ids, data["exam_sizes"]))
+        offsets, enrolled = data["offsets"], data["enrolled"]
+        for i, sid in enumerate(data["students"]):
+            snapshot.student_exams[sid] = {exam_ids[e] for e in enrolled[offsets[i]:offsets[i + 1]]}
+        for a, b, weight in zip(*data["edges"]):
+            snapshot.adjacency[exam_ids[a]][exam_ids[b]] = weight
+            snapshot.adjacency[exam_ids[b]][exam_ids[a]] = weight
+        snapshot._ordering = [exam_ids[e] for e in data["ordering"]]
+        return snapshot
+
+    @classmethod
+    def load_or_build(cls, path, exams):
+        """
+        Loads the snapshot at `path` and applies any enrolment changes, or builds it
+        if there is no usable snapshot. The file is rewritten only if it changed.
+        """
+        try:
+            snapshot = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            snapshot = cls()
+            snapshot.dirty = True
+        snapshot.sync(exams)
+        if snapshot.dirty:
+            snapshot.save(path)
+        return snapshot
+
+def snapshot_path(folder, exams_file):
+    """Returns where the snapshot for an exams CSV is kept inside a cache folder"""
+    name = os.path.splitext(os.path.basename(exams_file))[0]
+    # The folder is included so CSVs with the same name in different places do not collide
+    tag = zlib.crc32(os.path.abspath(exams_file).encode()) & 0xFFFFFFFF
+    return os.path.join(folder, f"{name}-{tag:08x}.snapshot")
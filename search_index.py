@@ -0,0 +1,159 @@
+"""
+Search Index Module
+
+This module builds an in-memory index over a timetable so that it can be filtered
+as the user types. Student names and IDs, subjects, rooms, exam IDs and dates are
+split into lower-case words and stored in prefix tries, so any word can be matched
+by typing its beginning. Values are stored once, at the node ending their word, and
+a lookup walks the part of the trie below the typed prefix, so it costs time in
+proportion to the words and matches under that prefix rather than a scan over every
+placement. A one-letter prefix can still reach most of the vocabulary, which is why
+the window runs searches on a background thread.
+"""
+
+import re
+from collections import defaultdict
+
+_WORD = re.compile(r"[^\W_]+|\d{4}-\d{2}-\d{2}")
+
+def _words(text):
+    """Splits text into the lower-case words that are indexed and searched"""
+    text = str(text).lower()
+    words = set(_WORD.findall(text))
+    # The whole value is indexed too, so IDs such as 'S-101' match when typed in full
+    words.add(text)
+    return words
+
+class PrefixTrie:
+    """
+    Trie of words in which only the node ending a complete word holds the values
+    inserted under it. A prefix lookup walks the nodes below the prefix, so each
+    value is stored once rather than at every node along its word.
+    """
+    # Number of nodes visited between calls to a lookup's `check` callback
+    CHECK_INTERVAL = 4096
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, word, value):
+        """Adds a value under a word"""
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        node.setdefault(None, set()).add(value)
+
+    def _node(self, prefix):
+        """Returns the node reached by a prefix, or None if no word starts with it"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def words_with_prefix(self, prefix):
+        """Returns every indexed word that starts with a prefix"""
+        node = self._node(prefix)
+        words = set()
+        stack = [(prefix, node)] if node is not None else []
+        while stack:
+            word, node = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    words.add(word)
+                else:
+                    stack.append((word + char, child))
+        return words
+
+    def find(self, prefix, check=None):
+        """
+        Returns the union of values for every word that starts with a prefix.
+        `check` is called every CHECK_INTERVAL nodes and may raise to abandon
+        a long lookup, such as a one-letter prefix over a large vocabulary.
+        """
+        node = self._node(prefix)
+        result = set()
+        stack = [node] if node is not None else []
+        visited = 0
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    result |= child
+                else:
+                    stack.append(child)
+            visited += 1
+            if check is not None and visited % self.CHECK_INTERVAL == 0:
+                check()
+        return result
+
+class SearchIndex:
+    """
+    Index over a list of placements and the names of the students sitting them.
+    Also keeps direct lookups of placements by student, subject, room and date.
+    """
+    def __init__(self, placements, student_names=None):
+        self.placements = placements
+        self.size = len(placements)
+        student_names = student_names or {}
+
+        self.by_student = defaultdict(list)
+        self.by_subject = defaultdict(list)
+        self.by_room = defaultdict(list)
+        self.by_date = defaultdict(list)
+        # Placement attributes map to placement indexes, student words to student IDs
+        self.placement_trie = PrefixTrie()
+        self.student_trie = PrefixTrie()
+
+        for index, p in enumerate(placements):
+            self.by_subject[p.subject].append(index)
+            self.by_room[p.room_id].append(index)
+            self.by_date[p.date].append(index)
+            for value in (p.exam_id, p.subject, p.room_id, p.date):
+                for word in _words(value):
+                    self.placement_trie.insert(word, index)
+            for sid in p.student_ids:
+                self.by_student[sid].append(index)
+
+        for sid in self.by_student:
+            for word in _words(sid):
+                self.student_trie.insert(word, sid)
+            name = student_names.get(sid)
+            if name:
+                for word in _words(name):
+                    self.student_trie.insert(word, sid)
+
+    def is_current(self, placements):
+        """Checks whether the index was built from this list in its current state"""
+        return placements is self.placements and len(placements) == self.size
+
+    def matching_students(self, prefix):
+        """Returns the IDs of students whose ID or any name word starts with a prefix"""
+        return self.student_trie.find(prefix.lower())
+
+    def _term_matches(self, term, check=None):
+        """Placement indexes matching one search term through any indexed field"""
+        matches = self.placement_trie.find(term, check)
+        for sid in self.student_trie.find(term, check):
+            matches.update(self.by_student[sid])
+        return matches
+
+    def search(self, query, check=None):
+        """
+        Returns the placements matching every word of a query, in timetable order.
+        Each word may match the start of a student name or ID, subject, room,
+        exam ID or date. An empty query returns every placement. `check` is
+        passed to the trie lookups so a caller can abandon a stale search.
+        """
+        terms = [t for t in query.lower().split() if t]
+        if not terms:
+            return list(self.placements)
+
+        matches = None
+        # Start with the most selective term so the intersections stay small
+        for term_matches in sorted((self._term_matches(t, check) for t in terms), key=len):
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                return []
+        return [self.placements[i] for i in sorted(matches)]
@@ -0,0 +1,143 @@
+"""
+Solve Cache Module
+
+This module stores the results of previous timetable generations so that running
+the engine again on identical input data and settings returns straight away.
+Entries are keyed on a hash of the rooms, exams, students and every engine
+parameter, and are kept in an SQLite file next to timetables.db. The least
+recently used entries are removed once the cache grows beyond its size limit.
+
+Entries are stored with pickle, and loading a pickle can run arbitrary code, so
+the cache file is trusted in the same way as the program itself: it must only be
+writable by the user running the generator, and a cache file from anywhere else
+should be deleted rather than opened.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+import zlib
+from database import ConnectionPool
+from enrolment_store import EnrolmentStore
+
+# Increase this when the scheduling algorithm changes so that old results are not reused
+CACHE_FORMAT_VERSION = 3
+
+class SolveCache:
+    """
+    Content-addressed store of solved timetables and their derived artefacts
+    such as the conflict graph and slot calendar.
+    """
+    def __init__(self, db_file="solve_cache.db", max_bytes=64 * 1024 * 1024):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.pool = ConnectionPool(db_file)
+        self.create_tables()
+
+    @classmethod
+    def beside(cls, timetable_db_file, **kwargs):
+        """Creates a cache stored in the same folder as the given timetables database"""
+        folder = os.path.dirname(os.path.abspath(timetable_db_file))
+        return cls(os.path.join(folder, "solve_cache.db"), **kwargs)
+
+    def close(self):
+        """Close all cache database connections"""
+        self.pool.close_all()
+
+    def create_tables(self):
+        """Creates the cache table and its LRU index if they do not exist"""
+        conn = self.pool.connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS solve_cache (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_solve_cache_last_used ON solve_cache (last_used)')
+
+    @staticmethod
+    def make_key(rooms, exams, student_names, settings):
+        """
+        Hashes the normalised input data and engine settings into a cache key.
+        Room and exam order is kept because it affects which solution the engine finds.
+        The data is fed to the hash a piece at a time rather than encoded as one
+        document, and an EnrolmentStore is hashed from its raw sections, so no
+        student ID is decoded from the memory map just to look up the cache.
+        """
+        digest = hashlib.sha256()
+
+        def feed(value):
+            encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+            digest.update(encoded.encode())
+            digest.update(b"\n")
+
+        feed({"version": CACHE_FORMAT_VERSION, "settings": settings,
+              "rooms": [(r.room_id, r.capacity) for r in rooms]})
+        if isinstance(exams, EnrolmentStore):
+            feed("store")
+            exams.update_digest(digest)
+            if student_names is exams.student_names:
+                # The store's names were hashed with it
+                return digest.hexdigest()
+        else:
+            for e in exams:
+                feed((e.exam_id, e.subject, e.duration, list(e.student_ids)))
+        feed("students")
+        names = sorted(student_names.items())
+        # Chunks keep the encoded text small without a json.dumps call per student
+        for start in range(0, len(names), 4096):
+            feed(names[start:start + 4096])
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the stored result for a key, or None on a miss, and marks it as
+        recently used. The entry is unpickled, so the cache file must be trusted.
+        """
+        conn = self.pool.connection()
+        row = conn.execute('SELECT data FROM solve_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE solve_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, key, result):
+        """
+        Stores a result under a key, then evicts the least recently used entries
+        until the total size is back within `max_bytes`.
+        """
+        data = zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        if len(data) > self.max_bytes:
+            # A single result larger than the whole cache is not worth keeping
+            return
+
+        conn = self.pool.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO solve_cache (key, data, size, last_used)
+                VALUES (?, ?, ?, ?)
+            ''', (key, data, len(data), time.time()))
+
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM solve_cache').fetchone()[0]
+            if total > self.max_bytes:
+                # Walk entries from oldest to newest until enough space has been freed
+                to_delete = []
+                for old_key, size in conn.execute('SELECT key, size FROM solve_cache ORDER BY last_used'):
+                    if total <= self.max_bytes:
+                        break
+                    to_delete.append((old_key,))
+                    total -= size
+                conn.executemany('DELETE FROM solve_cache WHERE key = ?', to_delete)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        """Removes every cached result"""
+        self.pool.connection().execute('DELETE FROM solve_cache')
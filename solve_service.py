@@ -0,0 +1,481 @@
+"""
+Solve Service Module
+
+This module runs the timetable generator as a small local HTTP service, so jobs
+for several cohorts or sites can be queued without opening a window for each.
+A job is the three CSV files as text plus TimetableEngine settings. Jobs wait in
+a priority queue and run in separate worker processes, at most `workers` at a
+time, each stopped if it goes over its time budget. Finished timetables are
+saved with TimetableDatabase.save_timetable so they appear in the GUI's list of
+saved timetables.
+
+API (JSON bodies and responses):
+    POST   /jobs        submit a job, returns its id and status
+    GET    /jobs        list queued, running and recently finished jobs
+    GET    /jobs/<id>   status, stage and progress of one job
+    DELETE /jobs/<id>   cancel a queued or running job
+
+Usage:
+    python solve_service.py --port 8765 --workers 2 --db timetables.db
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from csv_input import read_instance
+from database import TimetableDatabase
+from diagnostics import ERROR
+from engine import TimetableEngine
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, TIMED_OUT, CANCELLED)
+
+# Largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# Seconds between progress reports from a worker while it is solving
+PROGRESS_INTERVAL = 0.5
+
+# Times are given as HH:MM; strptime alone would also accept "9:5"
+_HH_MM = re.compile(r"\d{2}:\d{2}")
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def _parse_time(value):
+    if not isinstance(value, str) or not _HH_MM.fullmatch(value):
+        raise ValueError(f"expected a time as HH:MM, not {value!r}")
+    return datetime.strptime(value, "%H:%M").time()
+
+def _parse_bool(value):
+    # bool("false") is True, so only JSON true and false are accepted
+    if not isinstance(value, bool):
+        raise ValueError(f"expected true or false, not {value!r}")
+    return value
+
+def _parse_int(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"expected a whole number, not {value!r}")
+    return value
+
+def _parse_dates(value):
+    if not isinstance(value, list):
+        raise ValueError("expected a list of YYYY-MM-DD dates")
+    for day in value:
+        _parse_date(day)
+    return list(value)
+
+def _parse_time_slots(value):
+    """Checks a {"YYYY-MM-DD": {"start": "HH:MM", "end": "HH:MM"}} mapping"""
+    if not isinstance(value, dict):
+        raise ValueError('expected an object of {"start": "HH:MM", "end": "HH:MM"} by date')
+    slots = {}
+    for day, slot in value.items():
+        _parse_date(day)
+        if not isinstance(slot, dict) or set(slot) != {"start", "end"}:
+            raise ValueError(f'the slot for {day} must have exactly "start" and "end"')
+        if _parse_time(slot["start"]) >= _parse_time(slot["end"]):
+            raise ValueError(f"the slot for {day} must start before it ends")
+        slots[day] = {"start": slot["start"], "end": slot["end"]}
+    return slots
+
+# Engine settings a job may give, with the conversion from their JSON form. Each
+# conversion checks the value's type, so a bad setting is refused when the job is
+# submitted rather than failing inside the worker.
+ENGINE_SETTINGS = {
+    "start_date": _parse_date,
+    "end_date": _parse_date,
+    "start_time": _parse_time,
+    "end_time": _parse_time,
+    "max_exams_day": _parse_int,
+    "min_gap": _parse_int,
+    "exclude_weekends": _parse_bool,
+    "custom_time_slots": _parse_time_slots,
+    "excluded_dates": _parse_dates,
+    "min_days_between_exams": _parse_int,
+    "spread_evenly": _parse_bool,
+    "max_backtrack_iterations": _parse_int,
+}
+
+def engine_settings(settings):
+    """
+    Converts JSON job settings to TimetableEngine keyword arguments, raising
+    ValueError for an unknown setting or a value of the wrong type or form
+    """
+    if not isinstance(settings, dict):
+        raise ValueError("'settings' must be an object")
+    unknown = set(settings) - set(ENGINE_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    converted = {}
+    for name, value in settings.items():
+        try:
+            converted[name] = ENGINE_SETTINGS[name](value)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid setting '{name}': {e}") from None
+    return converted
+
+def _run_job(db_file, payload, conn):
+    """
+    Solves one job inside a worker process, sending ('stage', name),
+    ('progress', dict), ('done', result) or ('error', message) messages to `conn`.
+    """
+    send_lock = threading.Lock()
+
+    def send(kind, value):
+        with send_lock:
+            conn.send((kind, value))
+
+    try:
+        send("stage", "parsing")
+        rooms, exams, student_names = read_instance(
+            payload["rooms_csv"], payload["exams_csv"], payload["students_csv"])
+        engine = TimetableEngine(rooms, exams, student_names, profile=True,
+                                 **engine_settings(payload.get("settings", {})))
+
+        send("stage", "solving")
+        solving = threading.Event()
+        solving.set()
+
+        def report_progress():
+            while solving.is_set():
+                send("progress", {"iterations": engine.backtrack_iterations,
+                                  "limit": engine.max_backtrack_iterations})
+                time.sleep(PROGRESS_INTERVAL)
+
+        threading.Thread(target=report_progress, daemon=True).start()
+        try:
+            success = engine.generate()
+        finally:
+            solving.clear()
+
+        result = {
+            "success": success,
+            "exams": len(exams),
+            "placements": len(engine.placements),
+            "backtrack_iterations": engine.backtrack_iterations,
+            "errors": [str(d) for d in engine.clash_log.filter(severity=ERROR)],
+            "stats": engine.stats.as_dict(),
+        }
+        if success:
+            send("stage", "saving")
+            db = TimetableDatabase(db_file)
+            try:
+                result["timetable_id"] = db.save_timetable(
+                    payload.get("name") or "Service job",
+                    payload.get("description", ""),
+                    engine.placements,
+                    engine.start_date.strftime("%Y-%m-%d"),
+                    engine.end_date.strftime("%Y-%m-%d"),
+                )
+            finally:
+                db.close()
+        send("done", result)
+    except Exception as e:
+        send("error", f"{type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+class Job:
+    """A queued or finished solve job and everything reported about it"""
+    def __init__(self, job_id, payload, priority, time_budget):
+        self.job_id = job_id
+        self.name = payload.get("name") or f"Job {job_id}"
+        self.payload = payload
+        self.priority = priority
+        self.time_budget = time_budget
+        self.status = QUEUED
+        self.stage = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+
+    def to_dict(self):
+        """Returns the job's status without its CSV payload"""
+        now = self.finished or time.time()
+        return {
+            "id": self.job_id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "priority": self.priority,
+            "time_budget": self.time_budget,
+            "progress": self.progress,
+            "submitted": datetime.fromtimestamp(self.submitted).isoformat(timespec="seconds"),
+            "elapsed": round(now - self.started, 3) if self.started else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class SolveService:
+    """
+    Priority queue of solve jobs served by a fixed number of worker processes.
+    Higher priorities run first; jobs of equal priority run in submission order.
+    """
+    def __init__(self, db_file="timetables.db", workers=2, max_queued=100,
+                 default_time_budget=300, max_time_budget=3600, max_finished=500):
+        self.db_file = db_file
+        self.workers = workers
+        self.max_queued = max_queued
+        # Finished jobs kept for status queries; the oldest are forgotten beyond this
+        self.max_finished = max_finished
+        self.default_time_budget = default_time_budget
+        self.max_time_budget = max_time_budget
+
+        self.jobs = {}
+        self._finished = deque()  # Ids of finished jobs, oldest first
+        self._queue = []
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._stopping = False
+        # Spawned workers start clean rather than inheriting the server's threads
+        self._context = multiprocessing.get_context("spawn")
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f"solve-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+        # Create the tables before any worker process tries to write to them
+        TimetableDatabase(db_file).close()
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Cancels running jobs and stops the worker threads"""
+        with self._condition:
+            self._stopping = True
+            for job in list(self.jobs.values()):
+                if job.status == QUEUED:
+                    self._finish(job, CANCELLED)
+                elif job.status == RUNNING:
+                    job.cancel_requested = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, payload):
+        """
+        Validates and queues a job, returning it. Raises ValueError for a bad
+        payload and OverflowError when the queue is full.
+        """
+        for key in ("rooms_csv", "exams_csv", "students_csv"):
+            if not isinstance(payload.get(key), str) or not payload[key].strip():
+                raise ValueError(f"'{key}' must contain the CSV file as text")
+        engine_settings(payload.get("settings", {}))
+        priority = int(payload.get("priority", 0))
+        time_budget = float(payload.get("time_budget", self.default_time_budget))
+        if not 0 < time_budget <= self.max_time_budget:
+            raise ValueError(f"'time_budget' must be between 0 and {self.max_time_budget} seconds")
+
+        with self._condition:
+            if sum(1 for job in self.jobs.values() if job.status == QUEUED) >= self.max_queued:
+                raise OverflowError("The job queue is full")
+            job = Job(next(self._ids), payload, priority, time_budget)
+            self.jobs[job.job_id] = job
+            heapq.heappush(self._queue, (-priority, job.job_id))
+            self._condition.notify()
+        return job
+
+    def get(self, job_id):
+        """Returns a job, or None if there is no job with that id"""
+        with self._condition:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        # Copied under the lock, as other request threads add jobs while this one reads
+        with self._condition:
+            jobs = sorted(self.jobs.values(), key=lambda j: j.job_id)
+        return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job, returning False if it had already finished"""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+            return True
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._condition:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished = time.time()
+            # The CSV text is no longer needed once the job has finished
+            job.payload = None
+            self._finished.append(job.job_id)
+            while len(self._finished) > self.max_finished:
+                del self.jobs[self._finished.popleft()]
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._stopping and not self._queue:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                _, job_id = heapq.heappop(self._queue)
+                job = self.jobs.get(job_id)
+                if job is None or job.status != QUEUED:
+                    # Cancelled while it was waiting, and possibly forgotten since
+                    continue
+                job.status = RUNNING
+                job.started = time.time()
+            self._execute(job)
+
+    def _execute(self, job):
+        """Runs a job in a worker process, enforcing its time budget"""
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_run_job, args=(self.db_file, job.payload, sender),
+                                        daemon=True)
+        process.start()
+        sender.close()
+        deadline = job.started + job.time_budget
+        try:
+            while True:
+                if job.cancel_requested:
+                    self._finish(job, CANCELLED)
+                    return
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._finish(job, TIMED_OUT, error=f"Exceeded the time budget of {job.time_budget}s")
+                    return
+                if not receiver.poll(min(remaining, PROGRESS_INTERVAL)):
+                    continue
+                try:
+                    kind, value = receiver.recv()
+                except EOFError:
+                    self._finish(job, FAILED, error=f"Worker exited with code {process.exitcode}")
+                    return
+                if kind == "stage":
+                    job.stage = value
+                elif kind == "progress":
+                    job.progress = value
+                elif kind == "done":
+                    self._finish(job, SUCCEEDED if value["success"] else FAILED, result=value)
+                    return
+                elif kind == "error":
+                    self._finish(job, FAILED, error=value)
+                    return
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            receiver.close()
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """Maps the JSON API onto the SolveService held by the server"""
+    _JOB_PATH = re.compile(r"^/jobs/(\d+)$")
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id(self):
+        match = self._JOB_PATH.match(self.path)
+        return int(match.group(1)) if match else None
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/jobs":
+            self._send_json(200, {"jobs": service.list_jobs()})
+            return
+        job_id = self._job_id()
+        job = service.get(job_id) if job_id is not None else None
+        if job is None:
+            self._send_json(404, {"error": "No such job"})
+        else:
+            self._send_json(200, job.to_dict())
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send_json(413, {"error": "Request too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("The request body must be a JSON object")
+            job = self.server.service.submit(payload)
+        except OverflowError as e:
+            self._send_json(503, {"error": str(e)})
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+        else:
+            self._send_json(202, job.to_dict())
+
+    def do_DELETE(self):
+        job_id = self._job_id()
+        if job_id is None or self.server.service.get(job_id) is None:
+            self._send_json(404, {"error": "No such job"})
+        elif self.server.service.cancel(job_id):
+            self._send_json(200, self.server.service.get(job_id).to_dict())
+        else:
+            self._send_json(409, {"error": "The job has already finished"})
+
+def serve(service, host="127.0.0.1", port=8765):
+    """Starts the service's workers and serves the API until interrupted"""
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    service.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the exam timetable solve service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default="timetables.db", help="database the timetables are saved to")
+    parser.add_argument("--workers", type=int, default=2, help="jobs solved at the same time")
+    parser.add_argument("--max-queued", type=int, default=100, help="jobs allowed to wait in the queue")
+    parser.add_argument("--time-budget", type=float, default=300,
+                        help="default seconds a job may run before it is stopped")
+    parser.add_argument("--max-time-budget", type=float, default=3600,
+                        help="largest time budget a job may ask for")
+    parser.add_argument("--max-finished", type=int, default=500,
+                        help="finished jobs kept for status queries")
+    args = parser.parse_args(argv)
+
+    service = SolveService(args.db, workers=args.workers, max_queued=args.max_queued,
+                           default_time_budget=args.time_budget, max_time_budget=args.max_time_budget,
+                           max_finished=args.max_finished)
+    print(f"Solve service listening on http://{args.host}:{args.port}")
+    serve(service, args.host, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Solver Trace Module
+
+This module records what the timetable search did, one fixed-size binary record
+per decision: each exam assigned to a slot, each slot rejected with its reason,
+each assignment undone by backtracking, and the moves, improved solutions and
+stops of the other solvers. The trace starts with the solver, seed, engine
+settings and a hash of the input data, so a slow or failed production run can be
+attached to a bug report and examined offline.
+
+`replay` re-runs the recorded search on the same input and checks that it makes
+exactly the same decisions, stopping where the original run ran out of time.
+`summarise` reports the exams the search spent longest on, how deep it went and
+where the time was spent.
+
+Usage:
+    python -m solver_trace summary run.trace --top 10
+    python -m solver_trace replay run.trace --rooms rooms.csv --exams exams.csv --students students.csv
+"""
+
+import json
+import struct
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+MAGIC = b"TTTRC1"
+# Increase this when the layout of the file or the meaning of the events changes
+TRACE_VERSION = 1
+# Magic, version and the length of the JSON metadata that follows
+_HEADER = struct.Struct("<6sHI")
+# Event kind, exam index, slot, search depth, extra value, seconds since the start
+_RECORD = struct.Struct("<BIIIIf")
+# Records buffered before each write to the file
+_BUFFER_RECORDS = 4096
+
+# Event kinds. `aux` holds the room index for ASSIGN, a reason for REJECT, the
+# previous slot for MOVE, the objective for SOLUTION and the step count for STOP.
+ASSIGN = 1
+REJECT = 2
+BACKTRACK = 3
+FALLBACK = 4
+MOVE = 5
+SOLUTION = 6
+STOP = 7
+EVENT_NAMES = {ASSIGN: "assign", REJECT: "reject", BACKTRACK: "backtrack", FALLBACK: "greedy fallback",
+               MOVE: "move", SOLUTION: "improved solution", STOP: "stopped at time budget"}
+
+# Reasons a slot was rejected
+NO_ROOM = 1
+MIN_GAP = 2
+BOUND = 3
+REASON_NAMES = {NO_ROOM: "no free room", MIN_GAP: "too close to a related exam",
+                BOUND: "pruned by bound"}
+
+# Exam index used for events that do not concern one exam
+NO_EXAM = 0xFFFFFFFF
+
+class SolverTrace:
+    """
+    Writer for a trace file. The engine calls `record` from its search loops; the
+    file is written through a buffer and completed by `close`.
+    """
+    def __init__(self, path, metadata):
+        self.path = path
+        self.metadata = metadata
+        self.exam_index = {exam_id: i for i, exam_id in enumerate(metadata["exam_ids"])}
+        self.room_index = {room_id: i for i, room_id in enumerate(metadata["room_ids"])}
+        self.events = 0
+        self._file = open(path, "wb")
+        encoded = json.dumps(metadata, sort_keys=True).encode()
+        self._file.write(_HEADER.pack(MAGIC, TRACE_VERSION, len(encoded)))
+        self._file.write(encoded)
+        self._buffer = bytearray(_RECORD.size * _BUFFER_RECORDS)
+        self._used = 0
+        self._started = time.perf_counter()
+
+    @classmethod
+    def for_engine(cls, path, engine):
+        """Starts a trace of an engine's next run, recording its inputs and settings"""
+        import platform
+        from solve_cache import SolveCache
+        return cls(path, {
+            "solver": engine.solver,
+            "objective": engine.objective,
+            "seed": engine.seed,
+            "settings": engine.cache_settings(),
+            # The same hash as the solve cache, over the input data alone
+            "input_hash": SolveCache.make_key(engine.rooms, engine.exams, engine.student_names, {}),
+            "exam_ids": [e.exam_id for e in engine.exams],
+            "room_ids": [r.room_id for r in engine.rooms],
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+        })
+
+    def record(self, kind, exam_id=None, slot=0, depth=0, aux=0):
+        """Appends one event; `exam_id` is looked up in the exam order of the metadata"""
+        exam = NO_EXAM if exam_id is None else self.exam_index[exam_id]
+        _RECORD.pack_into(self._buffer, self._used, kind, exam, slot, depth, aux,
+                          time.perf_counter() - self._started)
+        self._used += _RECORD.size
+        self.events += 1
+        if self._used == len(self._buffer):
+            self._flush()
+
+    def room(self, room_id):
+        return self.room_index[room_id]
+
+    def _flush(self):
+        self._file.write(memoryview(self._buffer)[:self._used])
+        self._used = 0
+
+    def close(self):
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
+
+def read_trace(path):
+    """
+    Reads a trace file and returns (metadata, records), where records is a list of
+    (kind, exam_index, slot, depth, aux, seconds) tuples.
+    Raises ValueError if the file is not a trace.
+    """
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError("Not a solver trace")
+        magic, version, metadata_size = _HEADER.unpack(header)
+        if magic != MAGIC or version != TRACE_VERSION:
+            raise ValueError("Not a solver trace or an unsupported version")
+        metadata = json.loads(f.read(metadata_size).decode())
+        data = f.read()
+    # A run that crashed can leave a partly written last record, which is dropped
+    usable = len(data) - len(data) % _RECORD.size
+    return metadata, list(_RECORD.iter_unpack(memoryview(data)[:usable]))
+
+def describe(record, metadata):
+    """Formats one record for display"""
+    kind, exam, slot, depth, aux, seconds = record
+    exam_id = "-" if exam == NO_EXAM else metadata["exam_ids"][exam]
+    text = f"{seconds:10.4f}s  {EVENT_NAMES.get(kind, kind):22} exam {exam_id:10} slot {slot:5} depth {depth:5}"
+    if kind == REJECT:
+        text += f"  ({REASON_NAMES.get(aux, aux)})"
+    elif kind == ASSIGN:
+        text += f"  room {metadata['room_ids'][aux]}"
+    elif kind in (SOLUTION, STOP, MOVE):
+        text += f"  value {aux}"
+    return text
+
+def summarise(path, top=10):
+    """
+    Summarises a trace: event counts, rejection reasons, the exams with the most
+    search activity, how the assignments are spread over search depth and where
+    the time went. Returns the summary as a dict.
+    """
+    metadata, records = read_trace(path)
+    exam_ids = metadata["exam_ids"]
+    kinds = Counter()
+    reasons = Counter()
+    activity = defaultdict(Counter)
+    depths = Counter()
+    exam_time = defaultdict(float)
+    depth_time = defaultdict(float)
+    solutions = []
+
+    previous = 0.0
+    for kind, exam, slot, depth, aux, seconds in records:
+        kinds[EVENT_NAMES.get(kind, str(kind))] += 1
+        # The time since the previous event is put down to the decision it led to
+        elapsed = max(0.0, seconds - previous)
+        previous = seconds
+        depth_time[depth] += elapsed
+        if exam != NO_EXAM:
+            activity[exam_ids[exam]][EVENT_NAMES[kind]] += 1
+            exam_time[exam_ids[exam]] += elapsed
+        if kind == REJECT:
+            reasons[REASON_NAMES.get(aux, str(aux))] += 1
+        elif kind == ASSIGN:
+            depths[depth] += 1
+        elif kind == SOLUTION:
+            solutions.append({"seconds": round(seconds, 6), "objective": aux})
+
+    hot = sorted(activity, key=lambda e: (-sum(activity[e].values()), e))[:top]
+    return {
+        "solver": metadata["solver"],
+        "objective": metadata["objective"],
+        "seed": metadata["seed"],
+        "input_hash": metadata["input_hash"],
+        "events": len(records),
+        "duration": round(records[-1][5], 6) if records else 0.0,
+        "event_counts": dict(kinds),
+        "rejections": dict(reasons),
+        "hot_exams": [{"exam_id": e, "events": sum(activity[e].values()),
+                       "seconds": round(exam_time[e], 6), **activity[e]} for e in hot],
+        "depth_histogram": dict(sorted(depths.items())),
+        "time_by_depth": {d: round(t, 6) for d, t in sorted(depth_time.items())},
+        "solutions": solutions,
+    }
+
+def format_summary(summary, width=40):
+    """Formats a summary from `summarise` as text lines, with bar charts for the histograms"""
+    lines = [f"Solver: {summary['solver']} (objective {summary['objective']}, seed {summary['seed']})",
+             f"Input hash: {summary['input_hash']}",
+             f"{summary['events']} events over {summary['duration']:.3f}s", "", "Events:"]
+    lines += [f"  {name:24} {count:10}" for name, count in sorted(summary["event_counts"].items())]
+    if summary["rejections"]:
+        lines += ["", "Rejected slots:"]
+        lines += [f"  {name:30} {count:10}" for name, count in summary["rejections"].items()]
+
+    lines += ["", "Hot exams:"]
+    for entry in summary["hot_exams"]:
+        detail = ", ".join(f"{entry[name]} {name}" for name in EVENT_NAMES.values() if name in entry)
+        lines.append(f"  {entry['exam_id']:12} {entry['events']:8} events {entry['seconds']:9.4f}s  {detail}")
+
+    def bars(title, values, unit):
+        if not values:
+            return []
+        # Depths are grouped into at most 20 rows so deep searches stay readable
+        deepest = max(values)
+        step = max(1, -(-(deepest + 1) // 20))
+        grouped = Counter()
+        for depth, value in values.items():
+            grouped[depth // step * step] += value
+        largest = max(grouped.values()) or 1
+        out = ["", title]
+        for start in sorted(grouped):
+            label = f"{start}" if step == 1 else f"{start}-{start + step - 1}"
+            value = grouped[start]
+            shown = f"{value:.4f}{unit}" if isinstance(value, float) else f"{value}{unit}"
+            out.append(f"  {label:>11} {shown:>12} {'#' * round(width * value / largest)}")
+        return out
+
+    lines += bars("Assignments by depth:", summary["depth_histogram"], "")
+    lines += bars("Time by depth:", summary["time_by_depth"], "s")
+    if summary["solutions"]:
+        lines += ["", "Improved solutions:"]
+        lines += [f"  {s['seconds']:10.4f}s  objective {s['objective']}" for s in summary["solutions"]]
+    return lines
+
+def replay(path, rooms, exams, student_names, output=None):
+    """
+    Re-runs the search recorded in a trace on the same input, recording a new trace
+    to `output` (a temporary file by default), and compares the two decision by
+    decision. A run that stopped at its time budget is replayed up to the same step.
+    Returns (matched, index of the first differing event or None, original records,
+    replayed records). Raises ValueError if the input is not what was recorded.
+    """
+    from engine import TimetableEngine
+    from solve_cache import SolveCache
+    from solve_service import ENGINE_SETTINGS, engine_settings
+
+    metadata, original = read_trace(path)
+    if SolveCache.make_key(rooms, exams, student_names, {}) != metadata["input_hash"]:
+        raise ValueError("The input data does not match the data the trace was recorded on")
+
+    settings = metadata["settings"]
+    kwargs = engine_settings({k: v for k, v in settings.items() if k in ENGINE_SETTINGS})
+    stops = [r for r in original if r[0] == STOP]
+    output = output or path + ".replay"
+    engine = TimetableEngine(
+        rooms, exams, student_names, solver=metadata["solver"], objective=metadata["objective"],
+        seed=metadata["seed"],
+        # The recorded step count replaces the wall clock so the replay stops at the same point
+        time_budget=float("inf") if stops else settings["time_budget"],
+        max_search_steps=stops[-1][4] if stops else None,
+        trace=output, **kwargs)
+    engine.generate()
+    _, replayed = read_trace(output)
+
+    for index, (a, b) in enumerate(zip(original, replayed)):
+        if a[:5] != b[:5]:
+            return False, index, original, replayed
+    if len(original) != len(replayed):
+        return False, min(len(original), len(replayed)), original, replayed
+    return True, None, original, replayed
+
+def main(argv=None):
+    # The engine imports this module, so the command line parser is only loaded here
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarise or replay a solver trace")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary_parser = commands.add_parser("summary", help="show where the search spent its effort")
+    summary_parser.add_argument("trace")
+    summary_parser.add_argument("--top", type=int, default=10, help="number of hot exams to list")
+    summary_parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    replay_parser = commands.add_parser("replay", help="re-run a trace and check it is reproduced exactly")
+    replay_parser.add_argument("trace")
+    replay_parser.add_argument("--rooms", required=True)
+    replay_parser.add_argument("--exams", required=True)
+    replay_parser.add_argument("--students", required=True)
+    replay_parser.add_argument("--output", help="where to write the replayed trace")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "summary":
+            summary = summarise(args.trace, args.top)
+            print(json.dumps(summary, indent=2) if args.json else "\n".join(format_summary(summary)))
+            return 0
+
+        from csv_input import read_rooms, read_exams, read_students
+        with open(args.rooms, newline="") as f:
+            rooms = read_rooms(f)
+        with open(args.exams, newline="") as f:
+            exams = read_exams(f)
+        with open(args.students, newline="") as f:
+            student_names = read_students(f)
+        metadata = read_trace(args.trace)[0]
+        matched, index, original, replayed = replay(args.trace, rooms, exams, student_names, args.output)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    if matched:
+        print(f"Replay reproduced all {len(original)} events")
+        return 0
+    print(f"Replay diverged at event {index} of {len(original)}:")
+    print("  recorded: " + (describe(original[index], metadata) if index < len(original) else "end of trace"))
+    print("  replayed: " + (describe(replayed[index], metadata) if index < len(replayed) else "end of trace"))
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
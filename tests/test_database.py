@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from database import TimetableDatabase
+from models import Placement
+
+BASE = [
+    Placement("E1", "Maths", "R1", "2026-01-05", "09:00", "11:00", ["S1", "S2"]),
+    Placement("E2", "Art", "R2", "2026-01-05", "13:00", "14:30", ["S2", "S3"]),
+    Placement("E3", "History", "R1", "2026-01-06", "09:00", "10:00", ["S1"]),
+]
+
+@pytest.fixture
+def db(tmp_path):
+    database = TimetableDatabase(str(tmp_path / "timetables.db"))
+    yield database
+    database.close()
+
+def _key(placements):
+    return sorted((p.exam_id, p.subject, p.room_id, p.date, p.start, p.end, list(p.student_ids))
+                  for p in placements)
+
+def test_versions_round_trip(db):
+    timetable_id = db.save_timetable("Summer", "", BASE, "2026-01-05", "2026-01-09")
+    moved = [Placement("E1", "Maths", "R2", "2026-01-07", "09:00", "11:00", ["S1", "S2"])] + BASE[1:]
+    regrouped = moved[:2] + [Placement("E4", "Music", "R3", "2026-01-08", "09:00", "10:00", ["S3"])]
+
+    assert db.save_version(timetable_id, moved) == 1
+    assert db.save_version(timetable_id, regrouped) == 2
+    # Saving the same placements again does not create a version
+    assert db.save_version(timetable_id, regrouped) == 2
+
+    assert _key(db.load_version(timetable_id, 0)) == _key(BASE)
+    assert _key(db.load_version(timetable_id, 1)) == _key(moved)
+    assert _key(db.load_version(timetable_id)) == _key(regrouped)
+
+def test_compaction_keeps_later_versions(db):
+    timetable_id = db.save_timetable("Summer", "", BASE, "2026-01-05", "2026-01-09")
+    moved = [Placement("E1", "Maths", "R2", "2026-01-07", "09:00", "11:00", ["S1", "S2"])] + BASE[1:]
+    dropped = moved[:2]
+    db.save_version(timetable_id, moved)
+    db.save_version(timetable_id, dropped)
+
+    db.compact_versions(timetable_id, 1)
+    assert db.get_base_version(timetable_id) == 1
+    assert _key(db.load_timetable(timetable_id)) == _key(moved)
+    assert _key(db.load_version(timetable_id)) == _key(dropped)
+    with pytest.raises(ValueError):
+        db.load_version(timetable_id, 0)
+
+def test_analytics_follow_the_latest_version(db):
+    timetable_id = db.save_timetable("Summer", "", BASE, "2026-01-05", "2026-01-09")
+    moved = [Placement("E1", "Maths", "R2", "2026-01-07", "09:00", "11:00", ["S1", "S2"])] + BASE[1:]
+    db.save_version(timetable_id, moved)
+    fresh_id = db.save_timetable("Copy", "", moved, "2026-01-05", "2026-01-09")
+    assert db.get_day_load(timetable_id) == db.get_day_load(fresh_id)
+
+def test_migrations_run_once(tmp_path):
+    path = str(tmp_path / "timetables.db")
+    database = TimetableDatabase(path)
+    timetable_id = database.save_timetable("Summer", "", BASE, "2026-01-05", "2026-01-09")
+    database.close()
+
+    # Simulate a database written before the enrolment and summary tables existed
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM placement_students")
+    conn.execute("DELETE FROM day_load")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+
+    database = TimetableDatabase(path)
+    try:
+        assert database.conn.execute("PRAGMA user_version").fetchone()[0] == 2
+        assert database.conn.execute("SELECT COUNT(*) FROM placement_students").fetchone()[0] == 5
+        assert database.get_day_load(timetable_id)
+    finally:
+        database.close()
+
+def test_student_timetable_follows_the_version(db):
+    timetable_id = db.save_timetable("Summer", "", BASE, "2026-01-05", "2026-01-09")
+    assert [p.exam_id for p in db.get_student_timetable(timetable_id, "S1")] == ["E1", "E3"]
+
+    moved = [Placement("E1", "Maths", "R2", "2026-01-07", "09:00", "11:00", ["S1", "S2"])] + BASE[1:]
+    db.save_version(timetable_id, moved)
+    assert [p.exam_id for p in db.get_student_timetable(timetable_id, "S1")] == ["E3", "E1"]
+    assert [p.date for p in db.get_student_timetable(timetable_id, "S1", 0)] == ["2026-01-05", "2026-01-06"]
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from csv_input import read_exams
+from enrolment_store import EnrolmentStore
+from models import Exam
+
+EXAMS = [
+    Exam("E1", "Maths", 120, ["S2", "S1", "S2"]),
+    Exam("E2", "Art", 90, ["S3", "S2"]),
+    Exam("E3", "Music", 60, ["S4"]),
+]
+NAMES = {"S1": "Ann", "S2": "Bo", "S3": "Cy", "S5": "Di"}
+EXAMS_CSV = "exam_id,subject,duration_minutes,student_ids\n" \
+            "E1,Maths,120,S2;S1;S2\nE2,Art,90,S3;S2\nE3,Music,60,S4\n"
+STUDENTS_CSV = "student_id,full_name\nS1,Ann\nS2,Bo\nS3,Cy\nS5,Di\n"
+
+def test_write_and_open_round_trip(tmp_path):
+    path = str(tmp_path / "enrolment.csr")
+    EnrolmentStore.write(path, EXAMS, NAMES).close()
+    with EnrolmentStore.open(path) as store:
+        assert [(e.exam_id, e.subject, e.duration) for e in store] == \
+            [("E1", "Maths", 120), ("E2", "Art", 90), ("E3", "Music", 60)]
+        assert [list(e.student_ids) for e in store] == [["S1", "S2"], ["S2", "S3"], ["S4"]]
+        assert store[0].student_ids[-1] == "S2"
+        assert [store.size(i) for i in range(len(store))] == [2, 2, 1]
+        assert store.largest_exam() == 2
+        assert store.exams_over_capacity(1) == ["E1", "E2"]
+        # Students with no name, and names with no exam, are both kept
+        assert dict(store.student_names) == {**NAMES, "S4": ""}
+        assert store.student_index("S3") == 2
+        with pytest.raises(KeyError):
+            store.student_index("S9")
+        assert store.conflict_weights() == {"E1": {"E2": 1}, "E2": {"E1": 1}}
+
+def test_open_rejects_other_files(tmp_path):
+    path = tmp_path / "other.csr"
+    path.write_bytes(b"not a store" * 20)
+    with pytest.raises(ValueError):
+        EnrolmentStore.open(str(path))
+
+def test_csv_store_agrees_with_csv_list(tmp_path):
+    exams_file, students_file = tmp_path / "exams.csv", tmp_path / "students.csv"
+    exams_file.write_text(EXAMS_CSV)
+    students_file.write_text(STUDENTS_CSV)
+    listed = read_exams(io.StringIO(EXAMS_CSV))
+    with EnrolmentStore.from_csv(str(tmp_path / "e.csr"), str(exams_file), str(students_file)) as store:
+        assert [list(e.student_ids) for e in store] == [e.student_ids for e in listed]
+        assert [store.size(i) for i in range(len(store))] == [len(e.student_ids) for e in listed]
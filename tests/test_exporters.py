@@ -0,0 +1,35 @@
+import pytest
+
+from exporters import _ics_escape, _ics_line, iter_student_ics
+from models import Placement
+
+def _unfold(text):
+    return text[:-2].replace("\r\n ", "")
+
+@pytest.mark.parametrize("line", [
+    "SUMMARY:Maths",
+    "X" * 75,
+    "X" * 76,
+    # The second physical line is exactly the 74 octets a continuation may carry
+    "X" * (75 + 74),
+    "X" * (75 + 75),
+    "SUMMARY:" + "é" * 100,
+    "LOCATION:" + "x" + "漢字" * 60,
+])
+def test_ics_line_folds_to_75_octets(line):
+    folded = _ics_line(line)
+    assert folded.endswith("\r\n")
+    assert _unfold(folded) == line
+    physical = folded[:-2].split("\r\n")
+    assert all(len(part.encode("utf-8")) <= 75 for part in physical)
+    assert all(part.startswith(" ") for part in physical[1:])
+
+def test_ics_escape():
+    assert _ics_escape("Hall; A, B\\C\nD") == "Hall\\; A\\, B\\\\C\\nD"
+
+def test_student_calendar_lists_their_exams():
+    placements = [Placement("E1", "Maths", "Hall", "2025-06-02", "09:00", "11:00", ["S1"])]
+    text = "".join(iter_student_ics(placements, "S1", "Ann"))
+    assert "DTSTART:20250602T090000\r\n" in text
+    assert text.count("BEGIN:VEVENT") == 1
+    assert text.endswith("END:VCALENDAR\r\n")
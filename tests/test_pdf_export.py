@@ -0,0 +1,49 @@
+import re
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+from export_pipeline import ExportCancelled
+from models import Placement
+from pdf_export import export_combined_pdf
+
+def _pages(path):
+    data = open(path, "rb").read()
+    return len(re.findall(rb"/Type /Page\b(?!s)", data)), data
+
+def test_combined_pdf_streams_a_page_and_bookmark_per_student(tmp_path):
+    # Relies on ReportLab calling filterFlowables with the list given to build;
+    # if that changes only the first student would be written
+    names = {f"S{i}": f"Student {i}" for i in range(40)}
+    placements = [Placement("E1", "Maths", "R1", "2026-01-05", "09:00", "11:00", list(names))]
+    seen = []
+    path = str(tmp_path / "combined.pdf")
+    export_combined_pdf(placements, path, names, progress=lambda sid, _, done, total: seen.append(done))
+
+    pages, data = _pages(path)
+    assert pages == 40
+    assert b"/Count 40" in data
+    assert seen == list(range(1, 41))
+
+def test_cancelled_combined_pdf_leaves_no_file(tmp_path):
+    names = {f"S{i}": f"Student {i}" for i in range(10)}
+    path = tmp_path / "combined.pdf"
+
+    def cancel(sid, _, done, total):
+        if done == 3:
+            raise ExportCancelled()
+
+    with pytest.raises(ExportCancelled):
+        export_combined_pdf([], str(path), names, progress=cancel)
+    assert list(tmp_path.iterdir()) == []
+
+def test_streaming_failure_is_reported_not_truncated(tmp_path, monkeypatch):
+    import pdf_export
+    # Simulates a ReportLab release that no longer calls the hook
+    monkeypatch.setattr(pdf_export._StreamingDocTemplate, "filterFlowables", lambda self, flowables: None)
+    names = {f"S{i}": f"Student {i}" for i in range(5)}
+    path = tmp_path / "combined.pdf"
+    with pytest.raises(Exception, match="filterFlowables"):
+        export_combined_pdf([], str(path), names)
+    assert not path.exists()
@@ -0,0 +1,46 @@
+import pytest
+
+from models import Exam
+from preprocessing import InstanceSnapshot
+
+EXAMS = [
+    Exam("E1", "Maths", 120, ["S1", "S2", "S3"]),
+    Exam("E2", "Art", 90, ["S2", "S3"]),
+    Exam("E3", "Music", 60, ["S3", "S4", "S4"]),
+    Exam("E4", "Drama", 60, ["S5"]),
+]
+
+def _state(snapshot):
+    return (snapshot.exam_ids, snapshot.exam_sizes, dict(snapshot.student_exams),
+            {e: n for e, n in snapshot.adjacency.items() if n}, snapshot.ordering())
+
+def test_build_counts_shared_students():
+    snapshot = InstanceSnapshot.build(EXAMS)
+    assert snapshot.adjacency["E1"] == {"E2": 2, "E3": 1}
+    assert snapshot.exam_sizes == {"E1": 3, "E2": 2, "E3": 2, "E4": 1}
+    assert snapshot.ordering() == ["E1", "E2", "E3", "E4"]
+    assert snapshot.matches(EXAMS)
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "exams.snapshot")
+    snapshot = InstanceSnapshot.build(EXAMS)
+    snapshot.save(path)
+    assert not snapshot.dirty
+    loaded = InstanceSnapshot.load(path)
+    assert _state(loaded) == _state(snapshot)
+    assert not (tmp_path / "exams.snapshot.tmp").exists()
+
+def test_sync_matches_a_fresh_build(tmp_path):
+    path = str(tmp_path / "exams.snapshot")
+    InstanceSnapshot.load_or_build(path, EXAMS)
+    changed = [Exam("E1", "Maths", 120, ["S1", "S2"]), EXAMS[2],
+               Exam("E5", "Latin", 60, ["S1", "S5"]), EXAMS[3]]
+    synced = InstanceSnapshot.load_or_build(path, changed)
+    assert _state(synced) == _state(InstanceSnapshot.build(changed))
+    assert _state(InstanceSnapshot.load(path)) == _state(synced)
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.snapshot"
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        InstanceSnapshot.load(str(path))
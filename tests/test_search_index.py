@@ -0,0 +1,45 @@
+import pytest
+
+from models import Placement
+from search_index import PrefixTrie, SearchIndex
+
+PLACEMENTS = [
+    Placement("E1", "Maths", "Hall", "2025-06-02", "09:00", "11:00", ["S1", "S2"]),
+    Placement("E2", "Music", "Lab", "2025-06-03", "09:00", "10:30", ["S2", "S3"]),
+    Placement("E3", "Art", "Hall", "2025-06-04", "13:00", "14:30", ["S3"]),
+]
+NAMES = {"S1": "Ann Lee", "S2": "Bo Marsh", "S3": "Cy Lewis"}
+
+def test_trie_stores_values_only_at_word_ends():
+    trie = PrefixTrie()
+    trie.insert("mat", 1)
+    trie.insert("maths", 2)
+    trie.insert("music", 3)
+    assert trie.find("ma") == {1, 2}
+    assert trie.find("m") == {1, 2, 3}
+    assert trie.find("mathsx") == set()
+    assert trie.words_with_prefix("ma") == {"mat", "maths"}
+    # Inner nodes hold no values
+    assert None not in trie.root["m"]["a"]
+
+def test_trie_lookup_can_be_abandoned():
+    trie = PrefixTrie()
+    for i in range(PrefixTrie.CHECK_INTERVAL * 2):
+        trie.insert(f"w{i}", i)
+
+    def stop():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        trie.find("w", stop)
+    assert len(trie.find("w")) == PrefixTrie.CHECK_INTERVAL * 2
+
+def test_search_matches_every_term_in_timetable_order():
+    index = SearchIndex(PLACEMENTS, NAMES)
+    assert index.search("m") == PLACEMENTS[:2]
+    assert index.search("hall le") == [PLACEMENTS[0], PLACEMENTS[2]]
+    assert index.search("lewis art") == [PLACEMENTS[2]]
+    assert index.search("2025-06-03") == [PLACEMENTS[1]]
+    assert index.search("zz") == []
+    assert index.search("  ") == PLACEMENTS
+    assert index.matching_students("LE") == {"S1", "S3"}
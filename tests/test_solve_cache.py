@@ -0,0 +1,34 @@
+from enrolment_store import EnrolmentStore
+from models import Exam, Room
+from solve_cache import SolveCache
+
+ROOMS = [Room("R1", 30), Room("R2", 10)]
+EXAMS = [Exam("E1", "Maths", 120, ["S1", "S2"]), Exam("E2", "Art", 90, ["S2", "S3"])]
+NAMES = {"S1": "Ann", "S2": "Bo", "S3": "Cy"}
+
+def test_key_depends_on_every_input():
+    key = SolveCache.make_key(ROOMS, EXAMS, NAMES, {"seed": 1})
+    assert key == SolveCache.make_key(ROOMS, EXAMS, dict(NAMES), {"seed": 1})
+    assert key != SolveCache.make_key(ROOMS, EXAMS, NAMES, {"seed": 2})
+    assert key != SolveCache.make_key(ROOMS[::-1], EXAMS, NAMES, {"seed": 1})
+    assert key != SolveCache.make_key(ROOMS, EXAMS, {**NAMES, "S3": "Di"}, {"seed": 1})
+    moved = [EXAMS[0], Exam("E2", "Art", 90, ["S1", "S3"])]
+    assert key != SolveCache.make_key(ROOMS, moved, NAMES, {"seed": 1})
+
+def test_store_key_is_taken_from_its_sections(tmp_path):
+    with EnrolmentStore.write(str(tmp_path / "a.csr"), EXAMS, NAMES) as a, \
+            EnrolmentStore.write(str(tmp_path / "b.csr"), EXAMS, {**NAMES, "S3": "Di"}) as b:
+        key = SolveCache.make_key(ROOMS, a, a.student_names, {})
+        assert key == SolveCache.make_key(ROOMS, a, a.student_names, {})
+        assert key != SolveCache.make_key(ROOMS, b, b.student_names, {})
+        # Names given separately from the store are hashed as well
+        assert key != SolveCache.make_key(ROOMS, a, {}, {})
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = SolveCache(str(tmp_path / "cache.db"))
+    try:
+        assert cache.get("k") is None
+        cache.put("k", {"success": True, "placements": [("E1", "Maths")]})
+        assert cache.get("k") == {"success": True, "placements": [("E1", "Maths")]}
+    finally:
+        cache.close()
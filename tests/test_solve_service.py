@@ -0,0 +1,42 @@
+from datetime import date, time
+
+import pytest
+
+from solve_service import engine_settings
+
+def test_settings_are_converted():
+    settings = engine_settings({
+        "start_date": "2025-06-02",
+        "start_time": "09:00",
+        "max_exams_day": 2,
+        "exclude_weekends": False,
+        "excluded_dates": ["2025-06-04"],
+        "custom_time_slots": {"2025-06-03": {"start": "13:00", "end": "17:00"}},
+    })
+    assert settings == {
+        "start_date": date(2025, 6, 2),
+        "start_time": time(9, 0),
+        "max_exams_day": 2,
+        "exclude_weekends": False,
+        "excluded_dates": ["2025-06-04"],
+        "custom_time_slots": {"2025-06-03": {"start": "13:00", "end": "17:00"}},
+    }
+
+@pytest.mark.parametrize("settings", [
+    {"exclude_weekends": "false"},
+    {"spread_evenly": 1},
+    {"max_exams_day": "3"},
+    {"min_gap": True},
+    {"start_time": "9:00"},
+    {"excluded_dates": "2025-06-04"},
+    {"excluded_dates": ["04/06/2025"]},
+    {"custom_time_slots": ["2025-06-03"]},
+    {"custom_time_slots": {"2025-06-03": {"start": "13:00"}}},
+    {"custom_time_slots": {"2025-06-03": {"start": "1pm", "end": "17:00"}}},
+    {"custom_time_slots": {"2025-06-03": {"start": "17:00", "end": "13:00"}}},
+    {"custom_time_slots": {"June 3": {"start": "13:00", "end": "17:00"}}},
+    {"solver": "backtrack"},
+])
+def test_bad_settings_are_refused(settings):
+    with pytest.raises(ValueError):
+        engine_settings(settings)
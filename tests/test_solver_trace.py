@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks.generator import generate_instance
+from benchmarks.run import make_engine
+from models import Exam, Room
+from solver_trace import ASSIGN, BOUND, REJECT, STOP, read_trace, replay, summarise
+
+INSTANCE = generate_instance(num_rooms=3, num_exams=12, num_students=60, exams_per_student=3, seed=7)
+
+# Five exams whose students link them in a cycle: any two neighbours need different
+# days, so three days are needed although the largest clique is only two exams
+CYCLE = ([Room("R1", 10), Room("R2", 10)],
+         [Exam(f"E{i}", "Maths", 60, [f"S{i}", f"S{(i + 1) % 5}"]) for i in range(5)],
+         {f"S{i}": f"Student {i}" for i in range(5)})
+
+def _traced_run(tmp_path, instance=INSTANCE, **settings):
+    path = str(tmp_path / "run.trace")
+    rooms, exams, names = instance
+    engine = make_engine(rooms, exams, names, trace=path, **settings)
+    engine.generate()
+    return engine, path
+
+@pytest.mark.parametrize("solver", ["backtrack", "min_conflicts", "branch_and_bound"])
+def test_replay_makes_the_same_decisions(tmp_path, solver):
+    engine, path = _traced_run(tmp_path, solver=solver, time_budget=5.0, seed=3)
+    metadata, records = read_trace(path)
+    assert metadata["solver"] == solver
+    assert any(r[0] == ASSIGN for r in records)
+
+    matched, first_diff, original, replayed = replay(path, *INSTANCE)
+    assert matched, first_diff
+    assert len(original) == len(replayed)
+    assert summarise(path)["events"]
+
+def test_replay_stops_at_the_recorded_step(tmp_path):
+    # A budget too short to finish leaves a STOP record holding the step count
+    engine, path = _traced_run(tmp_path, solver="min_conflicts", time_budget=0.0)
+    _, records = read_trace(path)
+    stops = [r for r in records if r[0] == STOP]
+    assert stops
+    assert replay(path, *INSTANCE)[0]
+
+def test_replay_refuses_other_input(tmp_path):
+    _, path = _traced_run(tmp_path)
+    rooms, exams, names = INSTANCE
+    with pytest.raises(ValueError):
+        replay(path, rooms, exams[1:], names)
+
+def test_branch_and_bound_proves_the_shortest_period(tmp_path):
+    engine, path = _traced_run(tmp_path, CYCLE, solver="branch_and_bound", max_exams_day=2,
+                               min_days_between_exams=1, time_budget=30.0)
+    assert engine.proven_optimal
+    assert engine.objective_value == 3
+    assert engine.lower_bound <= engine.objective_value
+    _, records = read_trace(path)
+    # The root bound is not tight here, so the search has to prune branches
+    assert any(r[0] == REJECT and r[4] == BOUND for r in records)
+    assert replay(path, *CYCLE)[0]
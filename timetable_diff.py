@@ -0,0 +1,158 @@
+"""
+Timetable Diff Module
+
+This module compares two timetables exam by exam, keyed by exam_id, and lists the
+exams whose date, time or room changed along with any that were added or removed.
+From those changes it derives the students who need to be told, which is every
+student sitting a changed exam and any student added to or dropped from one.
+Both timetables are read once into a dictionary, so the comparison takes linear
+time. Saved timetables can instead be compared inside the database with
+`TimetableDatabase.diff_timetables`, which returns the same TimetableDiff.
+"""
+
+from dataclasses import dataclass, field
+
+# Kinds of change, in the order they are listed
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+STUDENTS_CHANGED = "students changed"
+CHANGE_ORDER = {MOVED: 0, ADDED: 1, REMOVED: 2, STUDENTS_CHANGED: 3}
+
+CHANGE_FIELDS = ["exam_id", "subject", "change", "old_date", "old_start", "old_end", "old_room",
+                 "new_date", "new_start", "new_end", "new_room", "students"]
+
+@dataclass
+class ExamChange:
+    """How one exam differs between the old and the new timetable"""
+    exam_id: str
+    subject: str
+    change: str
+    old: object = None  # Placement in the old timetable, None if added
+    new: object = None  # Placement in the new timetable, None if removed
+    # Students who need to be told about this change
+    students: frozenset = frozenset()
+
+    @property
+    def changed_fields(self):
+        """Which of date, time and room differ, for an exam in both timetables"""
+        if self.old is None or self.new is None:
+            return ()
+        fields = []
+        if self.old.date != self.new.date:
+            fields.append("date")
+        if (self.old.start, self.old.end) != (self.new.start, self.new.end):
+            fields.append("time")
+        if self.old.room_id != self.new.room_id:
+            fields.append("room")
+        return tuple(fields)
+
+    def as_row(self):
+        """The change as a list of values in the order of CHANGE_FIELDS"""
+        old = (self.old.date, self.old.start, self.old.end, self.old.room_id) if self.old else ("",) * 4
+        new = (self.new.date, self.new.start, self.new.end, self.new.room_id) if self.new else ("",) * 4
+        return [self.exam_id, self.subject, self.describe(), *old, *new, len(self.students)]
+
+    def describe(self):
+        """Short description such as 'moved (date, room)'"""
+        if self.change == MOVED:
+            return f"{MOVED} ({', '.join(self.changed_fields)})"
+        return self.change
+
+@dataclass
+class TimetableDiff:
+    """Every exam that differs between two timetables"""
+    changes: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.changes.sort(key=lambda c: (CHANGE_ORDER[c.change], c.exam_id))
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def of_kind(self, change):
+        return [c for c in self.changes if c.change == change]
+
+    @property
+    def affected_students(self):
+        """Every student who needs to be told about at least one change"""
+        students = set()
+        for c in self.changes:
+            students |= c.students
+        return students
+
+    def changes_by_student(self):
+        """Maps each affected student to the changes that concern them"""
+        by_student = {}
+        for c in self.changes:
+            for sid in c.students:
+                by_student.setdefault(sid, []).append(c)
+        return by_student
+
+    def summary(self):
+        return (f"{len(self.of_kind(MOVED))} exams moved, {len(self.of_kind(ADDED))} added, "
+                f"{len(self.of_kind(REMOVED))} removed, "
+                f"{len(self.of_kind(STUDENTS_CHANGED))} with changed students; "
+                f"{len(self.affected_students)} students affected")
+
+    def iter_csv(self):
+        """Yields the changes as CSV text, one line at a time"""
+        from exporters import iter_rows_csv
+        return iter_rows_csv(CHANGE_FIELDS, (c.as_row() for c in self.changes))
+
+    def iter_affected_csv(self, student_names=None):
+        """
+        Yields one CSV line per affected student and exam, with the exam's new
+        details, so only those students need to be sent a notice.
+        """
+        from exporters import iter_rows_csv
+        student_names = student_names or {}
+
+        def rows():
+            for sid, changes in sorted(self.changes_by_student().items()):
+                for c in changes:
+                    now = c.new
+                    enrolled = now is not None and sid in now.student_ids
+                    yield [sid, student_names.get(sid, ""), c.exam_id, c.subject, c.describe(),
+                           now.date if enrolled else "", now.start if enrolled else "",
+                           now.end if enrolled else "", now.room_id if enrolled else ""]
+        return iter_rows_csv(["student_id", "full_name", "exam_id", "subject", "change",
+                              "date", "start", "end", "room_id"], rows())
+
+def compare_placements(exam_id, old, new):
+    """
+    Returns the ExamChange between two versions of one exam, either of which may
+    be None, or None if the exam is the same in both.
+    """
+    if old is None:
+        return ExamChange(exam_id, new.subject, ADDED, None, new, frozenset(new.student_ids))
+    if new is None:
+        return ExamChange(exam_id, old.subject, REMOVED, old, None, frozenset(old.student_ids))
+
+    moved = (old.date, old.start, old.end, old.room_id) != (new.date, new.start, new.end, new.room_id)
+    if moved:
+        # Everyone sitting the exam before or after the move needs to know
+        students = frozenset(old.student_ids) | frozenset(new.student_ids)
+        return ExamChange(exam_id, new.subject, MOVED, old, new, students)
+    if old.student_ids != new.student_ids:
+        old_students, new_students = frozenset(old.student_ids), frozenset(new.student_ids)
+        if old_students != new_students:
+            # Only the students added to or dropped from the exam are affected
+            return ExamChange(exam_id, new.subject, STUDENTS_CHANGED, old, new, old_students ^ new_students)
+    return None
+
+def diff_placements(old_placements, new_placements):
+    """Compares two lists of placements and returns a TimetableDiff"""
+    old_by_id = {p.exam_id: p for p in old_placements}
+    changes = []
+    for new in new_placements:
+        change = compare_placements(new.exam_id, old_by_id.pop(new.exam_id, None), new)
+        if change is not None:
+            changes.append(change)
+    # What is left was only in the old timetable
+    for exam_id, old in old_by_id.items():
+        changes.append(compare_placements(exam_id, old, None))
+    return TimetableDiff(changes)
@@ -0,0 +1,234 @@
+"""
+Virtual Timetable View Module
+
+This module provides a results table for large timetables. Instead of inserting one
+Treeview item per placement, it keeps the placements in an in-memory model and only
+creates enough Treeview items to fill the visible window. Scrolling just rewrites the
+values of those items, so showing, sorting or filtering tens of thousands of
+placements stays interactive.
+"""
+
+import tkinter as tk
+from itertools import islice
+from tkinter import ttk
+
+COLUMNS = ("Exam ID", "Subject", "Room", "Date", "Start", "End")
+
+# Placement attribute shown in each column, also used as the sort key
+COLUMN_FIELDS = {
+    "Exam ID": "exam_id",
+    "Subject": "subject",
+    "Room": "room_id",
+    "Date": "date",
+    "Start": "start",
+    "End": "end",
+}
+
+class VirtualTimetableView(tk.Frame):
+    """
+    A Treeview that only renders the rows currently in view.
+    Rows come from a list of placements, optionally followed by a stream of further
+    placements which is read a page at a time as the user scrolls towards the end.
+    """
+    def __init__(self, parent, page_size=200, **kwargs):
+        tk.Frame.__init__(self, parent, **kwargs)
+        self.page_size = page_size
+
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show="headings", selectmode="browse")
+        for col in COLUMNS:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=120)
+        self.scrollbar = tk.Scrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # `rows` is the model, `view` is the order it is shown in (the same list
+        # unless sorted) and `offset` is the index of the first visible row
+        self.rows = []
+        self.view = self.rows
+        self.stream = None
+        self.offset = 0
+        self.visible_count = 20
+        self.sort_column = None
+        self.sort_reverse = False
+        self.selected_index = None
+        self.items = []
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_rows(3))
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll_rows(-self.visible_count))
+        self.tree.bind("<Next>", lambda e: self.scroll_rows(self.visible_count))
+
+    def set_rows(self, rows, stream=None):
+        """
+        Replaces the model. `rows` is shown as it is, and `stream` can supply more
+        placements which are appended to `rows` as they are scrolled into view.
+        """
+        self.rows = rows
+        self.stream = stream
+        self.offset = 0
+        self.selected_index = None
+        self.sort_column = None
+        self.view = self.rows
+        for col in COLUMNS:
+            self.tree.heading(col, text=col)
+        self.pull_rows(self.visible_count + self.page_size)
+        self.render()
+
+    def detach_stream(self):
+        """Stops reading from the stream, e.g. after its rows were read elsewhere"""
+        self.stream = None
+        self.render()
+
+    def pull_rows(self, needed):
+        """Reads from the stream until the model holds at least `needed` rows"""
+        if self.stream is None or len(self.rows) >= needed:
+            return
+        count = max(needed - len(self.rows), self.page_size)
+        before = len(self.rows)
+        self.rows.extend(islice(self.stream, count))
+        if len(self.rows) - before < count:
+            # The stream has run out
+            self.stream = None
+
+    def load_all(self):
+        """Reads every remaining row from the stream"""
+        if self.stream is not None:
+            self.rows.extend(self.stream)
+            self.stream = None
+
+    def sort_by(self, column):
+        """Sorts the whole model by a column, toggling the direction on repeated clicks"""
+        self.load_all()
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+
+        field = COLUMN_FIELDS[column]
+        # Ties are broken by date and start so the order is stable and useful
+        self.view = sorted(self.rows, key=lambda p: (getattr(p, field), p.date, p.start),
+                           reverse=self.sort_reverse)
+        for col in COLUMNS:
+            arrow = (" ▼" if self.sort_reverse else " ▲") if col == column else ""
+            self.tree.heading(col, text=col + arrow)
+        self.offset = 0
+        self.selected_index = None
+        self.render()
+
+    def total_rows(self):
+        """Number of rows known so far, counting one extra page while the stream is open"""
+        extra = self.page_size if self.stream is not None else 0
+        return len(self.view) + extra
+
+    def render(self):
+        """Writes the visible window of the model into the pool of Treeview items"""
+        # Keep exactly one Treeview item per visible row, creating or removing in a batch
+        while len(self.items) < self.visible_count:
+            self.items.append(self.tree.insert("", tk.END, values=()))
+        if len(self.items) > self.visible_count:
+            self.tree.delete(*self.items[self.visible_count:])
+            del self.items[self.visible_count:]
+
+        self.pull_rows(self.offset + self.visible_count + 1)
+        max_offset = max(0, len(self.view) - self.visible_count)
+        self.offset = max(0, min(self.offset, max_offset))
+
+        selected = None
+        for i, iid in enumerate(self.items):
+            index = self.offset + i
+            if index < len(self.view):
+                p = self.view[index]
+                self.tree.item(iid, values=(p.exam_id, p.subject, p.room_id, p.date, p.start, p.end))
+                if index == self.selected_index:
+                    selected = iid
+            else:
+                self.tree.item(iid, values=())
+        if selected:
+            self.tree.selection_set(selected)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        total = self.total_rows()
+        if total:
+            first = self.offset / total
+            last = min(1.0, (self.offset + self.visible_count) / total)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_rows(self, delta):
+        """Moves the visible window by a number of rows"""
+        self.offset += delta
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, action, amount=None, unit=None):
+        """Handles scrollbar drags and clicks, which Tk reports as moveto or scroll"""
+        if action == "moveto":
+            self.pull_rows(int(float(amount) * self.total_rows()) + self.visible_count)
+            self.offset = int(float(amount) * self.total_rows())
+            self.render()
+        elif action == "scroll":
+            step = self.visible_count if unit == "pages" else 1
+            self.scroll_rows(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        """Scrolls three rows per wheel notch"""
+        return self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        """Recalculates how many rows fit when the widget changes size"""
+        style = ttk.Style()
+        row_height = int(style.lookup("Treeview", "rowheight") or 20)
+        # Leave room for the column headings
+        count = max(1, (event.height - 25) // row_height)
+        if count != self.visible_count:
+            self.visible_count = count
+            self.render()
+
+    def on_select(self, event):
+        """Remembers which model row is selected so it survives scrolling"""
+        selection = self.tree.selection()
+        if selection and selection[0] in self.items:
+            index = self.offset + self.items.index(selection[0])
+            if index < len(self.view):
+                self.selected_index = index
+
+    def move_selection(self, delta):
+        """Moves the selection with the arrow keys, scrolling to keep it in view"""
+        if self.selected_index is None:
+            self.selected_index = self.offset
+        else:
+            self.selected_index = max(0, self.selected_index + delta)
+        self.pull_rows(self.selected_index + 1)
+        self.selected_index = min(self.selected_index, max(0, len(self.view) - 1))
+        if self.selected_index < self.offset:
+            self.offset = self.selected_index
+        elif self.selected_index >= self.offset + self.visible_count:
+            self.offset = self.selected_index - self.visible_count + 1
+        self.render()
+        return "break"
+
+    def selected_placement(self):
+        """Returns the selected placement, or None"""
+        if self.selected_index is None or self.selected_index >= len(self.view):
+            return None
+        return self.view[self.selected_index]
+
+    def show_exam(self, exam_id):
+        """Scrolls to and selects the first row for an exam, returning whether it was found"""
+        self.load_all()
+        for index, p in enumerate(self.view):
+            if p.exam_id == exam_id:
+                self.selected_index = index
+                self.offset = max(0, index - self.visible_count // 2)
+                self.render()
+                return True
+        return False